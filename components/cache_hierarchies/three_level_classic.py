@@ -26,6 +26,7 @@ from components.cache_hierarchies.caches.classic_caches import (
     MMUCache
 )
 import components.cache_hierarchies.simargs_cache_hierarchy as simargs
+import util.simarglib as simarglib
 
 class ThreeLevelClassicHierarchy(AbstractClassicCacheHierarchy):
     @staticmethod
@@ -54,6 +55,8 @@ class ThreeLevelClassicHierarchy(AbstractClassicCacheHierarchy):
         self._l2_params = simargs.get_l2_params()
         self._llc_params = simargs.get_llc_params()
 
+        simarglib.record_component("cache_hierarchy", self)
+
         print("Creating ThreeLevelClassicHierarchy")
 
     @overrides(AbstractClassicCacheHierarchy)
@@ -15,6 +15,7 @@ from gem5.isas import ISA
 
 from components.processors.custom_x86_core import CustomX86Core
 import components.processors.simargs_processor as simargs
+import util.simarglib as simarglib
 
 class CustomX86Processor(BaseCPUProcessor):
     def __init__(
@@ -38,6 +39,9 @@ class CustomX86Processor(BaseCPUProcessor):
             ]
         )
 
+        simarglib.record_component("processor", self)
+        simarglib.record_component("cpu", self.get_cores()[0].get_simobject())
+
         print(f"Creating X86 Processor: num_cores={num_cores}, core_type={core_type}")
 
     # Simulator also has a schedule_max_insts() function, which just
@@ -55,3 +59,8 @@ class CustomX86Processor(BaseCPUProcessor):
             core._set_inst_stop_any_thread(insts, already_running)
             if core0_only:
                 break
+
+    def get_total_insts(self, core0_only: bool = False) -> int:
+        """Instructions committed so far, summed over all cores"""
+        cores = self.get_cores()[:1] if core0_only else self.get_cores()
+        return sum(core.get_simobject().totalInsts() for core in cores)
@@ -1,11 +1,14 @@
 """
 This is a minor tweak to the gem5 stdlib's SimpleSwitchableProcessor
 (in src/python/gem5/components/processors/simple_switchable_processor.py)
-This version just allows customization of the CPU model.
+This version just allows customization of the CPU model, and can build
+several switch targets at once (e.g., a sweep of CPU parameters), plus
+an optional set of warming cores (e.g., atomic cores that warm the caches
+between KVM and O3), any of which can be switched to by name.
 It also moves some functionality around scheduling max insts
 from the Simulator object to here, for event management convenience.
 """
-from typing import Optional, Type
+from typing import List, Optional, Type
 
 from m5.objects import BaseCPU
 from m5.util import warn
@@ -18,6 +21,8 @@ from gem5.utils.override import *
 
 from components.processors.custom_x86_core import CustomX86Core
 import components.processors.simargs_switchable_processor as simargs
+import util.simarglib as simarglib
+from util.simarglib import set_component_parameters
 
 class CustomX86SwitchableProcessor(SwitchableProcessor):
     """
@@ -38,18 +43,30 @@ class CustomX86SwitchableProcessor(SwitchableProcessor):
 
         :param switch_core_types: The CPU type for each core, to be switched
         to..
+
+        With --switch_variants, there is one set of switch cores per named
+        variant (with its parameters set on the CPUs), rather than one.
+        With --warm_core_type, there is also a set of warming cores.
         """
         proc_params = simargs.get_switchable_processor_params()
         num_cores = proc_params["cores"]
         starting_core_type = proc_params["StartCoreCls"]
         switch_core_type = proc_params["SwitchCoreCls"]
+        switch_variants = proc_params.get("SwitchVariants") or {"switch": {}}
+        warm_core_type = proc_params.get("WarmCoreCls")
 
         if (not num_cores) or (num_cores <= 0):
             raise AssertionError("Number of cores must be a positive integer!")
 
         self._start_key = "start"
-        self._switch_key = "switch"
-        self._current_is_start = True
+        self._warm_key = "warm" if warm_core_type else None
+        for key in [self._start_key, "warm"]:
+            if key in switch_variants:
+                raise AssertionError(f"Switch variant can't be named \"{key}\"!")
+        self._switch_keys = list(switch_variants)
+        # the target switch() goes to
+        self._switch_key = self._switch_keys[0]
+        self._current_key = self._start_key
 
         self._mem_mode = get_mem_mode(starting_core_type)
 
@@ -62,21 +79,41 @@ class CustomX86SwitchableProcessor(SwitchableProcessor):
                 )
                 for i in range(num_cores)
             ],
-            self._switch_key: [
+        }
+        for key, cpu_params in switch_variants.items():
+            switchable_cores[key] = [
                 CustomX86Core(
                     core_id = i, 
                     core_type = switch_core_type,
                     CPUCls = SwitchCPUCls
                 )
                 for i in range(num_cores)
-            ],
-        }
+            ]
+            for core in switchable_cores[key]:
+                set_component_parameters(core.get_simobject(), cpu_params, parent_name = key)
+        if warm_core_type:
+            switchable_cores[self._warm_key] = [
+                CustomX86Core(
+                    core_id = i,
+                    core_type = warm_core_type
+                )
+                for i in range(num_cores)
+            ]
 
         super().__init__(
             switchable_cores=switchable_cores, starting_cores=self._start_key
         )
 
-        print(f"Creating X86 Switchable Processor: num_cores={num_cores}, start_core_type={starting_core_type}, switch_core_type={switch_core_type}")
+        simarglib.record_component("processor", self)
+        simarglib.record_component("start_cpu", switchable_cores[self._start_key][0].get_simobject())
+        simarglib.record_component("switch_cpu", switchable_cores[self._switch_key][0].get_simobject())
+        if len(self._switch_keys) > 1:
+            simarglib.record_component("switch_variants", ",".join(self._switch_keys))
+        if warm_core_type:
+            simarglib.record_component("warm_cpu", switchable_cores[self._warm_key][0].get_simobject())
+
+        print(f"Creating X86 Switchable Processor: num_cores={num_cores}, start_core_type={starting_core_type}, switch_core_type={switch_core_type}"
+              + (f", warm_core_type={warm_core_type}" if warm_core_type else ""))
 
     @overrides(SwitchableProcessor)
     def incorporate_processor(self, board: AbstractBoard) -> None:
@@ -86,12 +123,36 @@ class CustomX86SwitchableProcessor(SwitchableProcessor):
 
     def switch(self):
         """Switches to the "switched out" cores."""
-        if self._current_is_start:
-            self.switch_to_processor(self._switch_key)
+        if self._current_key == self._start_key:
+            self.switch_to(self._switch_key)
         else:
-            self.switch_to_processor(self._start_key)
+            self.switch_to(self._start_key)
 
-        self._current_is_start = not self._current_is_start
+    def switch_to(self, key: str) -> None:
+        """Switches to the cores of KEY (a switch variant, or the start or
+        warming cores); switch() then goes between the last switch
+        variant and the start cores."""
+        self.switch_to_processor(key)
+        self._current_key = key
+        if key in self._switch_keys:
+            self._switch_key = key
+
+    def get_start_key(self) -> str:
+        """The name of the start cores (which a restore starts on)"""
+        return self._start_key
+
+    def get_current_key(self) -> str:
+        """The name of the cores switched in"""
+        return self._current_key
+
+    def get_warm_key(self) -> Optional[str]:
+        """The name of the warming cores (None without --warm_core_type)"""
+        return self._warm_key
+
+    def get_switch_keys(self) -> List[str]:
+        """The names of the switch targets (just "switch" without
+        --switch_variants)"""
+        return list(self._switch_keys)
     
     # Simulator also has a schedule_max_insts() function, which just
     # loops through all the cores in self._board.get_processor().get_cores()
@@ -108,3 +169,14 @@ class CustomX86SwitchableProcessor(SwitchableProcessor):
             core._set_inst_stop_any_thread(insts, already_running)
             if core0_only:
                 break
+
+    def get_total_insts(self, core0_only: bool = False) -> int:
+        """
+        Instructions committed so far, summed over all cores, switched in
+        or not (each core only counts what it ran itself)
+        """
+        return sum(
+            core.get_simobject().totalInsts()
+            for cores in self._switchable_cores.values()
+            for core in (cores[:1] if core0_only else cores)
+        )
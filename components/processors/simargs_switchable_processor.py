@@ -2,7 +2,21 @@
 This is a simargs library for configuring a Processor,
 allowing command-line customization of Processor params,
 e.g., the number of cores
+
+--switch_variants names a JSON file of several switch targets to build
+instead of one, each a set of parameters set on its CPUs, e.g.:
+
+  {"base": {}, "rob128": {"numROBEntries": 128}, "narrow": {"issueWidth": 4}}
+
+(The sampling manager runs each sample on every one of them, from a
+single fast-forward; see util/event_managers/sampling_manager.py.)
+Caches are shared by all the cores, so only CPU parameters can vary.
+
+--warm_core_type adds a third set of cores, e.g. atomic ones that warm
+the caches functionally between the (KVM) start cores, which bypass
+them, and the detailed switch cores.
 """
+import json
 from typing import Dict, Any
 
 from gem5.components.processors.cpu_types import CPUTypes
@@ -17,6 +31,10 @@ parser.add_argument("--start_core_type", type=str, default="kvm", help="Start co
                     choices=["atomic", "kvm", "minor", "o3", "timing"])
 parser.add_argument("--switch_core_type", type=str, default="timing", help="Switch core type",
                     choices=["atomic", "kvm", "minor", "o3", "timing"])
+parser.add_argument("--warm_core_type", type=str, help="Also build warming cores of this type, for functional cache warming between start and switch cores (default: none)",
+                    choices=["atomic", "timing"])
+parser.add_argument("--switch_variants", type=str,
+                    help="JSON file of named switch-core parameter sets, to build one switch target per set (default: one target)")
 ###
 
 def get_switchable_processor_params() -> Dict[str, Any]:
@@ -47,4 +65,13 @@ def get_switchable_processor_params() -> Dict[str, Any]:
     elif simarglib.get("switch_core_type") == "timing":
         params["SwitchCoreCls"] = CPUTypes.TIMING
 
+    if simarglib.get("warm_core_type") == "atomic":
+        params["WarmCoreCls"] = CPUTypes.ATOMIC
+    elif simarglib.get("warm_core_type") == "timing":
+        params["WarmCoreCls"] = CPUTypes.TIMING
+
+    if simarglib.get("switch_variants"):
+        with open(simarglib.get("switch_variants"), "r") as f:
+            params["SwitchVariants"] = json.load(f)
+
     return params
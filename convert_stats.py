@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+# Convert the stats.txt files of a sweep (or any set of runs) into a
+# columnar store, for fast analysis with util/stats/store.py:
+#
+#   ./convert_stats.py results/ --store results.stats --jobs 16
+#
+# Directories are searched for stats.txt (or stats.txt.gz) files, each of
+# which becomes a run named after its directory, with one row per dump
+# (i.e. per ROI of a sampled run).
+
+import argparse
+import os
+import sys
+
+from util.stats.store import convert, find_stats_files
+
+if __name__ == "__main__":
+    argparse = argparse.ArgumentParser(
+        description="Convert gem5 stats.txt files into a columnar stats store."
+    )
+    argparse.add_argument(
+        "paths", type=str, nargs="+",
+        help="stats.txt files, or directories to search for them"
+    )
+    argparse.add_argument(
+        "--store", type=str, required=True,
+        help="Directory to write the store to (replaced if it exists)"
+    )
+    argparse.add_argument(
+        "--jobs", type=int, default=os.cpu_count() or 1,
+        help="Number of files to parse in parallel (default: number of CPUs)"
+    )
+    args = argparse.parse_args()
+
+    paths = find_stats_files(args.paths)
+    if not paths:
+        print("No stats files found.")
+        sys.exit(1)
+    for path in paths:
+        if not os.path.exists(path):
+            print(f"File {path} does not exist.")
+            sys.exit(1)
+    store = convert(paths, args.store, args.jobs)
+    print(f"Converted {len(paths)} run(s) ({len(store)} dumps, "
+          f"{len(store.names())} stats) to {args.store}.")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+# Whole-program CPI, IPC and MPKI estimates, with confidence intervals,
+# from the per-ROI stats dumps of sampled runs (fs_spec06gap_with_sampling.py
+# and the like):
+#
+#   ./estimate_sampling.py results/ --error 0.02 --confidence 0.95
+#   ./estimate_sampling.py --store results.stats --event l2=*.l2caches*.overallMisses::total
+#
+# For each run, prints the estimate, the half-width of its confidence
+# interval, the coefficient of variation and number of ROIs, and how many
+# ROIs the target --error needs (see util/stats/sampling.py).
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+from util.stats.sampling import (
+    estimate_metrics, required_samples, sample_stats, samples_from_stats, samples_from_store,
+    INSTS_STAT, CYCLES_STAT
+)
+from util.stats.store import StatsStore, find_stats_files
+
+if __name__ == "__main__":
+    argparse = argparse.ArgumentParser(
+        description="Estimate whole-program CPI/IPC/MPKI, with confidence "
+                    "intervals, from sampled gem5 runs."
+    )
+    argparse.add_argument(
+        "paths", type=str, nargs="*",
+        help="stats.txt files, or directories to search for them"
+    )
+    argparse.add_argument(
+        "--store", type=str,
+        help="Read the runs from this columnar stats store instead "
+             "(see convert_stats.py)"
+    )
+    argparse.add_argument(
+        "--runs", type=str, default="*",
+        help="With --store, only the runs whose names match this glob (default: all)"
+    )
+    argparse.add_argument(
+        "--insts", type=str, default=INSTS_STAT,
+        help=f"Stat (or glob, summed) counting each ROI's instructions (default: {INSTS_STAT})"
+    )
+    argparse.add_argument(
+        "--cycles", type=str, default=CYCLES_STAT,
+        help=f"Stat (or glob, summed) counting each ROI's cycles (default: {CYCLES_STAT})"
+    )
+    argparse.add_argument(
+        "--event", type=str, action="append", default=[],
+        help="Also estimate the MPKI of an event, as NAME=STAT (or glob; may be repeated)"
+    )
+    argparse.add_argument(
+        "--confidence", type=float, default=0.95,
+        help="Confidence level of the intervals (default: 0.95)"
+    )
+    argparse.add_argument(
+        "--error", type=float, default=0.03,
+        help="Target relative error, for the number of ROIs needed (default: 0.03)"
+    )
+    args = argparse.parse_args()
+
+    try:
+        stats, events = sample_stats(args.event, args.insts, args.cycles)
+    except ValueError as e:
+        print(f"Bad --event {e}.")
+        sys.exit(1)
+
+    if args.store:
+        store = StatsStore(args.store)
+        runs, samples = samples_from_store(store, stats, store.rows(args.runs))
+        names = [store.runs[run]["name"] for run in runs]
+    else:
+        paths = find_stats_files(args.paths)
+        if not paths:
+            print("No stats files found.")
+            sys.exit(1)
+        samples = samples_from_stats(paths, stats)
+        names = [os.path.dirname(path) or "." for path in paths]
+
+    try:
+        metrics = estimate_metrics(samples, events, args.confidence)
+    except ValueError as e:
+        print(f"Bad command-line argument: {e}")
+        sys.exit(1)
+    for metric, est in metrics.items():
+        needed = required_samples(est["cv"], args.error, args.confidence)
+        print(f"{metric} ({args.confidence:.0%} confidence):")
+        print(f"  {'estimate':>10} {'+/-':>10} {'error':>7} {'CV':>7} {'ROIs':>5} {'needed':>7}  run")
+        for i, name in enumerate(names):
+            print(f"  {est['estimate'][i]:>10.4f} {est['half_width'][i]:>10.4f} "
+                  f"{est['rel_error'][i]:>7.2%} {est['cv'][i]:>7.3f} {est['n'][i]:>5} "
+                  f"{needed[i]:>7.0f}  {name}")
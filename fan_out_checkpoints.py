@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+
+# Restore every checkpoint in a directory as its own job, in parallel, and
+# merge their ROI stats into whole-program estimates:
+#
+#   ./fan_out_checkpoints.py checkpoints/ --outdir results/mcf --warmup 10 --roi 10 \
+#       --command "$GEM5_HOME/build/X86/gem5.opt gem5-configs/fs_restore_checkpoint.py --disk_image spec"
+#
+# Each checkpoints/chkpt.<tick> becomes a job restoring it with --start_from,
+# --warmup and --roi, writing to OUTDIR/chkpt.<tick> (see
+# util/runner/fanout.py).  The jobs are run like a command file by
+# run_cmds_locally.py, with the same budget, ledger (--resume) and logs.
+#
+# The estimates are then written to OUTDIR/fanout_result.json: for SimPoint
+# checkpoints (fs_spec06gap_simpoint_checkpoints.py, whose simpoint.json
+# gives each point's weight and warmup/ROI), the weighted mean over the
+# points; otherwise each checkpoint is an equal sample of the program and
+# the estimates come with confidence intervals (see util/stats/sampling.py).
+# --merge-only redoes just the merge, e.g. after rerunning failed jobs.
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from run_cmds_locally import run_commands_parallel
+from util.runner.fanout import fanout_jobs, plan_fanout, read_manifest, write_manifest
+from util.runner.history import RuntimeHistory
+from util.runner.jobs import parse_size, parse_duration
+from util.runner.ledger import JobLedger
+from util.runner.resources import ResourceBudget, host_total_memory, GiB
+from util.stats.sampling import (
+    estimate_metrics, sample_stats, samples_from_stats, INSTS_STAT, CYCLES_STAT
+)
+from util.stats.store import outdir_stats_files
+
+RESULT_FILE = "fanout_result.json"
+# The dump of each restore's stats.txt holding its ROI
+ROI_DUMP = 0
+
+def merge_results(outdir: str, stats: dict, events: list, confidence: float) -> dict:
+    """Whole-program estimates from the runs of the fan-out in OUTDIR.
+    """
+    runs = read_manifest(outdir)
+    paths = []
+    present = []
+    for run in runs:
+        found = outdir_stats_files(run["outdir"]) if os.path.isdir(run["outdir"]) else []
+        if found:
+            paths.append(found[0])
+            present.append(run)
+        else:
+            print(f"No stats for {run['checkpoint']} in {run['outdir']}")
+    if not paths:
+        return {}
+
+    # one sample per checkpoint: its ROI's dump (RestoreCheckpointManager
+    # dumps once, at the end of the ROI, before gem5's final block)
+    samples = {key: array[:, ROI_DUMP][None, :]
+               for key, array in samples_from_stats(paths, stats).items()}
+    weighted = present[0]["weight"] is not None
+    weights = np.array([run["weight"] for run in present]) if weighted else None
+    metrics = estimate_metrics(samples, events, confidence, weights)
+    return dict(
+        checkpoints = len(runs),
+        merged = len(present),
+        weighted = weighted,
+        weight = float(weights.sum()) if weighted else None,
+        confidence = None if weighted else confidence,
+        metrics = {metric: {key: float(value[0]) for key, value in est.items()}
+                   for metric, est in metrics.items()},
+        runs = [dict(run, **{key: float(samples[key][0, i]) for key in stats})
+                for i, run in enumerate(present)]
+    )
+
+
+if __name__ == "__main__":
+    argparse = argparse.ArgumentParser(
+        description="Restore each checkpoint in a directory as a parallel "
+                    "job, and merge their stats into whole-program estimates."
+    )
+    argparse.add_argument(
+        "checkpoints_dir", type=str,
+        help="Directory of chkpt.<tick> checkpoints"
+    )
+    argparse.add_argument(
+        "--command", type=str,
+        help="gem5 command restoring a checkpoint (e.g. running "
+             "fs_restore_checkpoint.py), without --start_from/--warmup/--roi"
+    )
+    argparse.add_argument(
+        "--outdir", type=str, default="fanout",
+        help="Directory for the per-checkpoint outdirs and the merged "
+             "result (default: fanout/)"
+    )
+    argparse.add_argument(
+        "--warmup", type=int,
+        help="Warmup after each restore, in millions of instructions "
+             "(default: from each checkpoint's simpoint.json, else none)"
+    )
+    argparse.add_argument(
+        "--roi", type=int,
+        help="ROI length after warmup, in millions of instructions "
+             "(default: from each checkpoint's simpoint.json)"
+    )
+    argparse.add_argument(
+        "--attributes", type=str, default="",
+        help="Job attributes for every restore, e.g. \"timeout=12h retries=1\""
+    )
+    argparse.add_argument(
+        "--max-parallel", type=int, default=8,
+        help="Maximum number of restores to run in parallel (default: 8)"
+    )
+    argparse.add_argument(
+        "--max-mem", type=str,
+        help="Total memory the running restores may use, e.g. 64G "
+             "(default: 80%% of this machine's memory)"
+    )
+    argparse.add_argument(
+        "--min-free-mem", type=str, default="2G",
+        help="Don't start a restore if it would leave less than this much "
+             "free memory on the machine (default: 2G)"
+    )
+    argparse.add_argument(
+        "--timeout", type=str,
+        help="Kill restores that run longer than this, e.g. 12h (default: no limit)"
+    )
+    argparse.add_argument(
+        "--retries", type=int, default=0,
+        help="Rerun restores up to this many times after a retryable failure (default: 0)"
+    )
+    argparse.add_argument(
+        "--resume", default=False, action="store_true",
+        help="Skip restores that already completed (default: run them all)"
+    )
+    argparse.add_argument(
+        "--history", type=str,
+        default=os.path.join(os.path.expanduser("~"), ".gem5_runtime_history.json"),
+        help="File of past command runtimes (default: ~/.gem5_runtime_history.json)"
+    )
+    argparse.add_argument(
+        "--dry-run", default=False, action="store_true",
+        help="Print the restore commands as command-file lines and exit"
+    )
+    argparse.add_argument(
+        "--merge-only", default=False, action="store_true",
+        help="Don't run anything, just merge the stats of an earlier fan-out"
+    )
+    argparse.add_argument(
+        "--insts", type=str, default=INSTS_STAT,
+        help=f"Stat (or glob, summed) counting each ROI's instructions (default: {INSTS_STAT})"
+    )
+    argparse.add_argument(
+        "--cycles", type=str, default=CYCLES_STAT,
+        help=f"Stat (or glob, summed) counting each ROI's cycles (default: {CYCLES_STAT})"
+    )
+    argparse.add_argument(
+        "--event", type=str, action="append", default=[],
+        help="Also estimate the MPKI of an event, as NAME=STAT (or glob; may be repeated)"
+    )
+    argparse.add_argument(
+        "--confidence", type=float, default=0.95,
+        help="Confidence level of the intervals, for unweighted checkpoints (default: 0.95)"
+    )
+    args = argparse.parse_args()
+
+    try:
+        stats, events = sample_stats(args.event, args.insts, args.cycles)
+    except ValueError as e:
+        print(f"Bad --event {e}.")
+        sys.exit(1)
+
+    ok = True
+    if not args.merge_only:
+        if not args.command:
+            print("--command is required (unless --merge-only).")
+            sys.exit(1)
+        try:
+            runs = plan_fanout(args.checkpoints_dir, args.outdir, args.warmup, args.roi)
+            jobs = list(fanout_jobs(args.command, runs, args.attributes))
+        except (OSError, ValueError) as e:
+            print(f"Can't fan out {args.checkpoints_dir}: {e}")
+            sys.exit(1)
+        if not runs:
+            print(f"No checkpoints found in {args.checkpoints_dir}.")
+            sys.exit(1)
+        if args.dry_run:
+            for job in jobs:
+                print(job.to_line())
+            sys.exit(0)
+        write_manifest(args.outdir, runs)
+
+        try:
+            max_mem = parse_size(args.max_mem) if args.max_mem else int(0.8 * (host_total_memory() or 16 * GiB))
+            budget = ResourceBudget(
+                max_mem = max_mem,
+                max_cores = args.max_parallel,
+                min_free_mem = parse_size(args.min_free_mem)
+            )
+            default_timeout = parse_duration(args.timeout) if args.timeout else None
+        except ValueError as e:
+            print(f"Bad command-line argument: {e}")
+            sys.exit(1)
+        ledger = JobLedger(os.path.join(args.outdir, "fanout.ledger.jsonl"), args.resume)
+        try:
+            print(f"Restoring {len(jobs)} checkpoints from {args.checkpoints_dir}.")
+            ok = run_commands_parallel(
+                jobs, args.max_parallel,
+                budget = budget,
+                ledger = ledger,
+                history = RuntimeHistory(args.history),
+                log_dir = os.path.join(args.outdir, "logs"),
+                default_timeout = default_timeout,
+                default_retries = args.retries
+            )
+        finally:
+            ledger.close()
+        if not ok:
+            print("Some restores failed: merging the rest.")
+
+    try:
+        result = merge_results(args.outdir, stats, events, args.confidence)
+    except (OSError, ValueError) as e:
+        print(f"Can't merge the fan-out in {args.outdir}: {e}")
+        sys.exit(1)
+    if not result:
+        print("No results to merge.")
+        sys.exit(1)
+    with open(os.path.join(args.outdir, RESULT_FILE), "w") as f:
+        json.dump(result, f, indent = 1)
+
+    kind = "weighted by simpoint.json" if result["weighted"] else f"{args.confidence:.0%} confidence"
+    print(f"Merged {result['merged']} of {result['checkpoints']} checkpoints ({kind}):")
+    print(f"  {'metric':>12} {'estimate':>10} {'+/-':>10} {'error':>7}")
+    for metric, est in result["metrics"].items():
+        print(f"  {metric:>12} {est['estimate']:>10.4f} {est['half_width']:>10.4f} {est['rel_error']:>7.2%}")
+    print(f"Wrote {os.path.join(args.outdir, RESULT_FILE)}")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,75 @@
+"""
+Sample FS config script to profile the basic-block vectors of a
+single-threaded SPEC 2006 or GAP benchmark on a fast ATOMIC CPU (optionally
+from a post-OS-boot checkpoint), the first step of the SimPoint flow:
+
+  1. this script, e.g. with --bbv_interval 100
+  2. pick_simpoints.py OUTDIR --out simpoints.json
+  3. fs_spec06gap_simpoint_checkpoints.py --simpoints simpoints.json
+  4. fs_restore_checkpoint.py --start_from CHECKPOINT --warmup W --roi 100
+     on each checkpoint (weighted by its simpoint.json)
+"""
+import time
+
+import m5
+from m5.objects import *
+from gem5.utils.requires import requires
+from gem5.components.boards.x86_board import X86Board
+from gem5.components.memory import DualChannelDDR4_2400
+from gem5.components.cachehierarchies.classic.no_cache import NoCache
+from gem5.isas import ISA
+from gem5.components.processors.cpu_types import CPUTypes
+from gem5.simulate.simulator import Simulator
+
+from components.processors.custom_x86_processor import CustomX86Processor
+import util.simarglib as simarglib
+from util.event_managers.bbv_profile_manager import BBVProfileManager
+from workloads.fs.spec06_and_gap import Spec06AndGapFS
+
+# Parse all command-line args
+simarglib.parse()
+
+# Create a processor (atomic for BBV profiling)
+requires(
+    isa_required = ISA.X86
+)
+
+# Atomic core type required (--core_type atomic)
+processor = CustomX86Processor()
+
+# Create a cache hierarchy (none for atomic)
+cache_hierarchy = NoCache()
+
+# Create some DRAM
+memory = DualChannelDDR4_2400(size="3GB")
+
+# Create a board
+board = X86Board(
+    # Same clock as fs_spec06gap_with_sampling.py
+    clk_freq = "4GHz",
+    processor = processor,
+    cache_hierarchy = cache_hierarchy,
+    memory = memory
+)
+
+# Set up the workload
+workload = Spec06AndGapFS()
+board.set_workload(workload)
+
+# Set up the simulator
+# (including any event management)
+manager = BBVProfileManager(processor)
+simulator = Simulator(
+    board = board,
+    on_exit_event = manager.get_exit_event_handlers()
+)
+manager.initialize()
+
+# Run the simulation
+starttime = time.time()
+print("***Beginning simulation!")
+simulator.run()
+
+totaltime = time.time() - starttime
+print(f"***Exiting @ tick {simulator.get_current_tick()} because {simulator.get_last_exit_event_cause()}.")
+print(f"Total wall clock time: {totaltime:.2f} s = {(totaltime/60):.2f} min")
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+# Index gem5 runs in a SQLite database, joining each run's simargs and
+# component classes (saved to OUTDIR/simargs.json) with a summary of its
+# results, and compare configurations with one query:
+#
+#   ./index_runs.py add results/ --db experiments.db [--store results.stats]
+#   ./index_runs.py compare "*.core.ipc" --by llc_repl,l2_pref --db experiments.db
+#
+# Directories are searched for outdirs with a simargs.json.  With --store
+# (from convert_stats.py), each run's row records where its full stats
+# are.  Anything else is a plain SQL query away (see util/stats/index.py
+# for the tables):
+#
+#   sqlite3 experiments.db "SELECT value, count(*) FROM params WHERE name = 'l2_pref' GROUP BY value"
+
+import argparse
+import json
+import os
+import sys
+
+from util.stats.index import ExperimentIndex, AGGREGATES, SIMARGS_FILE
+from util.stats.store import META_FILE
+
+def find_outdirs(paths):
+    found = []
+    for path in paths:
+        for root, dirs, names in os.walk(path):
+            dirs.sort()
+            if SIMARGS_FILE in names:
+                found.append(root)
+    return found
+
+
+if __name__ == "__main__":
+    argparse = argparse.ArgumentParser(
+        description="Index gem5 runs' simargs and results in a SQLite "
+                    "database, and compare configurations."
+    )
+    argparse.add_argument(
+        "--db", type=str, default="experiments.db",
+        help="The SQLite database (default: experiments.db)"
+    )
+    commands = argparse.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="Index (or re-index) runs")
+    add.add_argument("paths", type=str, nargs="+", help="Outdirs, or directories to search for them")
+    add.add_argument(
+        "--store", type=str,
+        help="Columnar stats store holding these runs (see convert_stats.py)"
+    )
+    compare = commands.add_parser("compare", help="Aggregate a stat by simargs")
+    compare.add_argument("metric", type=str, help="Stat name or glob, e.g. \"*.core.ipc\"")
+    compare.add_argument(
+        "--by", type=str, default="",
+        help="Comma-separated simargs to group the runs by"
+    )
+    compare.add_argument(
+        "--aggregate", type=str, default="geomean", choices=AGGREGATES,
+        help="How to combine the runs of each group (default: geomean)"
+    )
+    compare.add_argument(
+        "--where", type=str, action="append", default=[],
+        help="Only runs with this simarg value, as NAME=VALUE (may be repeated)"
+    )
+    args = argparse.parse_args()
+
+    index = ExperimentIndex(args.db)
+    if args.command == "add":
+        store_runs = {}
+        if args.store:
+            try:
+                with open(os.path.join(args.store, META_FILE), "r") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Could not read stats store {args.store}: {e}")
+                sys.exit(1)
+            store_runs = {run["path"]: i for i, run in enumerate(meta["runs"])}
+        outdirs = find_outdirs(args.paths)
+        for outdir in outdirs:
+            index.add(outdir, store = args.store, store_runs = store_runs)
+        print(f"Indexed {len(outdirs)} run(s) in {args.db}.")
+    else:
+        by = [name for name in args.by.split(",") if name]
+        where = {}
+        for cond in args.where:
+            name, sep, value = cond.partition("=")
+            if not sep:
+                print(f"Bad --where {cond}: expected NAME=VALUE.")
+                sys.exit(1)
+            where[name] = value
+        rows = index.compare(args.metric, by, args.aggregate, where)
+        print("  ".join(f"{name:>12}" for name in by + [args.aggregate, "runs"]))
+        for row in rows:
+            *groups, value, count = row
+            value = f"{value:.4f}" if isinstance(value, float) else str(value)
+            print("  ".join(f"{str(group):>12}" for group in groups + [value, count]))
+    index.close()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+# Pick SimPoint simulation points from the basic-block vectors profiled by
+# fs_spec06gap_bbv_profile.py (BBVProfileManager):
+#
+#   ./pick_simpoints.py m5out/ --out simpoints.json --max-k 30
+#
+# The ROI intervals' BBVs are randomly projected, clustered with k-means
+# for each k up to --max-k, and k is chosen by the BIC (see
+# util/stats/simpoint.py).  The output lists one interval per cluster with
+# its weight, for fs_spec06gap_simpoint_checkpoints.py --simpoints.
+
+import argparse
+import json
+import os
+import sys
+
+from util.stats.simpoint import (
+    simpoints_from_profile, BBV_FILE, PROFILE_FILE, DEFAULT_DIMS, DEFAULT_MAX_K, DEFAULT_THRESHOLD
+)
+
+if __name__ == "__main__":
+    argparse = argparse.ArgumentParser(
+        description="Pick SimPoint simulation points from a BBV profiling run."
+    )
+    argparse.add_argument(
+        "outdir", type=str,
+        help=f"Outdir of the profiling run (with {BBV_FILE} and {PROFILE_FILE})"
+    )
+    argparse.add_argument(
+        "--out", type=str, default="simpoints.json",
+        help="JSON file to write the simulation points to (default: simpoints.json)"
+    )
+    argparse.add_argument(
+        "--max-k", type=int, default=DEFAULT_MAX_K,
+        help=f"Most clusters (simulation points) to try (default: {DEFAULT_MAX_K})"
+    )
+    argparse.add_argument(
+        "--dims", type=int, default=DEFAULT_DIMS,
+        help=f"Dimensions to project the BBVs down to (default: {DEFAULT_DIMS})"
+    )
+    argparse.add_argument(
+        "--bic-threshold", type=float, default=DEFAULT_THRESHOLD,
+        help="Choose the smallest k whose BIC score is at least this fraction "
+             f"of the way from the worst to the best (default: {DEFAULT_THRESHOLD})"
+    )
+    argparse.add_argument(
+        "--seed", type=int, default=0,
+        help="Seed for the projection and k-means (default: 0)"
+    )
+    args = argparse.parse_args()
+
+    for name in [BBV_FILE, PROFILE_FILE]:
+        if not os.path.exists(os.path.join(args.outdir, name)):
+            print(f"File {os.path.join(args.outdir, name)} does not exist.")
+            sys.exit(1)
+    try:
+        result = simpoints_from_profile(args.outdir, max_k = args.max_k, dims = args.dims,
+                                        threshold = args.bic_threshold, seed = args.seed)
+    except ValueError as e:
+        print(f"Could not pick simulation points: {e}")
+        sys.exit(1)
+    with open(args.out, "w") as f:
+        json.dump(result, f, indent = 1)
+
+    print(f"Picked {result['k']} simulation point(s) out of {result['intervals']} "
+          f"intervals of {result['interval']} instructions:")
+    for simpoint in result["simpoints"]:
+        print(f"  interval {simpoint['interval']:>6} (starts at {simpoint['start_insts']} insts)"
+              f"  weight {simpoint['weight']:.3f}")
+    print(f"Wrote {args.out}.")
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+# Submit, list and cancel commands on this machine's run_cmds_daemon.py.
+#
+#   ./queue_cmds.py submit cmds.txt          (same format as run_cmds_locally.py)
+#   ./queue_cmds.py submit -c "build/X86/gem5.opt ..."
+#   ./queue_cmds.py list                     (--all for everyone's jobs)
+#   ./queue_cmds.py cancel 12 13             (--all for all of yours)
+#
+# Commands run in the current directory, with the current environment.
+# Their logs are in the daemon's state dir, under logs/USER/.
+
+import argparse
+import os
+import sys
+import time
+
+from util.runner.daemon import DEFAULT_SOCKET, send_request
+from util.runner.resources import GiB
+
+def _format_time(secs: float) -> str:
+    secs = int(secs)
+    return f"{secs // 3600}:{secs // 60 % 60:02d}:{secs % 60:02d}"
+
+
+def print_jobs(reply: dict) -> None:
+    now = time.time()
+    if reply["users"]:
+        print(f"  {'user':<12} {'running':>7} {'queued':>7} {'cores':>6} {'mem':>8} {'share':>6}")
+        for user, usage in reply["users"].items():
+            print(f"  {user:<12} {usage['running']:>7} {usage['queued']:>7} {usage['cores']:>6} "
+                  f"{usage['mem'] / GiB:>7.1f}G {usage['share']:>6.2f}")
+        print()
+    print(f"  {'id':>5} {'user':<12} {'name':<24} {'state':<10} {'pri':>3} {'time':>9}  status")
+    for job in reply["jobs"]:
+        if job["started"]:
+            elapsed = _format_time((job["ended"] or now) - job["started"])
+        else:
+            elapsed = "-"
+        if job["state"] == "running":
+            status = f"{job['phase']}, {job['rois_done']} ROIs"
+            if job["eta"] is not None:
+                status += f", ETA {_format_time(job['eta'])}"
+        elif job["exit_code"]:
+            status = f"exit {job['exit_code']}" + (f" ({job['failure']})" if job["failure"] else "")
+        else:
+            status = ""
+        print(f"  {job['id']:>5} {job['user']:<12} {job['name']:<24} {job['state']:<10} "
+              f"{job['priority']:>3} {elapsed:>9}  {status}")
+
+
+if __name__ == "__main__":
+    argparse = argparse.ArgumentParser(
+        description="Submit, list and cancel commands on this machine's "
+                    "run_cmds_daemon.py."
+    )
+    argparse.add_argument(
+        "--socket", type=str, default=DEFAULT_SOCKET,
+        help=f"The daemon's Unix socket (default: $GEM5_RUNNER_SOCKET or {DEFAULT_SOCKET})"
+    )
+    commands = argparse.add_subparsers(dest="command", required=True)
+    submit = commands.add_parser("submit", help="Queue the commands in a file")
+    submit.add_argument(
+        "file", type=str, nargs="?",
+        help="Command file, as for run_cmds_locally.py (- for stdin)"
+    )
+    submit.add_argument(
+        "-c", "--cmd", type=str, action="append",
+        help="Queue this command line (may be repeated)"
+    )
+    listing = commands.add_parser("list", help="Show queued, running and recent jobs")
+    listing.add_argument(
+        "--all", default=False, action="store_true",
+        help="Show every user's jobs (default: your own)"
+    )
+    cancel = commands.add_parser("cancel", help="Cancel queued or running jobs")
+    cancel.add_argument("ids", type=int, nargs="*", help="IDs of the jobs to cancel")
+    cancel.add_argument(
+        "--all", default=False, action="store_true",
+        help="Cancel all of your unfinished jobs"
+    )
+    args = argparse.parse_args()
+
+    if args.command == "submit":
+        lines = list(args.cmd or [])
+        if args.file == "-":
+            lines += sys.stdin.read().splitlines()
+        elif args.file:
+            if not os.path.exists(args.file):
+                print(f"File {args.file} does not exist.")
+                sys.exit(1)
+            with open(args.file, "r") as f:
+                lines += f.read().splitlines()
+        if not lines:
+            print("Nothing to submit: give a command file or --cmd.")
+            sys.exit(1)
+        msg = dict(type = "submit", lines = lines, cwd = os.getcwd(), env = dict(os.environ))
+    elif args.command == "list":
+        msg = dict(type = "list", all = args.all)
+    else:
+        if not args.ids and not args.all:
+            print("Give the IDs of the jobs to cancel, or --all.")
+            sys.exit(1)
+        msg = dict(type = "cancel", ids = args.ids)
+
+    try:
+        reply = send_request(args.socket, **msg)
+    except (OSError, ValueError) as e:
+        print(f"Could not reach the daemon at {args.socket}: {e}")
+        sys.exit(1)
+    if not reply["ok"]:
+        print(f"Request failed: {reply['error']}")
+        sys.exit(1)
+
+    if args.command == "submit":
+        for job in reply["jobs"]:
+            print(f"Queued job {job['id']}: {job['name']}")
+    elif args.command == "list":
+        print_jobs(reply)
+    else:
+        print(f"Cancelled {len(reply['cancelled'])} job(s)"
+              + (f": {', '.join(map(str, reply['cancelled']))}" if reply["cancelled"] else "."))
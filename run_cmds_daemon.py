@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+# Run commands submitted by everyone on this machine, sharing one budget.
+#
+# Instead of each person starting their own run_cmds_locally.py (and
+# hopefully leaving cores for the others), start one daemon per machine
+# and have everyone submit their command files to it with queue_cmds.py:
+#
+#   ./run_cmds_daemon.py --max-cores 32 --max-mem 200G --quotas quotas.json
+#   ./queue_cmds.py submit cmds.txt
+#   ./queue_cmds.py list
+#   ./queue_cmds.py cancel 12 13
+#
+# Each user gets their own queue (ordered by "priority=N", then by
+# submission), jobs are started in fair-share order across users, and
+# per-user quotas of cores and memory can be set in a JSON file (see
+# util/runner/daemon.py).  Commands run where they were submitted from,
+# as the submitting user if the daemon runs as root.  The queue survives
+# restarts of the daemon.
+
+import argparse
+import os
+import sys
+
+from util.runner.daemon import JobDaemon, DEFAULT_SOCKET, read_quotas
+from util.runner.failures import FailureKind, DEFAULT_RETRYABLE, parse_failure_kinds
+from util.runner.jobs import parse_size, parse_duration
+from util.runner.resources import ResourceBudget, host_total_memory, GiB
+
+if __name__ == "__main__":
+    argparse = argparse.ArgumentParser(
+        description="Run the commands users submit with queue_cmds.py on "
+                    "this machine, with fair sharing between users."
+    )
+    argparse.add_argument(
+        "--socket", type=str, default=DEFAULT_SOCKET,
+        help=f"Unix socket to take submissions on (default: $GEM5_RUNNER_SOCKET or {DEFAULT_SOCKET})"
+    )
+    argparse.add_argument(
+        "--socket-mode", type=str, default="660",
+        help="Permissions of the socket, i.e. who may submit (default: 660, "
+             "the daemon's user and group)"
+    )
+    argparse.add_argument(
+        "--state-dir", type=str,
+        default=os.path.join(os.path.expanduser("~"), ".gem5_runner_daemon"),
+        help="Directory for the saved queue and the commands' logs "
+             "(default: ~/.gem5_runner_daemon)"
+    )
+    argparse.add_argument(
+        "--max-mem", type=str,
+        help="Total memory the running commands may use, e.g. 64G "
+             "(default: 80%% of this machine's memory)"
+    )
+    argparse.add_argument(
+        "--max-cores", type=int, default=os.cpu_count() or 1,
+        help="Total host cores the running commands may use "
+             "(default: all of them)"
+    )
+    argparse.add_argument(
+        "--min-free-mem", type=str, default="2G",
+        help="Don't start a command if it would leave less than this much "
+             "free memory on the machine (default: 2G)"
+    )
+    argparse.add_argument(
+        "--max-load", type=float,
+        help="Don't start a command if it would push the machine's load "
+             "average above this (default: number of CPUs)"
+    )
+    argparse.add_argument(
+        "--quotas", type=str,
+        help="JSON file of per-user core/memory quotas and fair-share "
+             "weights (default: no quotas, equal weights)"
+    )
+    argparse.add_argument(
+        "--log-max-size", type=str, default="100M",
+        help="Rotate a command's log when it reaches this size, 0 for never (default: 100M)"
+    )
+    argparse.add_argument(
+        "--log-backups", type=int, default=5,
+        help="Number of rotated log segments to keep per command (default: 5)"
+    )
+    argparse.add_argument(
+        "--compress-logs", default=False, action="store_true",
+        help="Gzip log segments once they're complete"
+    )
+    argparse.add_argument(
+        "--timeout", type=str,
+        help="Kill commands that run longer than this, e.g. 12h "
+             "(default: no limit; override per command with timeout=)"
+    )
+    argparse.add_argument(
+        "--retries", type=int, default=0,
+        help="Rerun commands up to this many times after a retryable failure "
+             "(default: 0; override per command with retries=)"
+    )
+    argparse.add_argument(
+        "--retry-backoff", type=str, default="60",
+        help="Wait this long before the first rerun of a command, doubling "
+             "for each rerun after that (default: 60 s)"
+    )
+    argparse.add_argument(
+        "--retry-on", type=str,
+        default=",".join(kind.value for kind in DEFAULT_RETRYABLE),
+        help="Comma-separated kinds of failure worth a rerun, out of "
+             f"{', '.join(kind.value for kind in FailureKind)} "
+             f"(default: {','.join(kind.value for kind in DEFAULT_RETRYABLE)})"
+    )
+    args = argparse.parse_args()
+
+    try:
+        if args.max_mem:
+            max_mem = parse_size(args.max_mem)
+        else:
+            max_mem = int(0.8 * (host_total_memory() or 16 * GiB))
+        budget = ResourceBudget(
+            max_mem = max_mem,
+            max_cores = args.max_cores,
+            min_free_mem = parse_size(args.min_free_mem),
+            max_load = args.max_load
+        )
+        quotas = read_quotas(args.quotas) if args.quotas else None
+        daemon = JobDaemon(
+            args.socket, args.state_dir, budget, max_mem, args.max_cores,
+            quotas = quotas,
+            socket_mode = int(args.socket_mode, 8),
+            default_timeout = parse_duration(args.timeout) if args.timeout else None,
+            default_retries = args.retries,
+            retry_backoff = parse_duration(args.retry_backoff),
+            retryable = parse_failure_kinds(args.retry_on),
+            max_bytes = parse_size(args.log_max_size),
+            backups = args.log_backups,
+            compress = args.compress_logs
+        )
+    except (OSError, ValueError) as e:
+        print(f"Bad command-line argument: {e}")
+        sys.exit(1)
+    daemon.run()
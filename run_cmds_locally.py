@@ -1,62 +1,124 @@
 #!/usr/bin/env python3
 
 # Run a list of commands provided in a .txt file locally in parallel.
-# They will not print to the terminal, so you'll have to redirect the
-# stdout/stderr output yourself, either by adding the "--re" flag
-# after the "--outdir" flag (for gem5) or adding a shell redirect (">", 
-# for other programs) to your command.
+# They will not print to the terminal: each command's stdout and stderr
+# are streamed to its own (rotating) log files in FILE.logs/ instead, and
+# the last few lines are printed if the command fails.
 #
 # Each line in the file represents one command.
 # An example is provided in run_commands_locally_sample.txt.
+#
+# Commands may be named and depend on each other, e.g. restores that need
+# a checkpoint to exist first:
+#
+#   @ckpt_mcf: <command that creates the checkpoint>
+#   @restore_mcf after=ckpt_mcf: <command that restores it>
+#
+# Each command is launched as soon as everything it depends on has
+# completed successfully (see util/runner/jobs.py for the full format).
+#
+# Jobs are also packed against a memory and core budget, and only started
+# when the machine actually has the free memory and idle cores for them.
+# Footprints are estimated from the gem5 command line (FS runs are charged
+# for their simulated DRAM), or can be declared with "mem=4G cores=2".
+#
+# Progress is recorded in a ledger file (FILE.ledger.jsonl by default).  If
+# the runner or the machine dies partway through a batch, rerun with
+# --resume to skip the commands that already completed.
+#
+# The runner also remembers how long each kind of command took (see
+# util/runner/history.py) and starts the jobs with the longest predicted
+# chain of remaining work first, so a 10-hour run at the bottom of the
+# file doesn't start last.
+#
+# Commands are run from a single asyncio event loop, and the file is read
+# lazily, so even huge command files start right away.  Commands may be
+# given a wall-clock limit with "timeout=2h" (or --timeout for all).
+#
+# Failed commands are classified (timeout, OOM kill, KVM error, transient
+# I/O error, config error) and, with "retries=N" (or --retries for all),
+# retryable failures are rerun with exponential backoff.
+#
+# Jobs declared with "priority=N" start ahead of lower-priority ones, and
+# when they're stuck waiting for resources, running gem5 jobs of lower
+# priority are preempted: they checkpoint, exit and are resumed from the
+# checkpoint later (see util/event_managers/event_manager.py).
+#
+# gem5 jobs report their progress (phase, ROIs, instructions) to an event
+# log next to their output logs, and every --progress-interval seconds the
+# runner prints the phase, ROIs done, simulated KIPS and ETA of each
+# running job (see util/runner/dashboard.py).
+#
+# With --straggler-factor F, a gem5 job projected (from its history and
+# live progress) to take F times as long as predicted gets a backup copy
+# on an idle slot or worker, and whichever copy completes first wins.
+#
+# With --result-cache DIR, gem5 commands that repeat a simulation that
+# has already been run (same gem5 binary, script, resolved simargs,
+# checkpoint and disk image) get a copy of its outdir instead of running
+# (see util/runner/result_cache.py).
+#
+# With --scratch-dir DIR (e.g. on tmpfs or a local SSD), gem5 commands
+# write their outdir there, and it is copied to the real outdir (verified,
+# and gzipped with --compress-results) by --flush-workers I/O threads when
+# the command ends, rather than every job writing to a shared filesystem
+# as it goes (see util/runner/staging.py).
+#
+# With --listen ADDR, this runner becomes a coordinator: the commands are
+# run by run_cmds_worker.py processes on other hosts that connect to ADDR
+# (see util/runner/cluster.py), and --local-workers N starts N of them
+# here, e.g. to try it out on one machine.
+#
+# On a machine shared with others, run_cmds_daemon.py runs everyone's
+# command files (submitted with queue_cmds.py) against one budget, with
+# fair sharing and per-user quotas (see util/runner/daemon.py).
+#
+# Instead of a .txt command file, FILE may be a .json sweep spec over
+# simargs (see util/runner/sweep.py), which is expanded into jobs on the
+# fly.  --dry-run prints the jobs as command-file lines instead of
+# running them.
 
 import argparse
-import multiprocessing
 import os
-from typing import List
-import sys
 import subprocess
+from typing import Iterable, Iterator
+import sys
 
-def run_command(cmd: str):
-    """Run a single command.
-    """
-    print(f"Running command: \"{cmd.rstrip()}\"")
-    # Run command silently (except for errors)
-    res = subprocess.run(
-        cmd, shell=True, 
-        stdout=subprocess.DEVNULL, 
-        stderr=subprocess.PIPE
-    ).returncode
-
-    # Check for error
-    if res != 0:
-        print(f"Command failed: \"{cmd.rstrip()}\" (error code {res}).")
-    else:
-        print(f"Command completed successfully: \"{cmd.rstrip()}\"")
+from util.runner.cluster import Coordinator
+from util.runner.dashboard import Dashboard
+from util.runner.executor import JobExecutor
+from util.runner.failures import FailureKind, DEFAULT_RETRYABLE, parse_failure_kinds
+from util.runner.jobs import Job, parse_job_lines, parse_size, parse_duration
+from util.runner.history import RuntimeHistory
+from util.runner.ledger import JobLedger
+from util.runner.result_cache import ResultCache
+from util.runner.resources import ResourceBudget, host_total_memory, GiB
+from util.runner.staging import OutdirStager
+from util.runner.sweep import read_sweep_file
 
+def run_commands_parallel(jobs: Iterable[Job], num_workers: int = 8, **executor_args) -> bool:
+    """Run a series of jobs in parallel, respecting their dependencies.
+    Returns whether all of them completed successfully.
 
-def run_commands_parallel(cmds: List[str], num_workers: int = 8):
-    """Run a series of commands in parallel.
+    See util/runner/executor.py for EXECUTOR_ARGS.
     """
-    # Run the commands with a multiprocessing pool
-    with multiprocessing.Pool(num_workers) as pool:
-        pool.map(run_command, cmds)
+    return JobExecutor(num_workers, **executor_args).run(jobs)
 
 
-def read_command_file(file: str) -> List[str]:
-    """Read the commands from a command .txt file.
+def read_command_file(file: str) -> Iterator[Job]:
+    """Lazily read the jobs from a command .txt file (or .json sweep spec).
     """
     # Read the file
     if not os.path.exists(file):
         print(f"File {file} does not exist.")
-        return []
-    
-    cmds = []
-    with open(file, "r") as f:
-        cmds = f.readlines()
+        return
 
-    return cmds
+    if file.endswith(".json"):
+        yield from read_sweep_file(file)
+        return
+    with open(file, "r") as f:
+        yield from parse_job_lines(f)
 
-    
 
 if __name__ == "__main__":
     argparse = argparse.ArgumentParser(
@@ -71,7 +133,219 @@ if __name__ == "__main__":
         help="Maximum number of commands to run in parallel. Make sure that "
              "you're leaving cores for other people :)"
     )
+    argparse.add_argument(
+        "--max-mem", type=str,
+        help="Total memory the running commands may use, e.g. 64G "
+             "(default: 80%% of this machine's memory)"
+    )
+    argparse.add_argument(
+        "--max-cores", type=int,
+        help="Total host cores the running commands may use "
+             "(default: --max-parallel)"
+    )
+    argparse.add_argument(
+        "--min-free-mem", type=str, default="2G",
+        help="Don't start a command if it would leave less than this much "
+             "free memory on the machine (default: 2G)"
+    )
+    argparse.add_argument(
+        "--max-load", type=float,
+        help="Don't start a command if it would push the machine's load "
+             "average above this (default: number of CPUs)"
+    )
+    argparse.add_argument(
+        "--ledger", type=str,
+        help="File recording each command's progress (default: FILE.ledger.jsonl)"
+    )
+    argparse.add_argument(
+        "--resume", default=False, action="store_true",
+        help="Skip commands the ledger has as completed, rerunning failed "
+             "and interrupted ones (default: start the batch from scratch)"
+    )
+    argparse.add_argument(
+        "--history", type=str,
+        default=os.path.join(os.path.expanduser("~"), ".gem5_runtime_history.json"),
+        help="File of past command runtimes used to schedule the longest "
+             "jobs first (default: ~/.gem5_runtime_history.json)"
+    )
+    argparse.add_argument(
+        "--log-dir", type=str,
+        help="Directory for each command's stdout/stderr logs "
+             "(default: FILE.logs/)"
+    )
+    argparse.add_argument(
+        "--log-max-size", type=str, default="100M",
+        help="Rotate a command's log when it reaches this size, 0 for never (default: 100M)"
+    )
+    argparse.add_argument(
+        "--log-backups", type=int, default=5,
+        help="Number of rotated log segments to keep per command (default: 5)"
+    )
+    argparse.add_argument(
+        "--compress-logs", default=False, action="store_true",
+        help="Gzip log segments once they're complete"
+    )
+    argparse.add_argument(
+        "--timeout", type=str,
+        help="Kill commands that run longer than this, e.g. 12h "
+             "(default: no limit; override per command with timeout=)"
+    )
+    argparse.add_argument(
+        "--retries", type=int, default=0,
+        help="Rerun commands up to this many times after a retryable failure "
+             "(default: 0; override per command with retries=)"
+    )
+    argparse.add_argument(
+        "--retry-backoff", type=str, default="60",
+        help="Wait this long before the first rerun of a command, doubling "
+             "for each rerun after that (default: 60 s)"
+    )
+    argparse.add_argument(
+        "--retry-on", type=str,
+        default=",".join(kind.value for kind in DEFAULT_RETRYABLE),
+        help="Comma-separated kinds of failure worth a rerun, out of "
+             f"{', '.join(kind.value for kind in FailureKind)} "
+             f"(default: {','.join(kind.value for kind in DEFAULT_RETRYABLE)})"
+    )
+    argparse.add_argument(
+        "--progress-interval", type=str, default="60",
+        help="Print the progress of the running gem5 jobs this often "
+             "(default: 60 s; 0 to never print it)"
+    )
+    argparse.add_argument(
+        "--straggler-factor", type=float, default=0.0,
+        help="Start a backup copy (on an idle slot) of gem5 jobs projected "
+             "to take this many times their predicted runtime; the first "
+             "copy to complete wins (default: 0, never)"
+    )
+    argparse.add_argument(
+        "--result-cache", type=str,
+        help="Directory of cached simulation results: reuse the outdir of "
+             "an identical earlier simulation instead of rerunning it "
+             "(default: no caching)"
+    )
+    argparse.add_argument(
+        "--scratch-dir", type=str,
+        help="Local directory for gem5 outdirs while the commands run; "
+             "results are copied to the real outdirs when they end "
+             "(default: write to the real outdirs directly)"
+    )
+    argparse.add_argument(
+        "--flush-workers", type=int, default=4,
+        help="With --scratch-dir, copy at most this many files to the real "
+             "outdirs at once (default: 4)"
+    )
+    argparse.add_argument(
+        "--compress-results", default=False, action="store_true",
+        help="With --scratch-dir, gzip the results as they're copied "
+             "(stats.txt becomes stats.txt.gz)"
+    )
+    argparse.add_argument(
+        "--listen", type=str,
+        help="Run the commands on run_cmds_worker.py workers that connect "
+             "to this HOST:PORT or Unix socket path, instead of locally"
+    )
+    argparse.add_argument(
+        "--local-workers", type=int, default=0,
+        help="With --listen, start this many workers on this machine, each "
+             "with --max-parallel slots (default: 0)"
+    )
+    argparse.add_argument(
+        "--lookahead", type=int, default=1000,
+        help="Read at most this many commands ahead of the ones started "
+             "(default: 1000)"
+    )
+    argparse.add_argument(
+        "--dry-run", default=False, action="store_true",
+        help="Print the commands that would be run and exit"
+    )
     args = argparse.parse_args()
 
-    cmds = read_command_file(args.file)
-    run_commands_parallel(cmds, args.max_parallel)
\ No newline at end of file
+    if args.dry_run:
+        try:
+            for job in read_command_file(args.file):
+                print(job.to_line())
+        except ValueError as e:
+            print(f"Bad command file {args.file}: {e}")
+            sys.exit(1)
+        sys.exit(0)
+
+    try:
+        if args.max_mem:
+            max_mem = parse_size(args.max_mem)
+        else:
+            max_mem = int(0.8 * (host_total_memory() or 16 * GiB))
+        budget = ResourceBudget(
+            max_mem = max_mem,
+            max_cores = args.max_cores or args.max_parallel,
+            min_free_mem = parse_size(args.min_free_mem),
+            max_load = args.max_load
+        )
+        progress_interval = parse_duration(args.progress_interval)
+        default_timeout = parse_duration(args.timeout) if args.timeout else None
+        retry_backoff = parse_duration(args.retry_backoff)
+        retryable = parse_failure_kinds(args.retry_on)
+        max_bytes = parse_size(args.log_max_size)
+    except ValueError as e:
+        print(f"Bad command-line argument: {e}")
+        sys.exit(1)
+
+    ledger = JobLedger(args.ledger or f"{args.file}.ledger.jsonl", args.resume)
+    stager = None
+    workers = []
+    try:
+        if args.resume:
+            counts = ledger.summary()
+            print(f"Resuming batch: {counts.get('completed', 0)} completed, "
+                  f"{counts.get('failed', 0)} failed, "
+                  f"{counts.get('started', 0)} interrupted.")
+
+        jobs = read_command_file(args.file)
+        history = RuntimeHistory(args.history)
+        cache = ResultCache(args.result_cache) if args.result_cache else None
+        dashboard = Dashboard(progress_interval) if progress_interval > 0 else None
+        if args.scratch_dir and not args.listen:
+            stager = OutdirStager(args.scratch_dir, args.flush_workers, args.compress_results)
+
+        coordinator = None
+        if args.listen:
+            # workers are limited by their slots, not this machine's budget
+            coordinator = Coordinator(args.listen)
+            budget = None
+            for num in range(args.local_workers):
+                workers.append(subprocess.Popen([
+                    sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "run_cmds_worker.py"),
+                    args.listen, "--slots", str(args.max_parallel), "--name", f"local{num}",
+                    "--log-dir", args.log_dir or f"{args.file}.logs",
+                    *(["--scratch-dir", args.scratch_dir, "--flush-workers", str(args.flush_workers)]
+                      if args.scratch_dir else []),
+                    *(["--compress-results"] if args.scratch_dir and args.compress_results else [])
+                ]))
+        ok = run_commands_parallel(
+            # (workers take jobs from the coordinator as they have slots)
+            jobs, args.lookahead if coordinator else args.max_parallel,
+            budget = budget,
+            ledger = ledger,
+            history = history,
+            log_dir = args.log_dir or f"{args.file}.logs",
+            lookahead = args.lookahead,
+            default_timeout = default_timeout,
+            default_retries = args.retries,
+            retry_backoff = retry_backoff,
+            retryable = retryable,
+            cache = cache,
+            coordinator = coordinator,
+            dashboard = dashboard,
+            straggler_factor = args.straggler_factor,
+            stager = stager,
+            max_bytes = max_bytes,
+            backups = args.log_backups,
+            compress = args.compress_logs
+        )
+    finally:
+        ledger.close()
+        if stager:
+            stager.close()
+        for worker in workers:
+            worker.wait()
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+# Run commands handed out by a run_cmds_locally.py coordinator.
+#
+# Start the coordinator with --listen, then start one worker per host
+# (pointing at the coordinator's address) with as many slots as that host
+# should run commands at once:
+#
+#   ./run_cmds_locally.py cmds.txt --listen 0.0.0.0:5555
+#   ./run_cmds_worker.py coordinator-host:5555 --slots 16     (on each host)
+#
+# Workers run each command exactly as the local runner would (own process
+# group, rotating logs, timeouts) and send its exit status and the final
+# stats files of its outdir back to the coordinator.  A Unix socket path
+# can be used instead of host:port when everything runs on one machine
+# (see util/runner/cluster.py).  With --scratch-dir, gem5 outdirs are
+# written to a local directory and copied to the real ones at the end
+# (see util/runner/staging.py).
+
+import argparse
+import os
+
+from util.runner.cluster import Worker
+from util.runner.executor import JobExecutor
+from util.runner.jobs import parse_size
+from util.runner.staging import OutdirStager
+
+if __name__ == "__main__":
+    argparse = argparse.ArgumentParser(
+        description="Run commands handed out by a run_cmds_locally.py "
+                    "coordinator (see --listen)."
+    )
+    argparse.add_argument(
+        "address", type=str,
+        help="The coordinator's address: HOST:PORT or a Unix socket path."
+    )
+    argparse.add_argument(
+        "--slots", type=int, default=8,
+        help="Maximum number of commands to run in parallel on this host "
+             "(default: 8)"
+    )
+    argparse.add_argument(
+        "--name", type=str,
+        help="Name of this worker in the coordinator's output (default: HOST.PID)"
+    )
+    argparse.add_argument(
+        "--log-dir", type=str, default="worker.logs",
+        help="Directory for each command's stdout/stderr logs "
+             "(default: worker.logs/)"
+    )
+    argparse.add_argument(
+        "--log-max-size", type=str, default="100M",
+        help="Rotate a command's log when it reaches this size, 0 for never (default: 100M)"
+    )
+    argparse.add_argument(
+        "--scratch-dir", type=str,
+        help="Local directory for gem5 outdirs while the commands run "
+             "(default: write to the real outdirs directly)"
+    )
+    argparse.add_argument(
+        "--flush-workers", type=int, default=4,
+        help="With --scratch-dir, copy at most this many files to the real "
+             "outdirs at once (default: 4)"
+    )
+    argparse.add_argument(
+        "--compress-results", default=False, action="store_true",
+        help="With --scratch-dir, gzip the results as they're copied "
+             "(stats.txt becomes stats.txt.gz)"
+    )
+    args = argparse.parse_args()
+
+    os.makedirs(args.log_dir, exist_ok=True)
+    executor = JobExecutor(
+        log_dir = args.log_dir,
+        stager = OutdirStager(args.scratch_dir, args.flush_workers, args.compress_results) if args.scratch_dir else None,
+        max_bytes = parse_size(args.log_max_size)
+    )
+    Worker(args.address, executor, slots = args.slots, name = args.name).run()
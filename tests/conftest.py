@@ -0,0 +1,33 @@
+import os
+import sys
+from typing import Dict, List
+
+import pytest
+
+# The tests import the config scripts' modules (util.*) from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util.stats.reader import BEGIN_MARKER, END_MARKER
+
+def stats_text(dumps: List[Dict[str, float]]) -> str:
+    """A gem5 stats.txt with a block of the stats of each of DUMPS.
+    """
+    lines = []
+    for dump in dumps:
+        lines += ["", BEGIN_MARKER.decode(), ""]
+        lines += [f"{name:<60} {value:>20} # {name.split('.')[-1]} (Count)"
+                  for name, value in dump.items()]
+        lines += ["", END_MARKER.decode(), ""]
+    return "\n".join(lines) + "\n"
+
+
+@pytest.fixture
+def write_stats(tmp_path):
+    """Write the stats.txt of a list of dumps (see stats_text()) under tmp_path.
+    """
+    def write(dumps: List[Dict[str, float]], name: str = "stats.txt") -> str:
+        path = tmp_path / name
+        path.parent.mkdir(parents = True, exist_ok = True)
+        path.write_text(stats_text(dumps))
+        return str(path)
+    return write
@@ -0,0 +1,115 @@
+"""
+Stand-ins for the parts of gem5's m5 and gem5 modules that the event
+managers use, so their logic can be tested without a gem5 binary.
+install() puts them in sys.modules (unless the real ones are there).
+"""
+import enum
+import os
+import sys
+import types
+from typing import List, Optional, Sequence
+
+# What the fake simulation did, in order, e.g. ("switch_to", "start")
+log: List[tuple] = []
+# What the next m5.fork() calls return: child pids, or 0 to be the child
+forks: List[int] = []
+
+class ExitEvent(enum.Enum):
+    EXIT = "exit"
+    CHECKPOINT = "checkpoint"
+    WORKBEGIN = "workbegin"
+    WORKEND = "workend"
+    MAX_INSTS = "max insts"
+    SCHEDULED_TICK = "scheduled tick exit"
+    SIMPOINT_BEGIN = "simpoint begins"
+    USER_INTERRUPT = "user interupt"
+
+
+class BaseCPUProcessor:
+    pass
+
+
+def _make_m5() -> types.ModuleType:
+    m5 = types.ModuleType("m5")
+    m5.tick = 0
+    m5.options = types.SimpleNamespace()
+    m5.curTick = lambda: m5.tick
+    m5.stats = types.SimpleNamespace(reset = lambda: log.append(("stats.reset",)),
+                                     dump = lambda: log.append(("stats.dump",)))
+    def checkpoint(path: str) -> None:
+        os.makedirs(path, exist_ok = True)
+        log.append(("checkpoint", path))
+    m5.checkpoint = checkpoint
+    def fork(path: str) -> int:
+        pid = forks.pop(0)
+        log.append(("fork", path, pid))
+        if pid == 0:
+            m5.options.outdir = path % {"parent": m5.options.outdir}
+            os.makedirs(m5.options.outdir, exist_ok = True)
+        return pid
+    m5.fork = fork
+    m5.scheduleTickExitFromCurrent = lambda ticks: None
+    m5.disableAllListeners = lambda: None
+    return m5
+
+
+def install() -> types.ModuleType:
+    """Install the fakes (if gem5 isn't there) and return m5"""
+    if "m5" not in sys.modules:
+        sys.modules["m5"] = _make_m5()
+        modules = {
+            "gem5.simulate.exit_event": dict(ExitEvent = ExitEvent),
+            "gem5.components.processors.base_cpu_processor": dict(BaseCPUProcessor = BaseCPUProcessor),
+        }
+        for name, attrs in modules.items():
+            parts = name.split(".")
+            for i in range(1, len(parts) + 1):
+                sys.modules.setdefault(".".join(parts[:i]), types.ModuleType(".".join(parts[:i])))
+            for attr, value in attrs.items():
+                setattr(sys.modules[name], attr, value)
+    return sys.modules["m5"]
+
+
+class FakeSwitchableProcessor:
+    """As CustomX86SwitchableProcessor: start and switch cores (and
+    optionally warming cores), counting core 0's instructions."""
+
+    def __init__(self, warm: bool = False, switch_keys: Sequence[str] = ("switch",)) -> None:
+        self._current_key = "start"
+        self._switch_keys = list(switch_keys)
+        self._switch_key = self._switch_keys[0]
+        self._warm_key = "warm" if warm else None
+        self.insts = 0
+        self.max_insts: Optional[int] = None
+
+    def run(self, insts: int, ticks_per_inst: int = 2) -> None:
+        """Simulate INSTS instructions"""
+        self.insts += insts
+        sys.modules["m5"].tick += insts * ticks_per_inst
+
+    def schedule_max_insts(self, insts: int, core0_only: bool = False,
+                           already_running: bool = True) -> None:
+        self.max_insts = insts
+        log.append(("schedule_max_insts", insts, already_running))
+
+    def get_total_insts(self, core0_only: bool = False) -> int:
+        return self.insts
+
+    def switch(self) -> None:
+        self.switch_to(self._switch_key if self._current_key == "start" else "start")
+
+    def switch_to(self, key: str) -> None:
+        log.append(("switch_to", key))
+        self._current_key = key
+
+    def get_start_key(self) -> str:
+        return "start"
+
+    def get_current_key(self) -> str:
+        return self._current_key
+
+    def get_warm_key(self) -> Optional[str]:
+        return self._warm_key
+
+    def get_switch_keys(self) -> List[str]:
+        return self._switch_keys
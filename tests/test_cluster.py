@@ -0,0 +1,120 @@
+import asyncio
+import os
+
+from util.runner import cluster
+from util.runner.cluster import Coordinator, Worker, result_files
+from util.runner.jobs import Job
+
+def test_result_files(tmp_path):
+    for name in ["stats.txt.gz", "stats.rois.txt", "stats.rois.o3.txt", "config.ini",
+                 "simout", "roi_sample.json", "stats.txt.part"]:
+        (tmp_path / name).write_text("x")
+    os.mkdir(tmp_path / "roi.0")
+    (tmp_path / "roi.0" / "stats.txt").write_text("x")
+    assert result_files(str(tmp_path)) == \
+        ["config.ini", "stats.rois.o3.txt", "stats.rois.txt", "stats.txt.gz"]
+    assert result_files(str(tmp_path / "missing")) == []
+
+
+class FakeExecutor:
+    """Runs each job by writing its stats.txt (and a log) in its outdir"""
+
+    def __init__(self) -> None:
+        self.jobs = []
+
+    async def run_job(self, job):
+        self.jobs.append(job)
+        os.makedirs(job.outdir, exist_ok = True)
+        with open(os.path.join(job.outdir, "stats.txt"), "w") as f:
+            f.write(f"stats of {job.name}\n")
+        with open(os.path.join(job.outdir, "simout"), "w") as f:
+            f.write("not sent\n")
+        return 0, None
+
+    def eta(self, name):
+        return None
+
+
+def test_job_runs_on_a_worker(tmp_path):
+    executor = FakeExecutor()
+    address = str(tmp_path / "coordinator.sock")
+
+    async def main():
+        coordinator = Coordinator(address)
+        await coordinator.start()
+        worker = asyncio.create_task(Worker(address, executor, slots = 2, name = "w0").run_async())
+        job = Job("gem5.opt -d out config.py", name = "run0",
+                  cwd = str(tmp_path / "sweep"), env = {"GEM5_PREEMPT_DIR": "/tmp/x"})
+        result = await coordinator.run(job, timeout = 60)
+        await coordinator.close()
+        await worker
+        return result
+
+    assert asyncio.run(main()) == (0, None)
+    [job] = executor.jobs
+    # (the worker's job is the coordinator's, down to where and how it runs)
+    assert (job.name, job.cmd, job.timeout) == ("run0", "gem5.opt -d out config.py", 60)
+    assert job.cwd == str(tmp_path / "sweep")
+    assert job.env == {"GEM5_PREEMPT_DIR": "/tmp/x"}
+    assert sorted(os.listdir(tmp_path / "sweep" / "out")) == ["simout", "stats.txt"]
+    assert (tmp_path / "sweep" / "out" / "stats.txt").read_text() == "stats of run0\n"
+
+
+class StuckExecutor(FakeExecutor):
+    """Starts each job and never finishes it"""
+
+    async def run_job(self, job):
+        self.jobs.append(job)
+        await asyncio.Event().wait()
+
+
+def test_jobs_of_a_lost_worker_go_elsewhere(tmp_path):
+    stuck, executor = StuckExecutor(), FakeExecutor()
+    address = str(tmp_path / "coordinator.sock")
+
+    async def main():
+        coordinator = Coordinator(address)
+        await coordinator.start()
+        first = asyncio.create_task(Worker(address, stuck, slots = 1, name = "w0").run_async())
+        job = asyncio.create_task(coordinator.run(Job("gem5.opt -d out config.py", name = "run0",
+                                                      cwd = str(tmp_path))))
+        while not stuck.jobs:
+            await asyncio.sleep(0.01)
+        assert coordinator.worker_of("run0") == "w0"
+        first.cancel()
+        second = asyncio.create_task(Worker(address, executor, slots = 1, name = "w1").run_async())
+        result = await job
+        await coordinator.close()
+        await second
+        return result
+
+    assert asyncio.run(main()) == (0, None)
+    assert [job.name for job in executor.jobs] == ["run0"]
+
+
+def test_result_files_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(cluster, "FILE_CHUNK_SIZE", 1000)
+    stats = "".join(f"stat{i} {i}\n" for i in range(2000))
+
+    class BigStats(FakeExecutor):
+        async def run_job(self, job):
+            await super().run_job(job)
+            with open(os.path.join(job.outdir, "stats.txt"), "w") as f:
+                f.write(stats)
+            return 0, None
+
+    address = str(tmp_path / "coordinator.sock")
+
+    async def main():
+        coordinator = Coordinator(address)
+        await coordinator.start()
+        worker = asyncio.create_task(Worker(address, BigStats(), name = "w0").run_async())
+        result = await coordinator.run(Job("gem5.opt -d out config.py", name = "run0",
+                                           cwd = str(tmp_path)))
+        await coordinator.close()
+        await worker
+        return result
+
+    assert asyncio.run(main()) == (0, None)
+    assert (tmp_path / "out" / "stats.txt").read_text() == stats
+    assert not (tmp_path / "out" / ".stats.txt.part").exists()
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+import util.runner.resources as resources
+from util.runner.daemon import (
+    COMPLETED, FAILED, QUEUED, RUNNING, SKIPPED, JobDaemon, Quota, read_quotas, send_request
+)
+from util.runner.failures import FailureKind
+from util.runner.resources import GiB, ResourceBudget
+
+# (users that don't exist here are named after their uid)
+ALICE, BOB = 4242, 4343
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    """A daemon for 16G and 8 cores on an idle machine, whose jobs are
+    only recorded as started (see started)"""
+    monkeypatch.setattr(resources, "host_available_memory", lambda: 64 * GiB)
+    monkeypatch.setattr(resources.os, "getloadavg", lambda: (0.0, 0.0, 0.0))
+    budget = ResourceBudget(max_mem = 16 * GiB, max_cores = 8, max_load = 64)
+    daemon = JobDaemon(str(tmp_path / "sock"), str(tmp_path / "state"), budget,
+                       max_mem = 16 * GiB, max_cores = 8)
+    os.makedirs(tmp_path / "state")
+    daemon._wake = asyncio.Event()
+    daemon.started = []
+    def start(sj):
+        sj.state = RUNNING
+        daemon.started.append((sj.user, sj.job.name))
+    monkeypatch.setattr(daemon, "_start", start)
+    return daemon
+
+
+def submit(daemon, uid, *lines):
+    return daemon._submit(uid, {"lines": list(lines), "cwd": "/tmp", "env": {}})
+
+
+def test_read_quotas(tmp_path):
+    path = tmp_path / "quotas.json"
+    path.write_text(json.dumps({"*": {"cores": 8, "mem": "64G"}, "alice": {"cores": 16, "weight": 2}}))
+    quotas = read_quotas(str(path))
+    assert (quotas["*"].mem, quotas["*"].cores, quotas["*"].weight) == (64 * GiB, 8, 1.0)
+    assert (quotas["alice"].mem, quotas["alice"].cores, quotas["alice"].weight) == (None, 16, 2)
+    path.write_text(json.dumps({"bob": {"gpus": 1}}))
+    with pytest.raises(ValueError):
+        read_quotas(str(path))
+    with pytest.raises(ValueError):
+        Quota(weight = 0)
+
+
+def test_fair_share(daemon):
+    submit(daemon, ALICE, *[f"@a{i} mem=2G cores=2: true" for i in range(4)])
+    submit(daemon, BOB, *[f"@b{i} mem=2G cores=2: true" for i in range(4)])
+    daemon._schedule()
+    # taking turns until the 8 cores are held
+    assert daemon.started == [("4242", "a0"), ("4343", "b0"), ("4242", "a1"), ("4343", "b1")]
+    assert daemon._share("4242") == 0.5
+
+
+def test_weights_and_quotas(daemon):
+    daemon._quotas = {"4242": Quota(weight = 3), "4343": Quota(cores = 2)}
+    submit(daemon, ALICE, *[f"@a{i} mem=1G cores=1: true" for i in range(8)])
+    submit(daemon, BOB, *[f"@b{i} mem=1G cores=1: true" for i in range(8)])
+    daemon._schedule()
+    # bob's quota stops him at 2 cores; alice (weight 3) gets the rest
+    assert [name for user, name in daemon.started if user == "4343"] == ["b0", "b1"]
+    assert len(daemon.started) == 8
+
+
+def test_priority_within_a_user(daemon):
+    submit(daemon, ALICE, "@low cores=8: true", "@high priority=5 cores=8: true")
+    daemon._schedule()
+    assert daemon.started == [("4242", "high")]
+
+
+def test_submit_checks(daemon):
+    [job] = submit(daemon, ALICE, "echo anonymous")["jobs"]
+    assert job["name"] == f"job{job['id']}"
+    submit(daemon, ALICE, "@a: true")
+    with pytest.raises(ValueError):
+        submit(daemon, ALICE, "@a: true")
+    with pytest.raises(ValueError):
+        submit(daemon, ALICE, "@b after=missing: true")
+    with pytest.raises(ValueError):
+        submit(daemon, ALICE, "@c: true", "@c: true")
+    with pytest.raises(ValueError):
+        submit(daemon, ALICE, "# nothing")
+    # (names are per user)
+    submit(daemon, BOB, "@a: true", "@b after=a: true")
+
+
+def test_dependencies_and_retries(daemon):
+    daemon._retry_backoff = 60.0
+    daemon._default_retries = 1
+    ids = [job["id"] for job in submit(daemon, ALICE, "@a: true", "@b after=a: true", "@c after=b: true")["jobs"]]
+    daemon._schedule()
+    assert daemon.started == [("4242", "a")]
+    a, b, c = (daemon._jobs[id] for id in ids)
+    daemon._finish(a, 0, None)
+    daemon._schedule()
+    assert b.state == RUNNING
+    daemon._finish(b, 1, FailureKind.IO)
+    # retried after the backoff
+    assert b.state == QUEUED and b.not_before > a.ended + 59
+    daemon._finish(b, 1, FailureKind.IO)
+    daemon._schedule()
+    assert (a.state, b.state, c.state) == (COMPLETED, FAILED, SKIPPED)
+
+
+def test_queue_survives_a_restart(daemon, tmp_path):
+    submit(daemon, ALICE, "@a cores=2 retries=1: gem5.opt config.py", "@b after=a: true")
+    daemon._schedule()
+    restarted = JobDaemon(str(tmp_path / "sock"), str(tmp_path / "state"), daemon._budget,
+                          max_mem = 16 * GiB, max_cores = 8)
+    restarted._load()
+    assert [(sj.id, sj.job.name, sj.job.deps, sj.state, sj.job.cwd) for sj in restarted._jobs.values()] == \
+        [(1, "a", [], QUEUED, "/tmp"), (2, "b", ["a"], QUEUED, "/tmp")]
+    assert (restarted._jobs[1].job.cores, restarted._jobs[1].job.retries) == (2, 1)
+    assert restarted._next_id == 3
+
+
+def test_over_the_socket(tmp_path, monkeypatch):
+    monkeypatch.setattr(resources, "host_available_memory", lambda: 64 * GiB)
+    monkeypatch.setattr(resources.os, "getloadavg", lambda: (0.0, 0.0, 0.0))
+    budget = ResourceBudget(max_mem = 16 * GiB, max_cores = 8, max_load = 64)
+    sock = str(tmp_path / "sock")
+    daemon = JobDaemon(sock, str(tmp_path / "state"), budget, max_mem = 16 * GiB, max_cores = 8)
+    work = tmp_path / "work"
+    work.mkdir()
+
+    def request(**msg):
+        return send_request(sock, **msg)
+
+    async def until(check):
+        for _ in range(500):
+            reply = await asyncio.to_thread(request, type = "list")
+            if check({job["name"]: job for job in reply["jobs"]}):
+                return reply
+            await asyncio.sleep(0.01)
+        raise AssertionError("timed out")
+
+    async def main():
+        task = asyncio.create_task(daemon.run_async())
+        while not os.path.exists(sock):
+            await asyncio.sleep(0.01)
+        reply = await asyncio.to_thread(
+            request, type = "submit", cwd = str(work), env = dict(os.environ, GREETING = "hi"),
+            lines = ["@hello: echo $GREETING > greeting", "@after after=hello: cp greeting copy",
+                     "@slow: sleep 30"])
+        assert reply["ok"] and [job["name"] for job in reply["jobs"]] == ["hello", "after", "slow"]
+        await until(lambda jobs: jobs["after"]["state"] == COMPLETED and jobs["slow"]["state"] == RUNNING)
+        reply = await asyncio.to_thread(request, type = "cancel", ids = [reply["jobs"][2]["id"]])
+        assert reply == {"ok": True, "cancelled": [3]}
+        await until(lambda jobs: jobs["slow"]["state"] == "cancelled")
+        assert (await asyncio.to_thread(request, type = "bogus"))["ok"] is False
+        daemon._stop()
+        await task
+
+    asyncio.run(main())
+    assert (work / "copy").read_text() == "hi\n"
+    assert json.loads((tmp_path / "state" / "queue.json").read_text())["jobs"] == []
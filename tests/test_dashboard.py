@@ -0,0 +1,75 @@
+import json
+
+from util.runner.dashboard import Dashboard, JobProgress
+
+def write_events(path, events, partial = ""):
+    with open(path, "a") as f:
+        f.write("".join(json.dumps(event) + "\n" for event in events) + partial)
+
+
+def event(name, phase, insts, host_time, **fields):
+    return dict(event = name, phase = phase, insts = insts, host_time = host_time, **fields)
+
+
+def test_progress_by_insts(tmp_path):
+    path = tmp_path / "run.events.jsonl"
+    write_events(path, [
+        {"event": "plan", "planned_rois": 2, "planned_insts": 4000000, "host_time": 0},
+        event("phase", "ff", 0, 100.0),
+        event("phase", "warmup", 1000000, 110.0, roi = 1),
+    ], partial = '{"event": "phase", "pha')
+    progress = JobProgress("run", str(path))
+    progress.update()
+    assert (progress.phase, progress.roi, progress.rois_done) == ("warmup", 1, 0)
+    # 1M insts in 10 s
+    assert progress.kips() == 100.0
+    # 3M insts left at that rate, 5 s of which have passed since
+    assert progress.eta(115.0) == 25.0
+
+    # (the rest of the partly written line, and the ROI)
+    with open(path, "a") as f:
+        f.write('se": "roi", "insts": 2000000, "host_time": 130.0, "roi": 1}\n')
+    write_events(path, [event("roi_end", "roi", 3000000, 140.0, roi = 1)])
+    progress.update()
+    assert (progress.phase, progress.rois_done) == ("roi", 1)
+    assert progress.kips() == 100.0
+    assert progress.eta(140.0) == 1000000 * 40.0 / 3000000
+    assert progress.row(140.0).split() == ["run", "roi", "1/2", "100.0", "0:00:13"]
+
+
+def test_progress_by_rois(tmp_path):
+    path = tmp_path / "run.events.jsonl"
+    write_events(path, [
+        {"event": "plan", "planned_rois": 4, "planned_insts": None, "host_time": 0},
+        event("phase", "ff", None, 0.0),
+        event("phase", "ff", 0, 10.0),
+        event("roi_end", "roi", 0, 70.0),
+    ])
+    progress = JobProgress("run", str(path))
+    progress.update()
+    # 3 more ROIs at a minute each
+    assert progress.eta(70.0) == 180.0
+    assert progress.kips() is None
+
+
+def test_progress_without_plan(tmp_path):
+    progress = JobProgress("run", str(tmp_path / "missing.jsonl"))
+    progress.update()
+    assert progress.phase == "starting"
+    assert progress.eta(0.0) is None
+    assert progress.row(0.0).split() == ["run", "starting", "0", "-", "-"]
+
+
+def test_report_running_jobs(tmp_path, capsys):
+    dashboard = Dashboard()
+    write_events(tmp_path / "a.jsonl", [event("phase", "ff", 0, 0.0)])
+    dashboard.watch("a", str(tmp_path / "a.jsonl"))
+    dashboard.watch("b", str(tmp_path / "b.jsonl"))
+    dashboard.report()
+    out = capsys.readouterr().out
+    assert "2 running" in out
+    assert "  a " in out and "  b " not in out
+    dashboard.unwatch("a")
+    dashboard.report()
+    # (nothing reported yet)
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,96 @@
+import os
+
+from util.runner.executor import JobExecutor, direct_argv
+from util.runner.jobs import Job, parse_job_lines
+
+def test_direct_argv():
+    env = {"HOME": "/home/me"}
+    assert direct_argv("gem5.opt -d out x.py --cores 4", env) == \
+        ["gem5.opt", "-d", "out", "x.py", "--cores", "4"]
+    assert direct_argv("ls \"$HOME/a b\" $HOME", env) == ["ls", "/home/me/a b", "/home/me"]
+    # (needs a shell)
+    for cmd in ["ls ${HOME}", "ls | wc", "a && b", "echo $UNSET", "echo '$HOME'", "cd /tmp", "X=1 gem5.opt",
+                "ls *.py", "echo \"unterminated"]:
+        assert direct_argv(cmd, env) is None, cmd
+
+
+def test_runs_and_logs(tmp_path):
+    executor = JobExecutor(log_dir = str(tmp_path / "logs"))
+    jobs = [Job("echo hello", name = "ok"), Job("echo oops >&2; exit 3", name = "bad")]
+    assert not executor.run(jobs)
+    assert executor.results == {"ok": 0, "bad": 3}
+    assert (tmp_path / "logs" / "ok.out").read_text() == "hello\n"
+    assert (tmp_path / "logs" / "bad.err").read_text() == "oops\n"
+
+
+def test_dependencies(tmp_path):
+    marks = tmp_path / "marks"
+    executor = JobExecutor(log_dir = str(tmp_path / "logs"))
+    jobs = parse_job_lines([
+        f"@a: echo a >> {marks}",
+        f"@b after=a: echo b >> {marks}",
+        "@fail: false",
+        "@c after=fail: echo c",
+    ])
+    assert not executor.run(jobs)
+    # (c never ran: its dependency failed)
+    assert executor.results == {"a": 0, "b": 0, "fail": 1}
+    assert marks.read_text() == "a\nb\n"
+
+
+def test_one_at_a_time(tmp_path):
+    marks = tmp_path / "marks"
+    executor = JobExecutor(max_parallel = 1, log_dir = str(tmp_path / "logs"))
+    jobs = [Job(f"echo start >> {marks}; sleep 0.1; echo end >> {marks}", name = f"j{i}")
+            for i in range(3)]
+    assert executor.run(jobs)
+    assert marks.read_text() == "start\nend\n" * 3
+
+
+def test_reads_lazily(tmp_path):
+    # jobs read ahead of the ones that have finished, as each is read
+    ahead = []
+    def jobs():
+        for i in range(10):
+            ahead.append(i + 1 - len(executor.results))
+            yield Job("true", name = f"j{i}")
+
+    executor = JobExecutor(max_parallel = 1, lookahead = 2, log_dir = str(tmp_path / "logs"))
+    assert executor.run(jobs())
+    assert len(executor.results) == 10
+    # (at most LOOKAHEAD waiting, plus the one running)
+    assert max(ahead) <= 3
+
+
+# Preempted the first time (leaving an older, incomplete checkpoint too),
+# resumed the second
+PREEMPTED_GEM5 = """#!/bin/sh
+out=${1#--outdir=}
+mkdir -p $out
+for arg; do last=$arg; done
+if [ -d "$last" ]; then
+    echo "$last" > resumed_from
+    cp $last/stats.preempted.txt $out/
+    echo after > $out/stats.txt
+    exit 0
+fi
+mkdir -p $GEM5_PREEMPT_DIR/preempt.100 $GEM5_PREEMPT_DIR/preempt.50 $GEM5_PREEMPT_DIR/preempt.200
+echo before > $GEM5_PREEMPT_DIR/preempt.100/stats.preempted.txt
+echo '{}' > $GEM5_PREEMPT_DIR/preempt.50/manager_state.json
+echo '{}' > $GEM5_PREEMPT_DIR/preempt.100/manager_state.json
+exit 75
+"""
+
+def test_preempted_job_resumes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    gem5 = tmp_path / "gem5.opt"
+    gem5.write_text(PREEMPTED_GEM5)
+    gem5.chmod(0o755)
+    (tmp_path / "config.py").write_text("")
+    executor = JobExecutor(log_dir = "logs")
+    assert executor.run([Job("./gem5.opt --outdir=out config.py", name = "run")])
+    assert executor.results == {"run": 0}
+    # from the newest complete checkpoint
+    assert (tmp_path / "resumed_from").read_text() == f"{tmp_path}/out/preempt/preempt.100\n"
+    assert (tmp_path / "out" / "stats.txt").read_text() == "before\nafter\n"
+    assert sorted(os.listdir(tmp_path / "out")) == ["stats.txt"]
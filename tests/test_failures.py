@@ -0,0 +1,80 @@
+import asyncio
+import signal
+
+import pytest
+
+from util.runner.executor import JobExecutor, TIMEOUT_EXIT_CODE
+from util.runner.failures import (
+    FailureKind, PREEMPTED_EXIT_CODE, classify_failure, parse_failure_kinds
+)
+from util.runner.jobs import Job
+
+@pytest.mark.parametrize("exit_code, output, kind", [
+    (1, ["panic: KVM: Failed to enter virtualized mode (hw reason: 0x80000021)"], FailureKind.KVM),
+    (1, ["open: Stale file handle"], FailureKind.IO),
+    (134, ["terminate called after throwing an instance of 'std::bad_alloc'"], FailureKind.OOM),
+    (-signal.SIGKILL, [], FailureKind.OOM),
+    (128 + signal.SIGKILL, [], FailureKind.OOM),
+    (1, ["Traceback (most recent call last):", "  ...", "KeyError: 'x'"], FailureKind.CONFIG),
+    (2, ["usage: gem5 x.py", "x.py: error: argument --cores: invalid int value"], FailureKind.CONFIG),
+    (PREEMPTED_EXIT_CODE, ["Stale file handle"], FailureKind.PREEMPTED),
+    (1, ["something else"], FailureKind.UNKNOWN),
+])
+def test_classify(exit_code, output, kind):
+    assert classify_failure(exit_code, output) == kind
+
+
+def test_classify_timeout_first():
+    assert classify_failure(-signal.SIGKILL, ["KVM"], timed_out = True) == FailureKind.TIMEOUT
+
+
+def test_parse_failure_kinds():
+    assert parse_failure_kinds("kvm, io,") == [FailureKind.KVM, FailureKind.IO]
+    with pytest.raises(ValueError):
+        parse_failure_kinds("kvm,disk")
+
+
+def test_timeout(tmp_path):
+    executor = JobExecutor(log_dir = str(tmp_path / "logs"), default_timeout = 0.2)
+    assert not executor.run([Job("sleep 10", name = "slow")])
+    assert executor.results == {"slow": TIMEOUT_EXIT_CODE}
+
+
+@pytest.fixture
+def backoffs(monkeypatch):
+    """The retry backoffs waited for (without waiting)"""
+    delays = []
+    sleep = asyncio.sleep
+    def no_wait(delay, *args, **kwargs):
+        delays.append(delay)
+        return sleep(0, *args, **kwargs)
+    monkeypatch.setattr(asyncio, "sleep", no_wait)
+    return delays
+
+
+def test_retry_until_success(tmp_path, backoffs):
+    # fails with an I/O error twice, then works
+    count = tmp_path / "count"
+    cmd = (f"echo x >> {count}; [ $(wc -l < {count}) -gt 2 ] && exit 0;"
+           " echo 'Stale file handle' >&2; exit 1")
+    executor = JobExecutor(log_dir = str(tmp_path / "logs"), default_retries = 3)
+    assert executor.run([Job(cmd, name = "flaky")])
+    assert executor.results == {"flaky": 0}
+    assert count.read_text() == "x\n" * 3
+    # (doubling each time)
+    assert [delay for delay in backoffs if delay] == [60.0, 120.0]
+
+
+def test_retries_run_out(tmp_path, backoffs):
+    executor = JobExecutor(log_dir = str(tmp_path / "logs"), retry_backoff = 1.0)
+    jobs = [Job("echo 'Stale file handle' >&2; exit 1", name = "io", retries = 2)]
+    assert not executor.run(jobs)
+    assert executor.results == {"io": 1}
+    assert [delay for delay in backoffs if delay] == [1.0, 2.0]
+
+
+def test_no_retry_for_deterministic_failures(tmp_path, backoffs):
+    executor = JobExecutor(log_dir = str(tmp_path / "logs"), default_retries = 3)
+    assert not executor.run([Job("echo 'ValueError: bad' >&2; exit 1", name = "config")])
+    assert executor.results == {"config": 1}
+    assert not any(backoffs)
@@ -0,0 +1,97 @@
+import json
+import os
+
+import pytest
+
+from fan_out_checkpoints import merge_results
+from util.runner.fanout import SIMPOINT_FILE, fanout_jobs, plan_fanout, write_manifest
+from util.stats.sampling import INSTS_STAT, CYCLES_STAT
+
+STATS = {"insts": INSTS_STAT, "cycles": CYCLES_STAT}
+
+def make_checkpoints(tmp_path, simpoints):
+    checkpoints = tmp_path / "checkpoints"
+    for tick, simpoint in simpoints.items():
+        checkpoint = checkpoints / f"chkpt.{tick}"
+        checkpoint.mkdir(parents = True)
+        if simpoint is not None:
+            (checkpoint / SIMPOINT_FILE).write_text(json.dumps(simpoint))
+    # (not checkpoints)
+    (checkpoints / "chkpt.x").mkdir()
+    (checkpoints / "m5out").mkdir()
+    return str(checkpoints)
+
+
+def restore_dumps(insts, cycles, sim_insts):
+    core = "system.processor.cores.core"
+    roi = {"simInsts": sim_insts, f"{core}.committedInsts": insts, f"{core}.numCycles": cycles}
+    # gem5's final block (simInsts still counts the warmup and ROI), with
+    # whatever ran after the ROI's dump
+    final = {"simInsts": sim_insts + 10, f"{core}.committedInsts": 10, f"{core}.numCycles": 50}
+    return [roi, final]
+
+
+def test_plan_fanout(tmp_path):
+    checkpoints = make_checkpoints(tmp_path, {
+        20: dict(weight = 0.25, warmup_insts = 1500000, roi_insts = 2000000),
+        3: dict(weight = 0.75, warmup_insts = 0, roi_insts = 2000000),
+    })
+    runs = plan_fanout(checkpoints, "out")
+    assert [os.path.basename(run["checkpoint"]) for run in runs] == ["chkpt.3", "chkpt.20"]
+    assert [run["outdir"] for run in runs] == ["out/chkpt.3", "out/chkpt.20"]
+    # (rounded up to millions)
+    assert [(run["warmup"], run["roi"], run["weight"]) for run in runs] == [(0, 2, 0.75), (2, 2, 0.25)]
+    assert plan_fanout(checkpoints, "out", warmup = 5, roi = 1)[0]["warmup"] == 5
+
+
+def test_plan_fanout_needs_roi(tmp_path):
+    checkpoints = make_checkpoints(tmp_path, {1: None, 2: None})
+    with pytest.raises(ValueError):
+        plan_fanout(checkpoints, "out")
+    assert [run["weight"] for run in plan_fanout(checkpoints, "out", roi = 10)] == [None, None]
+
+
+def test_fanout_jobs(tmp_path):
+    checkpoints = make_checkpoints(tmp_path, {1: None})
+    runs = plan_fanout(checkpoints, "out", warmup = 0, roi = 10)
+    job, = fanout_jobs("gem5.opt configs/restore.py --disk_image spec", runs, "timeout=1h")
+    assert job.cmd.startswith("gem5.opt --outdir=out/chkpt.1 configs/restore.py")
+    assert f"--start_from {runs[0]['checkpoint']}" in job.cmd
+    assert "--roi 10" in job.cmd and "--warmup" not in job.cmd
+    assert job.timeout == 3600
+    with pytest.raises(ValueError):
+        list(fanout_jobs("echo hi", runs))
+
+
+def test_merge_results_uses_roi_dump(tmp_path, write_stats):
+    outdir = tmp_path / "fanout"
+    runs = []
+    for i, (insts, cycles) in enumerate([(1000, 1000), (1000, 2000), (1000, 3000)]):
+        run_outdir = outdir / f"chkpt.{i}"
+        write_stats(restore_dumps(insts, cycles, 5000), f"fanout/chkpt.{i}/stats.txt")
+        runs.append(dict(checkpoint = f"chkpt.{i}", outdir = str(run_outdir),
+                         warmup = 4, roi = 1, weight = None))
+    # (one that didn't run)
+    runs.append(dict(checkpoint = "chkpt.9", outdir = str(outdir / "chkpt.9"),
+                     warmup = 4, roi = 1, weight = None))
+    write_manifest(str(outdir), runs)
+
+    result = merge_results(str(outdir), STATS, [], 0.95)
+    assert (result["checkpoints"], result["merged"], result["weighted"]) == (4, 3, False)
+    assert [run["insts"] for run in result["runs"]] == [1000, 1000, 1000]
+    assert result["metrics"]["cpi"]["estimate"] == pytest.approx(2.0)
+    assert result["metrics"]["cpi"]["half_width"] > 0
+
+
+def test_merge_results_weighted(tmp_path, write_stats):
+    outdir = tmp_path / "fanout"
+    runs = []
+    for i, (cycles, weight) in enumerate([(1000, 0.5), (3000, 0.25)]):
+        write_stats(restore_dumps(1000, cycles, 5000), f"fanout/chkpt.{i}/stats.txt")
+        runs.append(dict(checkpoint = f"chkpt.{i}", outdir = str(outdir / f"chkpt.{i}"),
+                         warmup = 4, roi = 1, weight = weight))
+    write_manifest(str(outdir), runs)
+
+    result = merge_results(str(outdir), STATS, [], 0.95)
+    assert result["weighted"] and result["weight"] == pytest.approx(0.75)
+    assert result["metrics"]["cpi"]["estimate"] == pytest.approx((0.5 * 1 + 0.25 * 3) / 0.75)
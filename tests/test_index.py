@@ -0,0 +1,83 @@
+import json
+import math
+import os
+
+import pytest
+
+from util.stats.index import ExperimentIndex
+
+def write_run(write_stats, tmp_path, name, args, ipcs, components = None, stats_name = "stats.txt"):
+    """An outdir NAME with its simargs.json and a dump per IPC in IPCS"""
+    outdir = tmp_path / name
+    outdir.mkdir(exist_ok = True)
+    (outdir / "simargs.json").write_text(json.dumps(
+        {"script": "fs_spec06gap_with_sampling.py", "args": args, "components": components or {}}))
+    write_stats([{"simInsts": 1000 * (i + 1), "system.processor.cores0.core.ipc": ipc,
+                  "system.other": 5} for i, ipc in enumerate(ipcs)], f"{name}/{stats_name}")
+    return str(outdir)
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = ExperimentIndex(str(tmp_path / "experiments.db"))
+    yield index
+    index.close()
+
+
+def test_add(index, tmp_path, write_stats):
+    outdir = write_run(write_stats, tmp_path, "mcf", {"benchmark": "mcf", "rois": 2, "fast": False},
+                       [1.0, 2.0], components = {"processor": "SimargsSwitchableProcessor"})
+    assert index.add(outdir)
+    assert index.query("SELECT outdir, script, dumps FROM runs") == \
+        [(outdir, "fs_spec06gap_with_sampling.py", 2)]
+    assert sorted(index.query("SELECT name, value FROM params")) == \
+        [("benchmark", "mcf"), ("fast", "false"), ("rois", "2")]
+    assert index.query("SELECT role, class FROM components") == [("processor", "SimargsSwitchableProcessor")]
+    # (only the summary stats)
+    assert sorted(index.query("SELECT name, total, mean FROM results")) == [
+        ("simInsts", 3000.0, 1500.0), ("system.processor.cores0.core.ipc", 3.0, 1.5)]
+
+
+def test_reindex_and_missing_simargs(index, tmp_path, write_stats):
+    outdir = write_run(write_stats, tmp_path, "mcf", {"benchmark": "mcf"}, [1.0])
+    index.add(outdir)
+    write_run(write_stats, tmp_path, "mcf", {"benchmark": "mcf"}, [1.0, 3.0])
+    index.add(outdir)
+    assert index.query("SELECT count(*), max(dumps) FROM runs") == [(1, 2)]
+    assert index.query("SELECT count(*) FROM params") == [(1,)]
+    os.mkdir(tmp_path / "empty")
+    assert not index.add(str(tmp_path / "empty"))
+
+
+def test_variants(index, tmp_path, write_stats):
+    variants = tmp_path / "variants.json"
+    variants.write_text(json.dumps({"o3": {"rob_size": 192}, "minor": {}}))
+    args = {"benchmark": "lbm", "switch_variants": str(variants)}
+    outdir = write_run(write_stats, tmp_path, "lbm", args, [2.0], stats_name = "stats.rois.o3.txt")
+    write_run(write_stats, tmp_path, "lbm", args, [1.0], stats_name = "stats.rois.minor.txt")
+    assert index.add(outdir)
+    assert index.query("SELECT outdir FROM runs ORDER BY outdir") == [(f"{outdir}:minor",), (f"{outdir}:o3",)]
+    assert index.query("SELECT value FROM params JOIN runs ON runs.id = run_id "
+                       "WHERE name = 'rob_size' AND outdir = ?", [f"{outdir}:o3"]) == [("192",)]
+    assert index.compare("*.core.ipc", ["switch_variant"]) == [("minor", 1.0, 1), ("o3", 2.0, 1)]
+
+
+def test_compare(index, tmp_path, write_stats):
+    for bench, repl, ipcs in [("mcf", "lru", [1.0]), ("lbm", "lru", [4.0]),
+                              ("mcf", "rrip", [2.0, 4.0]), ("lbm", "rrip", [2.0])]:
+        index.add(write_run(write_stats, tmp_path, f"{bench}-{repl}",
+                            {"benchmark": bench, "llc_repl": repl, "cores": 1}, ipcs))
+    lru, rrip = index.compare("*.core.ipc", ["llc_repl"])
+    assert lru[0] == "lru" and math.isclose(lru[1], 2.0) and lru[2] == 2
+    assert rrip[0] == "rrip" and math.isclose(rrip[1], math.sqrt(6.0)) and rrip[2] == 2
+    assert index.compare("*.core.ipc", ["llc_repl"], aggregate = "max", where = {"benchmark": "mcf"}) == \
+        [("lru", 1.0, 1), ("rrip", 3.0, 1)]
+    assert index.compare("*.core.ipc", [], aggregate = "count", where = {"cores": 1}) == [(4, 4)]
+    assert index.compare("simInsts", ["llc_repl"], where = {"cores": 2}) == []
+    with pytest.raises(ValueError):
+        index.compare("*.core.ipc", ["llc_repl"], aggregate = "median")
+
+
+def test_geomean_of_nonpositive(index):
+    assert index.query("SELECT geomean(x) FROM (SELECT 2.0 AS x UNION ALL SELECT 0.0)") == [(None,)]
+    assert index.query("SELECT geomean(x) FROM (SELECT 2.0 AS x UNION ALL SELECT 8.0 UNION ALL SELECT NULL)") == [(4.0,)]
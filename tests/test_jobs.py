@@ -0,0 +1,139 @@
+import pytest
+
+from util.runner.jobs import (
+    Job, JobGraph, add_simarg, gem5_outdir, get_arg, parse_duration, parse_job_line,
+    parse_job_lines, parse_size, split_gem5_command, with_gem5_outdir
+)
+
+def test_plain_line():
+    job = parse_job_line("  echo hello  ", line = 3)
+    assert (job.cmd, job.name, job.anonymous, job.deps) == ("echo hello", "line3", True, [])
+    assert parse_job_line("") is None
+    assert parse_job_line("# a comment") is None
+
+
+def test_named_line_with_attributes():
+    job = parse_job_line("@run2 after=run0,run1 mem=2G cores=4 timeout=1.5h retries=0 priority=5: gem5.opt x.py")
+    assert job.name == "run2" and not job.anonymous
+    assert job.deps == ["run0", "run1"]
+    assert (job.mem, job.cores, job.timeout, job.retries, job.priority) == (2 << 30, 4, 5400, 0, 5)
+    assert job.cmd == "gem5.opt x.py"
+    # (round trip)
+    again = parse_job_line(job.to_line())
+    assert (again.name, again.deps, again.mem, again.timeout, again.retries, again.priority) == \
+        (job.name, job.deps, job.mem, job.timeout, job.retries, job.priority)
+
+
+@pytest.mark.parametrize("line", [
+    "@run echo hi",             # no ": "
+    "@: echo hi",               # no name
+    "@run mem: echo hi",        # no value
+    "@run mem=lots: echo hi",
+    "@run cores=0: echo hi",
+    "@run retries=-1: echo hi",
+    "@run colour=red: echo hi",
+])
+def test_bad_lines(line):
+    with pytest.raises(ValueError):
+        parse_job_line(line, line = 7)
+
+
+def test_parse_job_lines_numbers_lines():
+    jobs = list(parse_job_lines(["echo a", "", "# skip", "@b: echo b"]))
+    assert [(job.name, job.line) for job in jobs] == [("line1", 1), ("b", 4)]
+
+
+def test_job_key():
+    # anonymous jobs are who their command is, named ones also their name
+    assert Job("echo a", line = 1).key == Job("echo a", line = 9).key
+    assert Job("echo a", name = "x").key != Job("echo a", name = "y").key
+
+
+@pytest.mark.parametrize("text, size", [
+    ("512", 512), ("512M", 512 << 20), ("3GB", 3 << 30), ("1.5G", 3 << 29), ("2GiB", 2 << 30), ("1k", 1024)
+])
+def test_parse_size(text, size):
+    assert parse_size(text) == size
+
+
+def test_parse_duration():
+    assert parse_duration("90") == 90
+    assert parse_duration("30m") == 1800
+    assert parse_duration("1.5d") == 1.5 * 86400
+    with pytest.raises(ValueError):
+        parse_duration("soon")
+
+
+def test_gem5_command_helpers():
+    cmd = "gem5.opt -d out/a --debug-flags=X cfg.py --roi 10 --warmup=5 > log 2>&1"
+    assert split_gem5_command(cmd) == ("cfg.py", ["--roi", "10", "--warmup=5"])
+    assert split_gem5_command("echo hi") == (None, [])
+    assert gem5_outdir(cmd) == "out/a"
+    assert gem5_outdir("gem5.opt cfg.py --outdir x") == "m5out"
+    assert Job(cmd, cwd = "/work").outdir == "/work/out/a"
+
+    moved = with_gem5_outdir(cmd, "out/b c")
+    assert gem5_outdir(moved) == "out/b c"
+    assert gem5_outdir(with_gem5_outdir("gem5.opt cfg.py", "new")) == "new"
+
+    added = add_simarg(cmd, "--roi", "20")
+    assert added == "gem5.opt -d out/a --debug-flags=X cfg.py --roi 10 --warmup=5 --roi 20 > log 2>&1"
+    _, args = split_gem5_command(added)
+    assert get_arg(args, "--roi") == "20"
+    assert get_arg(args, "--warmup") == "5"
+    assert get_arg(args, "--ff") is None
+
+
+def job(name, *deps):
+    return Job(f"echo {name}", name = name, deps = list(deps))
+
+
+def test_graph_readiness():
+    graph = JobGraph()
+    a, b, c = job("a"), job("b", "a"), job("c", "a", "b")
+    for j in [a, b, c]:
+        assert graph.add(j) == []
+    assert graph.pop_ready() == [a]
+    assert graph.pop_ready() == []
+    graph.complete(a, True)
+    assert graph.pop_ready() == [b]
+    graph.complete(b, True)
+    assert graph.pop_ready() == [c]
+    assert not graph.finished()
+    graph.complete(c, True)
+    assert graph.finished()
+
+
+def test_graph_skips_downstream_of_failures():
+    graph = JobGraph()
+    a, b, c, d = job("a"), job("b", "a"), job("c", "b"), job("d")
+    for j in [a, b, c, d]:
+        graph.add(j)
+    graph.pop_ready()
+    assert {j.name for j in graph.complete(a, False)} == {"b", "c"}
+    # added after the failure: skipped right away
+    e = job("e", "c")
+    assert graph.add(e) == [e]
+    graph.complete(d, True)
+    assert graph.finished()
+
+
+def test_graph_rejects_bad_deps():
+    graph = JobGraph()
+    graph.add(job("a"))
+    with pytest.raises(ValueError):
+        graph.add(job("a"))
+    with pytest.raises(ValueError):
+        graph.add(job("b", "later"))
+
+
+def test_critical_path():
+    runtimes = {"a": 10, "b": 5, "c": 100, "d": 1}
+    graph = JobGraph(lambda j: runtimes[j.name])
+    a, b, c, d = job("a"), job("b", "a"), job("c", "b"), job("d", "a")
+    for j in [a, b, c, d]:
+        graph.add(j)
+    assert graph.critical_path(c) == 100
+    assert graph.critical_path(b) == 105
+    assert graph.critical_path(a) == 115
+    assert graph.critical_path(d) == 1
@@ -0,0 +1,64 @@
+import asyncio
+import gzip
+
+from util.runner.logs import LineTail, RotatingLog, capture, log_basename
+
+def test_rotation(tmp_path):
+    path = tmp_path / "job.out"
+    log = RotatingLog(str(path), max_bytes = 4, backups = 2)
+    log.write(b"abcdefghij")
+    log.close()
+    # newest first: 4 bytes per segment, the oldest dropped
+    assert path.read_bytes() == b"ij"
+    assert (tmp_path / "job.out.1").read_bytes() == b"efgh"
+    assert (tmp_path / "job.out.2").read_bytes() == b"abcd"
+    assert not (tmp_path / "job.out.3").exists()
+
+
+def test_compressed_rotation(tmp_path):
+    path = tmp_path / "job.err"
+    log = RotatingLog(str(path), max_bytes = 3, backups = 1, compress = True)
+    log.write(b"abcde")
+    log.close()
+    assert gzip.open(tmp_path / "job.err.1.gz").read() == b"abc"
+    assert gzip.open(tmp_path / "job.err.gz").read() == b"de"
+    assert not path.exists()
+
+
+def test_zero_max_bytes_never_rotates(tmp_path):
+    path = tmp_path / "job.out"
+    log = RotatingLog(str(path), max_bytes = 0)
+    log.write(b"abc")
+    log.write(b"def")
+    log.close()
+    assert path.read_bytes() == b"abcdef"
+    assert not (tmp_path / "job.out.1").exists()
+
+
+def test_line_tail():
+    tail = LineTail(max_lines = 2)
+    tail.write(b"one\ntwo\nthr")
+    tail.write(b"ee\nfour")
+    assert tail.lines() == ["three", "four"]
+
+
+def test_capture(tmp_path):
+    async def run():
+        stream = asyncio.StreamReader()
+        stream.feed_data(b"hello\nworld\n")
+        stream.feed_eof()
+        tail = LineTail()
+        await capture(stream, RotatingLog(str(tmp_path / "x.out")), tail)
+        return tail
+    tail = asyncio.run(run())
+    assert tail.lines() == ["hello", "world"]
+    assert (tmp_path / "x.out").read_bytes() == b"hello\nworld\n"
+
+
+def test_log_basename():
+    assert log_basename("sweep/mcf run:1") == "sweep_mcf_run_1"
+
+
+def test_final_path(tmp_path):
+    assert RotatingLog(str(tmp_path / "a.out")).path == str(tmp_path / "a.out")
+    assert RotatingLog(str(tmp_path / "a.err"), compress = True).path == str(tmp_path / "a.err.gz")
@@ -0,0 +1,65 @@
+import gzip
+import json
+import math
+
+from conftest import stats_text
+from util.stats.reader import StatsFile, index_path
+
+DUMPS = [
+    {"simInsts": 100, "system.cpu0.numCycles": 150, "system.cpu1.numCycles": 50,
+     "system.l2.missRate": "nan"},
+    {"simInsts": 300, "system.cpu0.numCycles": 400, "system.cpu1.numCycles": 90,
+     "system.l2.missRate": 0.25},
+]
+
+def test_dumps_and_stats(write_stats):
+    path = write_stats(DUMPS)
+    with StatsFile(path) as stats:
+        assert len(stats) == 2
+        assert stats.get("simInsts", 0) == 100
+        assert stats.get("simInsts") == 300
+        assert stats.get("simTicks") is None
+        # (not a prefix of a longer name)
+        assert stats.get("system.cpu0.num") is None
+        assert math.isnan(stats.get("system.l2.missRate", 0))
+        assert stats.dump(-1, ["simInsts", "system.cpu*.numCycles"]) == \
+            {"simInsts": 300, "system.cpu0.numCycles": 400, "system.cpu1.numCycles": 90}
+        assert stats.dump(0, ["nothing"]) == {"nothing": None}
+        assert len(stats.dump(1)) == 4
+        assert stats.series(["simInsts", "system.cpu1.*"]) == \
+            {"simInsts": [100, 300], "system.cpu1.numCycles": [50, 90]}
+        assert "simInsts" in stats.raw(0)
+
+
+def test_index_is_reused_and_extended(write_stats, tmp_path):
+    path = write_stats(DUMPS)
+    with StatsFile(path):
+        pass
+    with open(index_path(path), "r") as f:
+        assert len(json.load(f)["dumps"]) == 2
+    with StatsFile(path) as stats:
+        assert stats.get("simInsts") == 300
+
+    # a running simulation appends a dump, and is partway through the next
+    with open(path, "a") as f:
+        f.write(stats_text([{"simInsts": 600}]))
+        f.write("\n---------- Begin Simulation Statistics ----------\nsimInsts 9")
+    with StatsFile(path) as stats:
+        assert len(stats) == 3
+        assert stats.get("simInsts") == 600
+
+
+def test_gzipped(tmp_path):
+    path = tmp_path / "stats.txt.gz"
+    with gzip.open(path, "wt") as f:
+        f.write(stats_text(DUMPS))
+    with StatsFile(str(path), save_index = False) as stats:
+        assert len(stats) == 2
+        assert stats.get("system.cpu0.numCycles") == 400
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / "stats.txt"
+    path.write_text("")
+    with StatsFile(str(path)) as stats:
+        assert len(stats) == 0
@@ -0,0 +1,66 @@
+import pytest
+
+import util.runner.resources as resources
+from util.runner.jobs import Job
+from util.runner.resources import GiB, ResourceBudget, estimate_footprint
+
+@pytest.fixture
+def host(monkeypatch):
+    """A machine with 64G free and no load, adjustable by the test."""
+    state = dict(available = 64 * GiB, load = 0.0)
+    monkeypatch.setattr(resources, "host_available_memory", lambda: state["available"])
+    monkeypatch.setattr(resources.os, "getloadavg", lambda: (state["load"], 0.0, 0.0))
+    return state
+
+
+def job(mem, cores = 1):
+    return Job(f"echo {mem}", mem = mem * GiB, cores = cores)
+
+
+def test_budget_limits_memory_and_cores(host):
+    budget = ResourceBudget(max_mem = 10 * GiB, max_cores = 4, min_free_mem = 2 * GiB, max_load = 64)
+    first, second, third = job(6), job(4, cores = 3), job(1)
+    assert budget.idle()
+    assert budget.admit(first)
+    assert budget.admit(second)
+    # out of memory (and cores)
+    assert not budget.admit(third)
+    budget.release(first)
+    assert budget.admit(third)
+    assert not budget.idle()
+
+
+def test_oversized_job_runs_alone(host):
+    budget = ResourceBudget(max_mem = 4 * GiB, max_cores = 2, max_load = 64)
+    big = job(8, cores = 4)
+    assert budget.admit(big)
+    assert not budget.admit(job(1))
+
+
+def test_budget_checks_the_machine(host):
+    host["available"] = 5 * GiB
+    budget = ResourceBudget(max_mem = 100 * GiB, max_cores = 16, min_free_mem = 2 * GiB, max_load = 8)
+    assert budget.admit(job(2))
+    # the snapshot is charged for jobs admitted since
+    assert not budget.admit(job(2))
+
+    host["available"] = 64 * GiB
+    host["load"] = 7.0
+    budget.refresh()
+    # others' load: 7 - our 1 core
+    assert budget.admit(job(1))
+    assert not budget.admit(job(1))
+
+
+def test_estimate_footprint(tmp_path):
+    script = tmp_path / "fs_test.py"
+    script.write_text('memory = DualChannelDDR4_2400(size="8GB")\n')
+    fs = Job(f"gem5.opt {script} --cores 4 --start_core_type kvm")
+    mem, cores = estimate_footprint(fs)
+    assert mem == resources.GEM5_BASE_MEM + 4 * resources.GEM5_PER_CORE_MEM + 8 * GiB
+    assert cores == 4
+    assert estimate_footprint(Job("gem5.opt se_test.py")) == \
+        (resources.GEM5_BASE_MEM + resources.GEM5_PER_CORE_MEM, 1)
+    assert estimate_footprint(Job("echo hi")) == (resources.OTHER_CMD_MEM, 1)
+    # declared in the command file
+    assert estimate_footprint(Job("echo hi", mem = GiB, cores = 2)) == (GiB, 2)
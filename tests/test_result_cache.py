@@ -0,0 +1,135 @@
+import os
+
+import pytest
+
+from util.runner.executor import JobExecutor
+from util.runner.jobs import Job
+from util.runner.result_cache import ResultCache
+
+SCRIPT = """
+import util.simarglib as simarglib
+parser = simarglib.add_parser("Test")
+parser.add_argument("--variants", type=str, help="JSON file of variants")
+parser.add_argument("--rois", type=int, default=10)
+parser.add_argument("--checkpoint_dir", type=str)
+"""
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "config.py").write_text(SCRIPT)
+    return ResultCache(str(tmp_path / "cache"))
+
+
+def key(cache, args, outdir = "m5out"):
+    return cache.key(Job(f"gem5.opt --outdir={outdir} config.py {args}"))
+
+
+def test_key_ignores_spelling_and_outdir(cache):
+    assert key(cache, "") is not None
+    assert key(cache, "") == key(cache, "--rois 10", outdir = "elsewhere")
+    assert key(cache, "--rois 5") != key(cache, "")
+
+
+def test_key_hashes_files_named_by_simargs(cache, tmp_path):
+    variants = tmp_path / "variants.json"
+    variants.write_text('{"a": {}}')
+    before = key(cache, "--variants variants.json")
+    assert key(cache, "--variants variants.json") == before
+    variants.write_text('{"a": {}, "b": {}}')
+    assert key(cache, "--variants variants.json") != before
+
+
+def test_key_changes_with_script(cache, tmp_path):
+    before = key(cache, "")
+    (tmp_path / "config.py").write_text(SCRIPT + "\n# changed\n")
+    assert key(cache, "") != before
+
+
+def test_uncacheable(cache):
+    assert key(cache, "--checkpoint_dir chkpts") is None
+    assert key(cache, "--rois ten") is None
+    assert cache.key(Job("echo hello")) is None
+
+
+def test_fetch_and_store(cache, tmp_path):
+    job = Job("gem5.opt --outdir=run1 config.py")
+    key, hit = cache.fetch(job)
+    assert key is not None and not hit
+    (tmp_path / "run1").mkdir()
+    (tmp_path / "run1" / "stats.txt").write_text("stats")
+    cache.store(job, key)
+
+    again = Job("gem5.opt --outdir=run2 config.py --rois 10")
+    assert cache.fetch(again) == (key, True)
+    assert (tmp_path / "run2" / "stats.txt").read_text() == "stats"
+
+
+def test_key_follows_inputs(cache, tmp_path):
+    (tmp_path / "gem5.opt").write_text("v1")
+    before = cache.key(Job("./gem5.opt --outdir=a config.py"))
+    # (only the outdir option is ignored)
+    assert cache.key(Job("./gem5.opt -d b config.py")) == before
+    assert cache.key(Job("./gem5.opt --debug-flags=Exec --outdir=a config.py")) != before
+    (tmp_path / "gem5.opt").write_text("v2")
+    assert cache.key(Job("./gem5.opt --outdir=a config.py")) != before
+
+
+def test_key_changes_with_local_modules(cache, tmp_path):
+    (tmp_path / "config.py").write_text(SCRIPT + "from lib import caches\n")
+    (tmp_path / "lib").mkdir()
+    (tmp_path / "lib" / "caches.py").write_text("L1 = 32\n")
+    before = key(cache, "")
+    (tmp_path / "lib" / "caches.py").write_text("L1 = 64\n")
+    assert key(cache, "") != before
+
+
+def test_key_hashes_checkpoints(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "config.py").write_text(SCRIPT + 'parser.add_argument("--start_from", type=str)\n')
+    (tmp_path / "chkpt").mkdir()
+    (tmp_path / "chkpt" / "m5.cpt").write_text("a")
+    cache = ResultCache(str(tmp_path / "cache"))
+    before = key(cache, "--start_from chkpt")
+    # (found again from the digests remembered in the cache dir)
+    assert key(ResultCache(str(tmp_path / "cache")), "--start_from chkpt") == before
+    (tmp_path / "chkpt" / "system.physmem.store0.pmem").write_text("b")
+    assert key(cache, "--start_from chkpt") != before
+
+
+def test_key_identifies_disk_images(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "config.py").write_text(SCRIPT + 'image = DiskImageResource("disk.img")\n')
+    (tmp_path / "disk.img").write_text("a")
+    cache = ResultCache(str(tmp_path / "cache"))
+    before = key(cache, "")
+    (tmp_path / "disk.img").write_text("ab")
+    assert key(cache, "") != before
+
+
+def test_store_top_level_files_and_summary(cache, tmp_path):
+    job = Job("gem5.opt --outdir=run1 config.py")
+    key, _ = cache.fetch(job)
+    (tmp_path / "run1" / "roi.1").mkdir(parents = True)
+    (tmp_path / "run1" / "stats.txt").write_text("stats")
+    (tmp_path / "run1" / "roi.1" / "stats.txt").write_text("roi")
+    cache.store(job, key)
+    cache.store(job, key)
+    assert cache.fetch(Job("gem5.opt --outdir=run2 config.py")) == (key, True)
+    assert os.listdir(tmp_path / "run2") == ["stats.txt"]
+    cache.fetch(Job("echo hi"))
+    assert cache.summary() == "1 hit(s), 1 miss(es), 1 stored, 1 uncacheable"
+
+
+def test_executor_uses_the_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "config.py").write_text(SCRIPT)
+    gem5 = tmp_path / "gem5.opt"
+    gem5.write_text('#!/bin/sh\nout=${1#--outdir=}\nmkdir -p $out\necho stats > $out/stats.txt\necho x >> runs\n')
+    gem5.chmod(0o755)
+    executor = JobExecutor(log_dir = "logs", cache = ResultCache("cache"))
+    assert executor.run([Job("./gem5.opt --outdir=run1 config.py", name = "a"),
+                         Job("./gem5.opt --outdir=run2 config.py --rois 10", name = "b", deps = ["a"])])
+    assert executor.results == {"a": 0, "b": 0}
+    assert (tmp_path / "runs").read_text() == "x\n"
+    assert (tmp_path / "run2" / "stats.txt").read_text() == "stats\n"
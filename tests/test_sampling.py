@@ -0,0 +1,134 @@
+import numpy as np
+import pytest
+
+from util.stats.sampling import (
+    estimate_metrics, ratio_estimate, required_samples, sample_stats, samples_from_stats,
+    weighted_estimate, z_score, INSTS_STAT, CYCLES_STAT
+)
+
+STATS = {"insts": INSTS_STAT, "cycles": CYCLES_STAT}
+
+def roi_dumps(rois):
+    """The stats.txt dumps of a sampled run with ROIS of (insts, cycles),
+    split over a start and a switched-in core, then gem5's final dump.
+    """
+    dumps = []
+    sim_insts = 0
+    for insts, cycles in rois:
+        sim_insts += insts + 1000
+        dumps.append({
+            "simInsts": sim_insts,
+            "system.processor.start.cores.core.committedInsts": 0,
+            "system.processor.start.cores.core.numCycles": 0,
+            "system.processor.switch.cores.core.committedInsts": insts,
+            "system.processor.switch.cores.core.numCycles": cycles,
+        })
+    dumps.append({
+        "simInsts": sim_insts,
+        "system.processor.start.cores.core.committedInsts": 0,
+        "system.processor.start.cores.core.numCycles": 0,
+        "system.processor.switch.cores.core.committedInsts": 0,
+        "system.processor.switch.cores.core.numCycles": 0,
+    })
+    return dumps
+
+
+def test_samples_count_each_roi_only(write_stats):
+    path = write_stats(roi_dumps([(100, 150)]))
+    samples = samples_from_stats([path], STATS)
+    # the ROI, then the final dump: not the cumulative simInsts
+    np.testing.assert_array_equal(samples["insts"], [[100, 0]])
+    np.testing.assert_array_equal(samples["cycles"], [[150, 0]])
+
+    metrics = estimate_metrics(samples)
+    assert metrics["cpi"]["estimate"][0] == pytest.approx(1.5)
+    assert metrics["ipc"]["estimate"][0] == pytest.approx(1 / 1.5)
+    assert metrics["cpi"]["n"][0] == 1
+
+
+def test_estimate_over_runs_of_different_lengths(write_stats):
+    paths = [write_stats(roi_dumps([(100, 100), (100, 300)]), "a/stats.txt"),
+             write_stats(roi_dumps([(200, 200)]), "b/stats.txt")]
+    samples = samples_from_stats(paths, STATS)
+    assert samples["insts"].shape == (2, 3)
+    assert np.isnan(samples["insts"][1, 2])
+
+    cpi = estimate_metrics(samples)["cpi"]
+    np.testing.assert_allclose(cpi["estimate"], [2.0, 1.0])
+    np.testing.assert_array_equal(cpi["n"], [2, 1])
+    # (one sample: no interval)
+    assert np.isnan(cpi["half_width"][1])
+    assert cpi["half_width"][0] > 0
+
+
+def test_missing_stat_is_nan(write_stats):
+    path = write_stats(roi_dumps([(100, 150)]))
+    samples = samples_from_stats([path], dict(STATS, misses = "*.l2.overallMisses"))
+    assert np.isnan(samples["misses"]).all()
+
+
+def test_ratio_estimate():
+    y = np.array([[10.0, 20.0, 30.0, 40.0]])
+    x = np.array([[10.0, 10.0, 10.0, 10.0]])
+    est = ratio_estimate(y, x, 0.95)
+    assert est["estimate"][0] == pytest.approx(2.5)
+    # equal ROIs: the CV of the per-ROI ratios
+    ratios = y[0] / x[0]
+    assert est["cv"][0] == pytest.approx(ratios.std(ddof = 1) / ratios.mean())
+    assert est["rel_error"][0] == pytest.approx(z_score(0.95) * est["cv"][0] / 2)
+    assert est["half_width"][0] == pytest.approx(est["rel_error"][0] * 2.5)
+
+
+def test_ratio_estimate_weights_longer_samples():
+    # a short last ROI counts for less than a mean of ratios would give it
+    est = ratio_estimate([1000.0, 1000.0, 30.0], [1000.0, 1000.0, 10.0])
+    assert est["estimate"] == pytest.approx(2030 / 2010)
+
+
+def test_ratio_estimate_ignores_empty_samples():
+    est = ratio_estimate([[10.0, 20.0, 0.0, np.nan]], [[10.0, 10.0, 0.0, 5.0]])
+    assert est["n"][0] == 2
+    assert est["estimate"][0] == pytest.approx(1.5)
+
+
+def test_required_samples():
+    assert required_samples(0.5, 0.05, 0.95) == np.ceil((z_score(0.95) * 0.5 / 0.05) ** 2)
+    assert np.isnan(required_samples(np.nan, 0.05))
+
+
+def test_z_score():
+    assert z_score(0.95) == pytest.approx(1.959964, abs = 1e-6)
+    with pytest.raises(ValueError):
+        z_score(1.5)
+
+
+def test_weighted_estimate():
+    y = np.array([[100.0, 300.0, np.nan]])
+    x = np.array([[100.0, 100.0, 100.0]])
+    est = weighted_estimate(y, x, np.array([0.75, 0.25, 0.5]))
+    # (the missing sample's weight left out)
+    assert est["estimate"][0] == pytest.approx(0.75 * 1 + 0.25 * 3)
+    assert est["weight"][0] == pytest.approx(1.0)
+    assert np.isnan(est["half_width"][0])
+
+
+def test_estimate_metrics_mpki():
+    samples = dict(insts = np.array([[1000.0, 2000.0]]), cycles = np.array([[1000.0, 3000.0]]),
+                   misses = np.array([[5.0, 10.0]]))
+    metrics = estimate_metrics(samples, ["misses"])
+    assert metrics["misses_mpki"]["estimate"][0] == pytest.approx(5.0)
+    weighted = estimate_metrics(samples, ["misses"], weights = np.array([0.5, 0.5]))
+    assert weighted["cpi"]["estimate"][0] == pytest.approx(0.5 * 1 + 0.5 * 1.5)
+
+
+def test_sample_stats():
+    assert sample_stats() == (STATS, [])
+    stats, events = sample_stats(["l2=*.l2cache.overallMisses::total", "l1d=a=b"], insts = "simInsts")
+    assert stats == {"insts": "simInsts", "cycles": CYCLES_STAT,
+                     "l2": "*.l2cache.overallMisses::total", "l1d": "a=b"}
+    assert events == ["l2", "l1d"]
+    for bad in ["l2", "=x", "cycles=x"]:
+        with pytest.raises(ValueError):
+            sample_stats([bad])
+    with pytest.raises(ValueError):
+        sample_stats(["l2=a", "l2=b"])
@@ -0,0 +1,352 @@
+import json
+import os
+import signal
+import time
+
+import pytest
+
+from conftest import stats_text
+import fake_gem5
+
+m5 = fake_gem5.install()
+from gem5.simulate.exit_event import ExitEvent
+
+from util.event_managers.event_manager import (
+    EventManager, MANAGER_STATE_FILE, PREEMPTED_EXIT_CODE
+)
+from util.event_managers.sampling_manager import Interval, SamplingManager
+from util.runner.dashboard import JobProgress
+import util.simarglib as simarglib
+
+M = 1000000
+
+@pytest.fixture
+def sim(tmp_path, monkeypatch):
+    """Sampling args (FF 2M, warmup 1M, ROI 1M, one ROI) and a fake gem5
+    outdir, with preemption into tmp_path/preempt."""
+    outdir = tmp_path / "m5out"
+    outdir.mkdir()
+    monkeypatch.setattr(m5.options, "outdir", str(outdir), raising = False)
+    monkeypatch.setattr(m5, "tick", 0)
+    monkeypatch.setattr(fake_gem5, "log", [])
+    # (don't take over pytest's own signals)
+    monkeypatch.setattr(signal, "signal", lambda sig, handler: None)
+    monkeypatch.setattr(simarglib, "args", {
+        "ff": 2, "warmup": 1, "roi": 1, "func_warmup": None, "init_ff": None,
+        "max_rois": 1, "continue": False, "target_error": None, "confidence": 0.95,
+        "min_rois": 10, "fork_rois": None, "preempt_dir": str(tmp_path / "preempt"),
+        "preempt_poll": 10.0, "event_log": None, "start_from": None
+    })
+    return tmp_path
+
+
+def fake_children(monkeypatch, forks, exits):
+    """m5.fork() returns FORKS in turn, and os.waitpid() (when blocking)
+    the (pid, status) pairs of EXITS."""
+    monkeypatch.setattr(fake_gem5, "forks", list(forks))
+    exits = list(exits)
+    def waitpid(pid, options):
+        if options & os.WNOHANG or not exits:
+            return 0, 0
+        return exits.pop(0)
+    monkeypatch.setattr(os, "waitpid", waitpid)
+
+
+def write_child(outdir, name, insts, ticks):
+    """The outdir NAME of a child that ran one ROI of INSTS and TICKS"""
+    child = outdir / name
+    child.mkdir()
+    (child / "roi_sample.json").write_text(json.dumps({"roi": 1, "insts": insts, "ticks": ticks}))
+    # (the ROI, then gem5's final dump)
+    (child / "stats.txt").write_text(stats_text([{"system.cpu.ticks": ticks}, {"system.cpu.ticks": 0}]))
+
+
+def start(processor):
+    manager = SamplingManager(processor)
+    manager.initialize()
+    return manager, manager.get_exit_event_handlers()
+
+
+def preempt(manager, handlers):
+    manager._preempt_requested = True
+    with pytest.raises(SystemExit) as exited:
+        next(handlers[ExitEvent.SCHEDULED_TICK])
+    assert exited.value.code == PREEMPTED_EXIT_CODE
+    checkpoint = fake_gem5.log[-1][1]
+    with open(f"{checkpoint}/{MANAGER_STATE_FILE}", "r") as f:
+        return checkpoint, json.load(f)
+
+
+def test_preempt_in_roi_and_resume(sim):
+    processor = fake_gem5.FakeSwitchableProcessor()
+    manager, handlers = start(processor)
+    assert not next(handlers[ExitEvent.WORKBEGIN])
+    processor.run(2 * M)
+    assert not next(handlers[ExitEvent.MAX_INSTS])
+    assert processor.get_current_key() == "switch"
+    processor.run(1 * M)
+    assert not next(handlers[ExitEvent.MAX_INSTS])
+    assert manager._current_interval == Interval.ROI
+    processor.run(M // 2)
+
+    checkpoint, saved = preempt(manager, handlers)
+    # checkpointed on the start cores, which the restore starts on
+    assert ("switch_to", "start") in fake_gem5.log
+    assert processor.get_current_key() == "start"
+    assert saved["state"]["interval"] == "FF_WORK"
+    assert saved["state"]["remaining_insts"] == 1
+    assert saved["state"]["completed_rois"] == 0
+
+    # resume: the whole sample is redone from the preemption point
+    fake_gem5.log.clear()
+    simarglib.args["start_from"] = checkpoint
+    processor = fake_gem5.FakeSwitchableProcessor()
+    manager, handlers = start(processor)
+    assert fake_gem5.log == [("schedule_max_insts", 1, False)]
+    processor.run(1)
+    assert not next(handlers[ExitEvent.MAX_INSTS])
+    assert manager._current_interval == Interval.WARMUP
+    assert processor.get_current_key() == "switch"
+    processor.run(1 * M)
+    assert not next(handlers[ExitEvent.MAX_INSTS])
+    processor.run(1 * M)
+    # (one ROI: done)
+    assert next(handlers[ExitEvent.MAX_INSTS])
+    assert manager._completed_rois == 1
+    assert manager._samples == [[1 * M, 2 * M]]
+    assert ("stats.dump",) in fake_gem5.log
+
+
+def test_preempt_in_ff_keeps_position(sim):
+    processor = fake_gem5.FakeSwitchableProcessor()
+    manager, handlers = start(processor)
+    next(handlers[ExitEvent.WORKBEGIN])
+    processor.run(M // 2)
+    _, saved = preempt(manager, handlers)
+    assert ("switch_to", "start") not in fake_gem5.log
+    assert saved["state"]["interval"] == "FF_WORK"
+    assert saved["state"]["remaining_insts"] == 2 * M - M // 2
+
+
+def test_preempt_before_benchmark(sim):
+    processor = fake_gem5.FakeSwitchableProcessor()
+    manager, handlers = start(processor)
+    _, saved = preempt(manager, handlers)
+    assert saved["state"]["interval"] == "NO_WORK"
+    assert saved["state"]["completed_rois"] == 0
+    assert saved["state"]["remaining_insts"] is None
+
+
+def test_default_state(sim):
+    manager = EventManager(fake_gem5.FakeSwitchableProcessor())
+    assert manager.get_state() == {}
+    manager.set_state({})
+    assert manager.can_preempt()
+
+
+def test_variant_children(sim, monkeypatch):
+    simarglib.args.update(fork_rois = 2)
+    outdir = sim / "m5out"
+    write_child(outdir, "roi.1.o3", 1 * M, 3 * M)
+    write_child(outdir, "roi.1.minor", 1 * M, 5 * M)
+    fake_children(monkeypatch, [100, 101], [(101, 0), (100, 0)])
+    processor = fake_gem5.FakeSwitchableProcessor(switch_keys = ["o3", "minor"])
+    manager, handlers = start(processor)
+    next(handlers[ExitEvent.WORKBEGIN])
+    processor.run(2 * M)
+    # one child per variant, from the same point; then (one ROI) done
+    assert next(handlers[ExitEvent.MAX_INSTS])
+    forks = [entry[1:] for entry in fake_gem5.log if entry[0] == "fork"]
+    assert forks == [("%(parent)s/roi.1.o3", 100), ("%(parent)s/roi.1.minor", 101)]
+    assert ("switch_to", "o3") not in fake_gem5.log
+    assert manager._variant_samples == {"o3": [[1 * M, 3 * M]], "minor": [[1 * M, 5 * M]]}
+    for variant, ticks in [("o3", 3 * M), ("minor", 5 * M)]:
+        merged = (outdir / f"stats.rois.{variant}.txt").read_text()
+        assert merged.count("Begin Simulation Statistics") == 1
+        assert f"{ticks}" in merged
+
+
+def test_variant_child_runs_its_variant(sim, monkeypatch):
+    simarglib.args.update(fork_rois = 2)
+    fake_children(monkeypatch, [100, 0], [])
+    processor = fake_gem5.FakeSwitchableProcessor(switch_keys = ["o3", "minor"])
+    manager, handlers = start(processor)
+    next(handlers[ExitEvent.WORKBEGIN])
+    processor.run(2 * M)
+    # the second fork's child: warms up and runs the ROI on its target
+    assert not next(handlers[ExitEvent.MAX_INSTS])
+    assert manager._is_child and manager._variant == "minor"
+    assert m5.options.outdir == str(sim / "m5out" / "roi.1.minor")
+    assert processor.get_current_key() == "minor"
+    assert manager._current_interval == Interval.WARMUP
+    processor.run(1 * M)
+    next(handlers[ExitEvent.MAX_INSTS])
+    processor.run(1 * M)
+    assert next(handlers[ExitEvent.MAX_INSTS])
+    with open(sim / "m5out" / "roi.1.minor" / "roi_sample.json") as f:
+        assert json.load(f) == {"roi": 1, "insts": 1 * M, "ticks": 2 * M}
+    with open(sim / "m5out" / "roi.1.minor" / "simargs.json") as f:
+        assert json.load(f)["args"]["switch_variant"] == "minor"
+
+
+def run_sample(processor, handlers, ticks_per_inst = 2):
+    """FF, warmup and one ROI (at TICKS_PER_INST); True if sampling's done"""
+    for insts in [2 * M, 1 * M]:
+        processor.run(insts)
+        assert not next(handlers[ExitEvent.MAX_INSTS])
+    processor.run(1 * M, ticks_per_inst)
+    return next(handlers[ExitEvent.MAX_INSTS])
+
+
+def test_target_error_waits_for_min_rois(sim):
+    simarglib.args.update(max_rois = None, target_error = 0.05, min_rois = 3)
+    processor = fake_gem5.FakeSwitchableProcessor()
+    manager, handlers = start(processor)
+    next(handlers[ExitEvent.WORKBEGIN])
+    # (no error at all from the start, but too few ROIs)
+    assert not run_sample(processor, handlers)
+    assert manager.get_cpi_error() is None
+    assert not run_sample(processor, handlers)
+    assert manager.get_cpi_error() == 0
+    assert run_sample(processor, handlers)
+    assert manager._completed_rois == 3
+
+
+def test_target_error_stops_once_reached(sim):
+    simarglib.args.update(max_rois = None, target_error = 0.05, min_rois = 2)
+    processor = fake_gem5.FakeSwitchableProcessor()
+    manager, handlers = start(processor)
+    next(handlers[ExitEvent.WORKBEGIN])
+    assert not run_sample(processor, handlers, 1)
+    assert not run_sample(processor, handlers, 3)
+    # CPI 1 and 3: far from the target
+    assert manager.get_cpi_error() > 0.05
+    errors = []
+    while not run_sample(processor, handlers, 2):
+        errors.append(manager.get_cpi_error())
+        assert errors[-1] > 0.05 and len(errors) < 100
+    assert manager.get_cpi_error() <= 0.05
+    # (the error shrinks with each ROI at the mean CPI)
+    assert errors == sorted(errors, reverse = True)
+
+
+def test_fork_rois(sim, monkeypatch):
+    simarglib.args.update(fork_rois = 1, max_rois = 2)
+    outdir = sim / "m5out"
+    write_child(outdir, "roi.1", 1 * M, 2 * M)
+    write_child(outdir, "roi.2", 1 * M, 4 * M)
+    fake_children(monkeypatch, [100, 101], [(100, 0), (101, 0)])
+    processor = fake_gem5.FakeSwitchableProcessor()
+    manager, handlers = start(processor)
+    assert manager._preempt_dir is None
+    next(handlers[ExitEvent.WORKBEGIN])
+    processor.run(2 * M)
+    # the parent fast-forwards over the child's sample, on the start cores
+    assert not next(handlers[ExitEvent.MAX_INSTS])
+    assert fake_gem5.log[-2:] == [("fork", "%(parent)s/roi.1", 100),
+                                  ("schedule_max_insts", 4 * M, True)]
+    assert manager._children == {100: (1, "switch")}
+    assert processor.get_current_key() == "start"
+    processor.run(4 * M)
+    # (one child at most: waits for ROI 1 before forking ROI 2, then for
+    # ROI 2 before merging)
+    assert next(handlers[ExitEvent.MAX_INSTS])
+    assert manager._children == {}
+    assert manager._variant_samples == {"switch": [[1 * M, 2 * M], [1 * M, 4 * M]]}
+    assert manager._total_ticks == 6 * M
+    merged = (outdir / "stats.rois.txt").read_text()
+    assert merged.count("Begin Simulation Statistics") == 2
+    assert merged.index(f"{2 * M}") < merged.index(f"{4 * M}")
+
+
+def test_fork_rois_failed_child(sim, monkeypatch):
+    simarglib.args.update(fork_rois = 2, max_rois = 2)
+    outdir = sim / "m5out"
+    write_child(outdir, "roi.1", 1 * M, 2 * M)
+    (outdir / "roi.2").mkdir()
+    fake_children(monkeypatch, [100, 101], [(101, 1 << 8), (100, 0)])
+    processor = fake_gem5.FakeSwitchableProcessor()
+    manager, handlers = start(processor)
+    next(handlers[ExitEvent.WORKBEGIN])
+    processor.run(2 * M)
+    assert not next(handlers[ExitEvent.MAX_INSTS])
+    processor.run(4 * M)
+    assert next(handlers[ExitEvent.MAX_INSTS])
+    assert manager._variant_samples == {"switch": [[1 * M, 2 * M]]}
+    assert (outdir / "stats.rois.txt").read_text().count("Begin Simulation Statistics") == 1
+
+
+def test_func_warmup_order(sim):
+    simarglib.args.update(func_warmup = 3)
+    processor = fake_gem5.FakeSwitchableProcessor(warm = True)
+    manager, handlers = start(processor)
+    next(handlers[ExitEvent.WORKBEGIN])
+    assert manager._current_interval == Interval.FF_WORK
+    steps = []
+    for insts in [2 * M, 3 * M, 1 * M]:
+        processor.run(insts)
+        assert not next(handlers[ExitEvent.MAX_INSTS])
+        steps.append((manager._current_interval, processor.get_current_key(), processor.max_insts))
+    assert steps == [
+        (Interval.FUNC_WARMUP, "warm", 3 * M),
+        (Interval.WARMUP, "switch", 1 * M),
+        (Interval.ROI, "switch", 1 * M),
+    ]
+    processor.run(1 * M)
+    assert next(handlers[ExitEvent.MAX_INSTS])
+    assert manager._samples == [[1 * M, 2 * M]]
+
+
+def test_func_warmup_needs_warming_cores(sim):
+    simarglib.args.update(func_warmup = 3)
+    with pytest.raises(SystemExit):
+        SamplingManager(fake_gem5.FakeSwitchableProcessor())
+
+
+def test_event_log_feeds_the_dashboard(sim, monkeypatch):
+    events = sim / "events.jsonl"
+    simarglib.args.update(event_log = str(events), max_rois = 2)
+    clock = iter(range(0, 1000, 10))
+    monkeypatch.setattr(time, "time", lambda: float(next(clock)))
+    processor = fake_gem5.FakeSwitchableProcessor()
+    manager, handlers = start(processor)
+    next(handlers[ExitEvent.WORKBEGIN])
+    run_sample(processor, handlers)
+    progress = JobProgress("run", str(events))
+    progress.update()
+    with open(events) as f:
+        plan = json.loads(f.readline())
+    assert (plan["event"], plan["planned_rois"], plan["planned_insts"]) == ("plan", 2, 8 * M)
+    assert (progress.phase, progress.rois_done) == ("ff", 1)
+    assert progress.kips() is not None and progress.eta(time.time()) is not None
+
+
+def test_preempted_stats_carried_over(sim):
+    outdir = sim / "m5out"
+    (outdir / "stats.txt").write_text("roi 1\n")
+    processor = fake_gem5.FakeSwitchableProcessor()
+    manager, handlers = start(processor)
+    next(handlers[ExitEvent.WORKBEGIN])
+    checkpoint, _ = preempt(manager, handlers)
+
+    # resumed into a fresh outdir, and preempted again
+    outdir = sim / "m5out2"
+    outdir.mkdir()
+    m5.options.outdir = str(outdir)
+    simarglib.args["start_from"] = checkpoint
+    manager, handlers = start(fake_gem5.FakeSwitchableProcessor())
+    assert (outdir / "stats.preempted.txt").read_text() == "roi 1\n"
+    (outdir / "stats.txt").write_text("roi 2\n")
+    m5.tick += 1
+    checkpoint, _ = preempt(manager, handlers)
+    with open(f"{checkpoint}/stats.preempted.txt") as f:
+        assert f.read() == "roi 1\nroi 2\n"
+
+
+def test_resume_under_another_manager(sim):
+    checkpoint = sim / "chkpt"
+    checkpoint.mkdir()
+    (checkpoint / MANAGER_STATE_FILE).write_text(json.dumps({"manager": "Other", "tick": 0, "state": {}}))
+    simarglib.args["start_from"] = str(checkpoint)
+    with pytest.raises(SystemExit):
+        SamplingManager(fake_gem5.FakeSwitchableProcessor())
@@ -0,0 +1,71 @@
+import gzip
+
+import numpy as np
+import pytest
+
+from util.stats.simpoint import bic, kmeans, pick_simpoints, project, read_bbv, roi_intervals
+
+def phases(*lengths):
+    """BBVs of a program going through phases of LENGTHS intervals, each
+    running its own basic blocks (with a little noise)."""
+    rng = np.random.default_rng(1)
+    bbvs = []
+    for phase, length in enumerate(lengths):
+        for _ in range(length):
+            bbvs.append({10 * phase + bb: int(1000 * (bb + 1) + rng.integers(50)) for bb in range(5)})
+    return bbvs
+
+
+def test_read_bbv(tmp_path):
+    path = tmp_path / "simpoint.bb.gz"
+    with gzip.open(path, "wt") as f:
+        f.write("# comment\nT:1:100 :2:50 \nT:3:7 \n")
+    assert read_bbv(str(path)) == [{1: 100, 2: 50}, {3: 7}]
+
+
+def test_project_normalizes():
+    # (the same mix of blocks, however many instructions)
+    points = project([{1: 10, 2: 30}, {1: 100, 2: 300}, {3: 5}], dims = 4)
+    assert points.shape == (3, 4)
+    np.testing.assert_allclose(points[0], points[1])
+    assert not np.allclose(points[0], points[2])
+
+
+def test_kmeans_finds_clusters():
+    rng = np.random.default_rng(0)
+    points = np.concatenate([rng.normal(0, 0.1, (20, 2)), rng.normal(5, 0.1, (30, 2))])
+    centers, labels = kmeans(points, 2)
+    assert len(set(labels[:20])) == 1 and len(set(labels[20:])) == 1
+    assert labels[0] != labels[-1]
+    np.testing.assert_allclose(sorted(centers[:, 0]), [0, 5], atol = 0.1)
+
+
+def test_bic_prefers_the_true_k():
+    rng = np.random.default_rng(0)
+    points = np.concatenate([rng.normal(c, 0.1, (20, 3)) for c in [0, 3, 6]])
+    scores = {k: bic(points, *kmeans(points, k)) for k in range(1, 6)}
+    assert max(scores, key = scores.get) == 3
+    # (no more clusters than points)
+    assert bic(points[:2], *kmeans(points[:2], 2)) == -np.inf
+
+
+def test_pick_simpoints():
+    picked = pick_simpoints(phases(30, 10, 20), max_k = 6, first = 100)
+    assert picked["k"] == 3
+    assert len(picked["bic"]) == 6
+    simpoints = picked["simpoints"]
+    assert [simpoint["interval"] for simpoint in simpoints] == sorted(s["interval"] for s in simpoints)
+    # one point per phase, weighted by its length
+    bounds = np.cumsum([30, 10, 20]) + 100
+    assert [int(np.searchsorted(bounds, s["interval"], side = "right")) for s in simpoints] == [0, 1, 2]
+    assert [s["weight"] for s in simpoints] == pytest.approx([0.5, 1 / 6, 1 / 3])
+    with pytest.raises(ValueError):
+        pick_simpoints([])
+
+
+def test_roi_intervals():
+    # intervals of 100 instructions: only whole ones inside the ROI
+    assert roi_intervals(50, 100, 250, 1000) == (3, 10)
+    assert roi_intervals(50, 100, 0, None) == (0, 50)
+    assert roi_intervals(5, 100, 250, None) == (3, 5)
+    assert roi_intervals(5, 100, 600, None) == (6, 6)
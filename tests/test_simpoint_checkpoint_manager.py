@@ -0,0 +1,65 @@
+import json
+import signal
+
+import pytest
+
+import fake_gem5
+
+m5 = fake_gem5.install()
+from gem5.simulate.exit_event import ExitEvent
+
+from util.event_managers.simpoint_checkpoint_manager import SIMPOINT_FILE, SimPointCheckpointManager
+import util.simarglib as simarglib
+
+M = 1000000
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(m5.options, "outdir", str(tmp_path / "m5out"), raising = False)
+    monkeypatch.setattr(fake_gem5, "log", [])
+    monkeypatch.setattr(signal, "signal", lambda sig, handler: None)
+    simpoints = tmp_path / "simpoints.json"
+    # 1M-instruction intervals; with 3M of warmup, the first two points'
+    # checkpoints are both due at the start
+    simpoints.write_text(json.dumps(dict(interval = M, simpoints = [
+        dict(interval = 2, start_insts = 2 * M, weight = 0.5),
+        dict(interval = 3, start_insts = 3 * M, weight = 0.3),
+        dict(interval = 9, start_insts = 9 * M, weight = 0.2),
+    ])))
+    monkeypatch.setattr(simarglib, "args", {
+        "simpoints": str(simpoints), "checkpoints_dir": str(tmp_path / "checkpoints"),
+        "simpoint_warmup": 3, "preempt_dir": None, "event_log": None, "start_from": None
+    })
+    processor = fake_gem5.FakeSwitchableProcessor()
+    manager = SimPointCheckpointManager(processor)
+    manager.initialize()
+    return manager, processor
+
+
+def saved_points():
+    points = []
+    for entry in fake_gem5.log:
+        if entry[0] == "checkpoint":
+            with open(f"{entry[1]}/{SIMPOINT_FILE}", "r") as f:
+                points.append(json.load(f))
+    return points
+
+
+def test_checkpoints_record_actual_warmup(manager):
+    manager, processor = manager
+    handlers = manager.get_exit_event_handlers()
+    # the first two points are both due at the start
+    assert processor.max_insts == 1
+    processor.run(1)
+    assert not next(handlers[ExitEvent.MAX_INSTS])
+    assert processor.max_insts == 1
+    processor.run(1)
+    assert not next(handlers[ExitEvent.MAX_INSTS])
+    processor.run(processor.max_insts)
+    assert next(handlers[ExitEvent.MAX_INSTS])
+
+    points = saved_points()
+    assert [point["interval"] for point in points] == [2, 3, 9]
+    assert [point["checkpoint_insts"] for point in points] == [1, 2, 6 * M]
+    assert [point["warmup_insts"] for point in points] == [2 * M - 1, 3 * M - 2, 3 * M]
+    assert all(point["roi_insts"] == M for point in points)
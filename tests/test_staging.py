@@ -0,0 +1,119 @@
+import asyncio
+import gzip
+import hashlib
+import os
+
+import pytest
+
+import util.runner.staging as staging
+from util.runner.executor import JobExecutor
+from util.runner.jobs import Job
+from util.runner.staging import MANIFEST_FILE, OutdirStager
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture
+def staged(tmp_path):
+    """A job's scratch outdir, with a few results in it"""
+    stager = OutdirStager(str(tmp_path / "scratch"))
+    job = Job(f"gem5.opt --outdir={tmp_path / 'out'} config.py", name = "sweep/run 1")
+    run = stager.stage(job)
+    (tmp_path / "scratch" / "sweep_run_1" / "roi.1").mkdir()
+    for name, data in [("stats.txt", b"stats"), ("roi.1/stats.txt", b"roi"), ("trace.gz", b"gz")]:
+        with open(os.path.join(run.outdir, name), "wb") as f:
+            f.write(data)
+    yield stager, job, run
+    stager.close()
+
+
+def test_stage(tmp_path):
+    stager = OutdirStager(str(tmp_path / "scratch"))
+    job = Job("gem5.opt -d out config.py --cores 4", name = "run", mem = 1 << 30, cores = 4,
+              priority = 2, cwd = str(tmp_path))
+    assert stager.stageable(job) and not stager.stageable(Job("echo hi"))
+    run = stager.stage(job)
+    assert run.outdir == str(tmp_path / "scratch" / "run")
+    assert run.cmd == f"gem5.opt -d {run.outdir} config.py --cores 4"
+    assert (run.name, run.mem, run.cores, run.priority, run.cwd) == ("run", 1 << 30, 4, 2, str(tmp_path))
+    (tmp_path / "scratch" / "run" / "left").write_text("over")
+    stager.stage(job, fresh = False)
+    assert (tmp_path / "scratch" / "run" / "left").exists()
+    stager.stage(job)
+    assert not (tmp_path / "scratch" / "run" / "left").exists()
+    stager.close()
+
+
+def test_flush(staged, tmp_path):
+    stager, job, run = staged
+    assert asyncio.run(stager.flush(run, job))
+    out = tmp_path / "out"
+    assert (out / "stats.txt").read_bytes() == b"stats"
+    assert (out / "roi.1" / "stats.txt").read_bytes() == b"roi"
+    assert (out / MANIFEST_FILE).read_text() == (
+        f"{sha256(b'roi')}  roi.1/stats.txt\n{sha256(b'stats')}  stats.txt\n{sha256(b'gz')}  trace.gz\n")
+    assert not os.path.exists(run.outdir)
+
+
+def test_flush_compressed(tmp_path):
+    stager = OutdirStager(str(tmp_path / "scratch"), compress = True)
+    job = Job(f"gem5.opt --outdir={tmp_path / 'out'} config.py", name = "run")
+    run = stager.stage(job)
+    for name, data in [("stats.txt", b"stats" * 100), ("trace.gz", b"gz")]:
+        with open(os.path.join(run.outdir, name), "wb") as f:
+            f.write(data)
+    assert asyncio.run(stager.flush(run, job))
+    out = tmp_path / "out"
+    assert sorted(os.listdir(out)) == [MANIFEST_FILE, "stats.txt.gz", "trace.gz"]
+    assert gzip.decompress((out / "stats.txt.gz").read_bytes()) == b"stats" * 100
+    # (digests of the stored files)
+    assert f"{sha256((out / 'stats.txt.gz').read_bytes())}  stats.txt.gz\n" in (out / MANIFEST_FILE).read_text()
+    stager.close()
+
+
+def corrupt_copies(monkeypatch, count):
+    """The first COUNT copies come out wrong"""
+    copyfile = staging.shutil.copyfile
+    left = [count]
+    def bad_copy(src, dest):
+        copyfile(src, dest)
+        if left[0]:
+            left[0] -= 1
+            with open(dest, "ab") as f:
+                f.write(b"!")
+    monkeypatch.setattr(staging.shutil, "copyfile", bad_copy)
+
+
+def test_flush_retries_a_bad_copy(staged, tmp_path, monkeypatch):
+    stager, job, run = staged
+    corrupt_copies(monkeypatch, 1)
+    assert asyncio.run(stager.flush(run, job))
+    assert (tmp_path / "out" / "stats.txt").read_bytes() == b"stats"
+
+
+def test_flush_keeps_scratch_if_copies_fail(staged, tmp_path, monkeypatch, capsys):
+    stager, job, run = staged
+    corrupt_copies(monkeypatch, 100)
+    assert not asyncio.run(stager.flush(run, job))
+    assert "did not verify" in capsys.readouterr().out
+    assert os.path.exists(os.path.join(run.outdir, "stats.txt"))
+    assert not (tmp_path / "out" / MANIFEST_FILE).exists()
+    assert not [name for root, _, names in os.walk(tmp_path / "out") for name in names
+                if name.endswith(".tmp")]
+
+
+def test_executor_stages_gem5_jobs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    gem5 = tmp_path / "gem5.opt"
+    gem5.write_text("#!/bin/sh\nout=${1#--outdir=}\nmkdir -p $out\necho $out > $out/stats.txt\n")
+    gem5.chmod(0o755)
+    (tmp_path / "config.py").write_text("")
+    stager = OutdirStager("scratch")
+    executor = JobExecutor(log_dir = "logs", stager = stager)
+    assert executor.run([Job("./gem5.opt --outdir=out config.py", name = "run")])
+    stager.close()
+    # (written to scratch, then copied out)
+    assert (tmp_path / "out" / "stats.txt").read_text() == f"{tmp_path}/scratch/run\n"
+    assert (tmp_path / "out" / MANIFEST_FILE).exists()
+    assert os.listdir(tmp_path / "scratch") == []
@@ -0,0 +1,59 @@
+import os
+
+import numpy as np
+
+from util.stats.store import (
+    StatsStore, convert, find_stats_files, outdir_stats_files, run_name, stats_variant
+)
+
+def test_outdir_stats_files(tmp_path):
+    assert outdir_stats_files(str(tmp_path), ["stats.txt", "stats.rois.txt", "config.ini"]) == \
+        [os.path.join(str(tmp_path), "stats.rois.txt")]
+    assert outdir_stats_files("out", ["stats.txt.gz"]) == ["out/stats.txt.gz"]
+    assert outdir_stats_files("out", ["stats.rois.b.txt", "stats.rois.a.txt", "stats.txt"]) == \
+        ["out/stats.rois.a.txt", "out/stats.rois.b.txt"]
+    assert outdir_stats_files("out", ["config.ini"]) == []
+
+
+def test_run_names():
+    assert stats_variant("out/stats.rois.o3_big.txt") == "o3_big"
+    assert stats_variant("out/stats.rois.txt") is None
+    assert run_name("sweep/mcf/stats.txt") == "sweep/mcf"
+    assert run_name("sweep/mcf/stats.rois.o3_big.txt") == "sweep/mcf/o3_big"
+    assert run_name("stats.txt") == "."
+
+
+def test_find_stats_files(tmp_path, write_stats):
+    write_stats([{"a": 1}], "sweep/mcf/stats.txt")
+    write_stats([{"a": 1}], "sweep/lbm/stats.rois.txt")
+    # (forked ROIs, already merged into stats.rois.txt)
+    write_stats([{"a": 1}], "sweep/lbm/roi.1/stats.txt")
+    write_stats([{"a": 1}], "sweep/gcc/stats.txt")
+    found = find_stats_files([str(tmp_path / "sweep"), "other/stats.txt"])
+    assert [os.path.relpath(path, tmp_path) for path in found[:-1]] == \
+        ["sweep/gcc/stats.txt", "sweep/lbm/stats.rois.txt", "sweep/mcf/stats.txt"]
+    assert found[-1] == "other/stats.txt"
+
+
+def test_convert_and_query(tmp_path, write_stats):
+    paths = [
+        write_stats([{"simInsts": 1, "system.cpu0.ipc": 0.5},
+                     {"simInsts": 2, "system.cpu0.ipc": 1.5}], "a/stats.txt"),
+        write_stats([{"simInsts": 3, "system.cpu1.ipc": 2.0}], "b/stats.txt"),
+    ]
+    store = convert(paths, str(tmp_path / "store"), workers = 1)
+    assert len(store) == 3
+    assert [run["name"] for run in store.runs] == [os.path.dirname(path) for path in paths]
+    np.testing.assert_array_equal(store.run, [0, 0, 1])
+    np.testing.assert_array_equal(store.dump, [0, 1, 0])
+
+    # (reopened from disk)
+    store = StatsStore(str(tmp_path / "store"))
+    assert store.names("system.*.ipc") == ["system.cpu0.ipc", "system.cpu1.ipc"]
+    np.testing.assert_array_equal(store.column("simInsts"), [1, 2, 3])
+    names, ipc = store.array("system.*.ipc")
+    np.testing.assert_array_equal(ipc, [[0.5, np.nan], [1.5, np.nan], [np.nan, 2.0]])
+    assert store.array("nothing")[1].shape == (3, 0)
+
+    np.testing.assert_array_equal(store.rows("*/b"), [False, False, True])
+    np.testing.assert_array_equal(store.rows(dumps = slice(1, None)), [False, True, False])
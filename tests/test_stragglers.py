@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+import util.runner.executor as executor_module
+import util.runner.resources as resources
+from util.runner.executor import JobExecutor
+from util.runner.history import RuntimeHistory
+from util.runner.jobs import Job
+from util.runner.resources import GiB, ResourceBudget
+
+# Hangs, unless it's the backup copy
+GEM5 = """#!/bin/sh
+out=${1#--outdir=}
+mkdir -p $out
+case $out in
+*.backup) echo backup > $out/stats.txt ;;
+*) echo original > $out/stats.txt; sleep 30 ;;
+esac
+"""
+
+@pytest.fixture
+def setup(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(executor_module, "STRAGGLER_CHECK_SECS", 0.05)
+    monkeypatch.setattr(executor_module, "STRAGGLER_MIN_SECS", 0.2)
+    monkeypatch.setattr(resources, "host_available_memory", lambda: 64 * GiB)
+    monkeypatch.setattr(resources.os, "getloadavg", lambda: (0.0, 0.0, 0.0))
+    gem5 = tmp_path / "gem5.opt"
+    gem5.write_text(GEM5)
+    gem5.chmod(0o755)
+    (tmp_path / "config.py").write_text("")
+    history = RuntimeHistory(str(tmp_path / "history.json"))
+    job = Job("./gem5.opt --outdir=out config.py", name = "run", mem = GiB, cores = 2)
+    # (usually takes a tenth of a second)
+    history.record(job, 0.1)
+    return job, history
+
+
+def test_backup_wins(setup, tmp_path):
+    job, history = setup
+    executor = JobExecutor(log_dir = "logs", history = history, straggler_factor = 2,
+                           budget = ResourceBudget(max_mem = 8 * GiB, max_cores = 4, max_load = 64))
+    assert executor.run([job])
+    assert executor.results == {"run": 0}
+    assert (tmp_path / "out" / "stats.txt").read_text() == "backup\n"
+    assert not (tmp_path / "out.backup").exists()
+    assert executor._num_backups == 0
+
+
+def test_backup_needs_room_for_the_job(setup):
+    job, history = setup
+    budget = ResourceBudget(max_mem = 8 * GiB, max_cores = 3, max_load = 64)
+    executor = JobExecutor(history = history, straggler_factor = 2, budget = budget)
+    executor._running = {}
+    assert budget.admit(job)
+    backup = Job("./gem5.opt --outdir=out.backup config.py", mem = job.mem, cores = job.cores)
+    # (2 cores held, 2 more needed)
+    assert not executor._admit_backup(job, backup)
+    assert executor._admit_backup(job, Job("true", mem = GiB, cores = 1))
+    assert executor._num_backups == 1
+
+
+def test_straggling(setup, monkeypatch):
+    job, history = setup
+    executor = JobExecutor(history = history, straggler_factor = 2)
+    now = [1000.0]
+    monkeypatch.setattr(executor_module.time, "time", lambda: now[0])
+    assert not executor._straggling(job)
+    executor._start_times[job.name] = 1000.0
+    # (too early to judge)
+    now[0] = 1000.1
+    assert not executor._straggling(job)
+    now[0] = 1000.3
+    assert executor._straggling(job)
+    # no straggler if the history expects it to take that long
+    history.record(job, 100.0)
+    assert not executor._straggling(job)
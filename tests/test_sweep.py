@@ -0,0 +1,111 @@
+import json
+import math
+
+import pytest
+
+from util.runner.script_args import ScriptArgsError, script_parser
+from util.runner.sweep import expand_points, read_sweep_file, sweep_jobs
+
+SCRIPT = """
+import util.simarglib as simarglib
+from caches import l1
+parser = simarglib.add_parser("Test")
+parser.add_argument("--benchmark", type=str, required=True, choices=["mcf", "lbm"])
+parser.add_argument("--ff", type=int, default=100)
+parser.add_argument("--fast", default=False, action="store_true")
+"""
+
+CACHES = """
+parser.add_argument("--l1d_size", type=str, default="32kB")
+parser.add_argument("--l1d_assoc", type=int, default=8)
+parser.add_argument("--llc_repl", type=str, default="lru", choices=["lru", "rrip", "ship"])
+parser.add_argument("--ratio", type=float, default=0.5)
+"""
+
+@pytest.fixture
+def script(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "config.py").write_text(SCRIPT)
+    (tmp_path / "caches").mkdir()
+    (tmp_path / "caches" / "l1.py").write_text(CACHES)
+    return "config.py"
+
+
+def test_parser_follows_local_imports(script):
+    parser = script_parser(script)
+    dests = {action.dest for action in parser._actions}
+    assert {"benchmark", "ff", "fast", "l1d_size", "llc_repl", "ratio"} <= dests
+
+
+def test_grid_zip_and_all_choices(script):
+    spec = {"grid": {"benchmark": ["mcf", "lbm"], "llc_repl": "*"},
+            "zip": {"l1d_size": ["32kB", "64kB"], "l1d_assoc": [8, 16]}}
+    points = list(expand_points(spec, script_parser(script)))
+    assert len(points) == 2 * 3 * 2
+    assert points[0] == {"benchmark": "mcf", "llc_repl": "lru", "l1d_size": "32kB", "l1d_assoc": 8}
+    assert points[1] == {"benchmark": "mcf", "llc_repl": "lru", "l1d_size": "64kB", "l1d_assoc": 16}
+    assert {point["llc_repl"] for point in points} == {"lru", "rrip", "ship"}
+
+
+def test_bad_specs(script):
+    parser = script_parser(script)
+    with pytest.raises(ScriptArgsError):
+        list(expand_points({"zip": {"l1d_size": ["32kB"], "l1d_assoc": [8, 16]}}, parser))
+    with pytest.raises(ScriptArgsError):
+        list(expand_points({"grid": {"ff": "*"}}, parser))
+    with pytest.raises(ScriptArgsError):
+        list(expand_points({"sample": {"method": "sobol", "params": {"ff": [1]}}}, parser))
+
+
+def test_latin_hypercube(script):
+    spec = {"sample": {"method": "lhs", "count": 5, "seed": 3,
+                       "params": {"ratio": {"range": [0.0, 1.0]}, "ff": {"range": [1, 5]},
+                                  "llc_repl": "*"}}}
+    points = list(expand_points(spec, script_parser(script)))
+    # one point in each fifth of each range
+    assert sorted(math.floor(point["ratio"] * 5) for point in points) == [0, 1, 2, 3, 4]
+    assert sorted(point["ff"] for point in points) == [1, 2, 3, 4, 5]
+    assert {point["llc_repl"] for point in points} == {"lru", "rrip", "ship"}
+    # (reproducible from the seed)
+    assert list(expand_points(spec, script_parser(script))) == points
+
+
+def test_sweep_jobs(script):
+    spec = {"command": "gem5.opt --outdir={outdir} config.py",
+            "outdir": "results/{benchmark}-{ff}",
+            "attributes": "timeout=1h retries=2",
+            "fixed": {"ff": 10, "fast": True},
+            "grid": {"benchmark": ["mcf", "lbm"]}}
+    jobs = list(sweep_jobs(spec))
+    assert [job.name for job in jobs] == ["results_mcf-10", "results_lbm-10"]
+    assert jobs[0].cmd == "gem5.opt --outdir=results/mcf-10 config.py --ff 10 --fast --benchmark mcf"
+    assert jobs[0].outdir == "results/mcf-10"
+    assert (jobs[0].timeout, jobs[0].retries) == (3600, 2)
+
+
+def test_sweep_jobs_default_and_unique_outdirs(script):
+    spec = {"command": "gem5.opt --outdir={outdir} config.py",
+            "fixed": {"benchmark": "mcf"},
+            "zip": {"l1d_size": ["32 kB", "32 kB"]}}
+    assert [job.outdir for job in sweep_jobs(spec)] == \
+        ["sweep/l1d_size-32_kB", "sweep/l1d_size-32_kB.1"]
+
+
+def test_sweep_jobs_validate(script):
+    spec = {"command": "gem5.opt --outdir={outdir} config.py", "grid": {"benchmark": ["gcc"]}}
+    with pytest.raises(ScriptArgsError):
+        list(sweep_jobs(spec))
+    # (--benchmark is required)
+    with pytest.raises(ScriptArgsError):
+        list(sweep_jobs(dict(spec, grid = {"ff": [1]})))
+    with pytest.raises(ScriptArgsError):
+        list(sweep_jobs(dict(spec, grid = {"l2_size": ["1MB"]})))
+    with pytest.raises(ScriptArgsError):
+        list(sweep_jobs(dict(spec, command = "echo {outdir}")))
+
+
+def test_read_sweep_file(script, tmp_path):
+    (tmp_path / "sweep.json").write_text(json.dumps(
+        {"command": "gem5.opt --outdir={outdir} config.py", "grid": {"benchmark": ["mcf"]}}))
+    [job] = read_sweep_file(str(tmp_path / "sweep.json"))
+    assert job.outdir == "sweep/benchmark-mcf"
@@ -0,0 +1,90 @@
+"""
+Profiles basic-block vectors (BBVs) for SimPoint analysis: gem5's SimPoint
+probe on core 0 writes one BBV per BBV_INTERVAL million committed
+instructions to OUTDIR/simpoint.bb.gz, and the core 0 instruction counts at
+workbegin/workend are saved to OUTDIR/bbv_profile.json, so only intervals
+inside the benchmark's ROI are clustered (see util/stats/simpoint.py).
+
+The probe only works on an atomic core, and the instruction counts must
+line up with the checkpointing pass (SimPointCheckpointManager), so run
+both from the same post-boot checkpoint (or both from boot) on atomic cores.
+"""
+import json
+import sys
+from pathlib import Path
+from typing import Dict, Generator
+
+import m5
+from gem5.simulate.exit_event import ExitEvent
+from gem5.components.processors.base_cpu_processor import BaseCPUProcessor
+
+from util.event_managers.event_manager import EventManager
+import util.simarglib as simarglib
+
+###
+# PARSER CONFIGURATION
+parser = simarglib.add_parser("BBV Profiling")
+parser.add_argument("--bbv_interval", type=int, default=100, help="Collect a basic-block vector every BBV_INTERVAL million instructions (default: 100)")
+###
+
+# Written to the outdir, as util/stats/simpoint.py expects
+PROFILE_FILE = "bbv_profile.json"
+
+class BBVProfileManager(EventManager):
+    def __init__(self, processor : BaseCPUProcessor) -> None:
+        super().__init__(processor = processor)
+
+        self._interval = simarglib.get("bbv_interval")
+        if (self._interval < 1):
+            print("BBV_INTERVAL must be positive!")
+            sys.exit(1)
+        self._interval *= 1000000
+
+        # must be added before the simulation is instantiated
+        self._processor.get_cores()[0].get_simobject().addSimPointProbe(self._interval)
+
+        self._profile = {
+            "interval": self._interval,
+            "roi_start_insts": None,
+            "roi_end_insts": None
+        }
+        self._plan["planned_rois"] = 1
+
+    def _save_profile(self) -> None:
+        path = Path(m5.options.outdir) / PROFILE_FILE
+        with open(path, "w") as f:
+            json.dump(self._profile, f, indent = 1)
+
+    """
+    handler dictionary
+    """
+    def get_exit_event_handlers(self) -> Dict[ExitEvent, Generator]:
+        return {
+            ExitEvent.WORKBEGIN : self.handle_workbegin(),
+            ExitEvent.WORKEND : self.handle_workend()
+        }
+
+    """
+    workbegin:
+    """
+    def handle_workbegin(self):
+        self._start_tick = m5.curTick()
+        self._profile["roi_start_insts"] = self._processor.get_total_insts(core0_only=True)
+        print(f"===Entering ROI at {self._profile['roi_start_insts']} instructions,"
+              f" profiling BBVs every {self._interval} instructions")
+        self._save_profile()
+        self.set_phase("roi", roi = 1)
+        yield False
+
+    """
+    workend:
+    """
+    def handle_workend(self):
+        end_tick = m5.curTick()
+        self._total_ticks += (end_tick - self._start_tick)
+        self._profile["roi_end_insts"] = self._processor.get_total_insts(core0_only=True)
+        print(f"===Exiting ROI at {self._profile['roi_end_insts']} instructions")
+        self._save_profile()
+        self.log_event("roi_end")
+        self.set_phase("done")
+        yield True # terminate simulation
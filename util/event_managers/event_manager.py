@@ -1,24 +1,238 @@
 """
 Parent class for all event managers with some functions
 that must be overridden
+
+Managers also report their progress as JSON lines (one object per event)
+to the file given by --event_log (or $GEM5_EVENT_LOG, which the command
+runner sets for each job).  Every event carries the current phase, ROI
+number, tick, instructions committed on core 0 (which all the managers
+count their intervals on) and host time, e.g.:
+
+  {"event": "phase", "phase": "warmup", "roi": 3, "tick": 1234,
+   "insts": 56789, "host_time": 1700000000.0}
+
+The first line of the file is a "plan" event with the total work the
+manager expects to do (planned_rois, and planned_insts counted from its
+first phase change; null if unknown).
+
+Preemption: managers that can save and restore their own state (see
+get_state()/set_state()) can be preempted, wherever can_preempt()
+allows.  With --preempt_dir, a SIGTERM or SIGUSR1 makes the manager
+checkpoint into PREEMPT_DIR/preempt.<tick> at its next exit event, save
+its state and the stats dumped so far next to the checkpoint, and exit
+with PREEMPTED_EXIT_CODE (see util/runner/failures.py).  Rerunning the same
+command with --start_from pointing at that dir resumes the simulation.
+Python only gets control between exit events, so from its first exit
+event on, the manager schedules extra tick exits to check for requests
+about every PREEMPT_POLL seconds of host time.
 """
-from typing import Dict, Generator
+import json
+import os
+import shutil
+import signal
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Generator, Optional
+
+import m5
 from gem5.simulate.exit_event import ExitEvent
 from gem5.components.processors.base_cpu_processor import BaseCPUProcessor
 
+from util.runner.failures import MANAGER_STATE_FILE, PREEMPTED_EXIT_CODE, PREEMPTED_STATS_FILE
+import util.simarglib as simarglib
+
+###
+# PARSER CONFIGURATION
+parser = simarglib.add_parser("Event Log")
+parser.add_argument("--event_log", type=str, default=os.environ.get("GEM5_EVENT_LOG"),
+                    help="Append machine-readable progress events (JSON lines) to EVENT_LOG (default: $GEM5_EVENT_LOG, if set)")
+parser = simarglib.add_parser("Preemption")
+parser.add_argument("--preempt_dir", type=str, default=os.environ.get("GEM5_PREEMPT_DIR"),
+                    help="On SIGTERM/SIGUSR1, checkpoint into PREEMPT_DIR/preempt.<tick> and exit, to be resumed with --start_from (default: $GEM5_PREEMPT_DIR, if set)")
+parser.add_argument("--preempt_poll", type=float, default=10.0,
+                    help="With --preempt_dir, check for preemption about every PREEMPT_POLL seconds of host time (default: 10)")
+###
+
+# Bounds on the simulated ticks between preemption polls
+_MIN_POLL_TICKS = 1000000
+_MAX_POLL_TICKS = 10**13
+
 class EventManager:
+    # Whether this manager implements get_state()/set_state()
+    preemptible = False
+
     def __init__(self, processor : BaseCPUProcessor) -> None:
         self._processor = processor
         # count ticks in ROIs
         self._total_ticks = 0
 
+        # progress reporting: child classes fill in the plan
+        self._plan: Dict[str, Any] = {"planned_rois": None, "planned_insts": None}
+        self._phase = "start"
+        self._roi: Optional[int] = None
+        self._event_log = None
+
+        self._preempt_dir = simarglib.get("preempt_dir") if self.preemptible else None
+        self._preempt_requested = False
+        self._poll_ticks = _MIN_POLL_TICKS
+        self._poll_armed_at = None
+        if self._preempt_dir:
+            for sig in [signal.SIGTERM, signal.SIGUSR1]:
+                signal.signal(sig, self._request_preemption)
+        self._plan["preemptible"] = bool(self._preempt_dir)
+
+        # state of the preempted run we're resuming, if any
+        self._resumed_state = None
+        start_from = simarglib.get("start_from")
+        if start_from and (Path(start_from) / MANAGER_STATE_FILE).exists():
+            self._load_preempted(Path(start_from))
+
     def get_total_ticks(self) -> int:
         return self._total_ticks
 
     def initialize(self) -> None:
-        pass
+        if self._resumed_state is not None:
+            self.set_state(self._resumed_state)
 
     """ handler dictionary """
     """ must be overridden by child class """
     def get_exit_event_handlers(self) -> Dict[ExitEvent, Generator]:
         return { }
+
+    """ progress events """
+    def set_phase(self, phase: str, roi: Optional[int] = None, **fields) -> None:
+        self._phase = phase
+        self._roi = roi
+        self.log_event("phase", **fields)
+
+    def log_event(self, event: str, **fields) -> None:
+        path = simarglib.get("event_log")
+        if not path:
+            return
+        if self._event_log is None:
+            self._event_log = open(path, "a")
+            self._write({"event": "plan", "host_time": time.time(), **self._plan})
+
+        record = {
+            "event": event,
+            "phase": self._phase,
+            "roi": self._roi,
+            "tick": m5.curTick(),
+            "host_time": time.time()
+        }
+        if "insts" not in fields:
+            # (not all processors can count, e.g., before the board is built)
+            get_total_insts = getattr(self._processor, "get_total_insts", None)
+            record["insts"] = get_total_insts(core0_only = True) if get_total_insts else None
+        record.update(fields)
+        self._write(record)
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        self._event_log.write(json.dumps(record) + "\n")
+        self._event_log.flush()
+
+    """ preemption """
+    def get_state(self) -> Dict[str, Any]:
+        """ overridden by preemptible child classes: what a resumed run
+        needs to carry on (JSON-serializable) """
+        return {}
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        """ overridden by preemptible child classes: carry on from the
+        state get_state() saved, before the simulation starts """
+        pass
+
+    def can_preempt(self) -> bool:
+        """ overridden by child classes with phases that can't be resumed:
+        preemption requests wait until this is True """
+        return True
+
+    def add_preemption(self, handlers: Dict[ExitEvent, Generator]) -> Dict[ExitEvent, Generator]:
+        """
+        Wrap a child class's handlers so that preemption requests are acted
+        on at every exit event (and polled for in between)
+        """
+        if not self._preempt_dir:
+            return handlers
+        wrapped = {event: self._preemption_point(handler) for event, handler in handlers.items()}
+        wrapped[ExitEvent.SCHEDULED_TICK] = self.handle_preemption_poll()
+        return wrapped
+
+    def _request_preemption(self, signum, frame) -> None:
+        # Runs at the next exit event: Python doesn't run during simulate()
+        print(f"***Preemption requested (signal {signum})")
+        self._preempt_requested = True
+
+    def _preemption_point(self, handler: Generator) -> Generator:
+        while True:
+            try:
+                done = next(handler)
+            except StopIteration:
+                return
+            # (after the handler, so the event isn't lost on resume)
+            if self._preempt_requested and not done and self.can_preempt():
+                self._preempt()
+            self._arm_poll()
+            yield done
+
+    def handle_preemption_poll(self):
+        while True:
+            if self._preempt_requested and self.can_preempt():
+                self._preempt()
+            # aim for one poll every PREEMPT_POLL seconds at the current speed
+            elapsed = time.time() - self._poll_armed_at
+            if elapsed > 0:
+                scale = min(simarglib.get("preempt_poll") / elapsed, 10.0)
+                self._poll_ticks = min(max(int(self._poll_ticks * scale), _MIN_POLL_TICKS), _MAX_POLL_TICKS)
+            self._poll_armed_at = None
+            self._arm_poll()
+            yield False
+
+    def _arm_poll(self) -> None:
+        if self._poll_armed_at is None:
+            m5.scheduleTickExitFromCurrent(self._poll_ticks)
+            self._poll_armed_at = time.time()
+
+    def _preempt(self) -> None:
+        tick = m5.curTick()
+        chkptDir = Path(self._preempt_dir) / f"preempt.{tick}"
+        print(f"***Preempted: checkpointing to {chkptDir} and exiting")
+        # Caches and predictors aren't checkpointed: the stats of an
+        # interrupted warmup/ROI are thrown away and redone on resume
+        m5.stats.reset()
+        state = self.get_state()
+        # Switched-out cores don't checkpoint their threads, and a restore
+        # starts on the start cores: go back to them first
+        get_current_key = getattr(self._processor, "get_current_key", None)
+        if get_current_key and get_current_key() != self._processor.get_start_key():
+            print("***Switching to start processor for the checkpoint")
+            self._processor.switch_to(self._processor.get_start_key())
+        chkptDir.mkdir(parents = True, exist_ok = True)
+        m5.checkpoint(chkptDir.as_posix())
+
+        # Stats dumped so far (by this run and any it resumed) go along
+        outdir = Path(m5.options.outdir)
+        with open(chkptDir / PREEMPTED_STATS_FILE, "w") as out:
+            for stats in [outdir / PREEMPTED_STATS_FILE, outdir / "stats.txt"]:
+                if stats.exists():
+                    out.write(stats.read_text())
+
+        # (written last: marks the checkpoint as complete)
+        with open(chkptDir / MANAGER_STATE_FILE, "w") as f:
+            json.dump({"manager": type(self).__name__, "tick": tick, "state": state}, f)
+        self.set_phase("preempted")
+        sys.exit(PREEMPTED_EXIT_CODE)
+
+    def _load_preempted(self, chkptDir: Path) -> None:
+        with open(chkptDir / MANAGER_STATE_FILE, "r") as f:
+            saved = json.load(f)
+        if saved["manager"] != type(self).__name__:
+            print(f"Checkpoint {chkptDir} was preempted under {saved['manager']}, not {type(self).__name__}!")
+            sys.exit(1)
+        print(f"***Resuming preempted simulation from {chkptDir}")
+        self._resumed_state = saved["state"]
+        # keep the stats of the ROIs already done in the outdir
+        if (chkptDir / PREEMPTED_STATS_FILE).exists():
+            shutil.copyfile(chkptDir / PREEMPTED_STATS_FILE,
+                            Path(m5.options.outdir) / PREEMPTED_STATS_FILE)
@@ -40,4 +40,6 @@ class PostBootCheckpointManager(EventManager):
     def handle_checkpoint(self):
         print("###Taking post-OS-boot checkpoint")
         m5.checkpoint(str(self._chkptDir))
+        self.log_event("checkpoint", checkpoint = 1, path = str(self._chkptDir))
+        self.set_phase("done")
         yield True # terminate simulation
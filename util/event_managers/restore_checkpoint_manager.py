@@ -6,7 +6,7 @@ No processor switching, so restore should be with a detailed timing core
 To be used with restore_checkpoint.py workload!
 """
 import sys
-from typing import Dict, Generator
+from typing import Any, Dict, Generator
 
 import m5
 from gem5.simulate.exit_event import ExitEvent
@@ -23,6 +23,8 @@ parser.add_argument("--roi", type=int, help="Simulate and record stats for ROI m
 ###
 
 class RestoreCheckpointManager(EventManager):
+    preemptible = True
+
     def __init__(self, processor : BaseCPUProcessor) -> None:
         super().__init__(processor = processor)
 
@@ -45,17 +47,24 @@ class RestoreCheckpointManager(EventManager):
         else:
             self._roi = 0
 
+        self._plan["planned_rois"] = 1
+        if self._roi > 0:
+            self._plan["planned_insts"] = self._warmup + self._roi
+
     def initialize(self) -> None:
+        super().initialize()
         # need to set up initial max insts interrupts and start ROI if we're
         # not in warmup. board is not initialized yet, so must pass a flag
         # to that effect to schedule_max_insts()!
         if (self._warmup > 0):
             self._processor.schedule_max_insts(self._warmup, core0_only=True,
                                                already_running=False)
+            self.set_phase("warmup", roi = 1, insts = 0)
         else:
             self._start_tick = m5.curTick()
             print("===Entering ROI at restore")
             m5.stats.reset()
+            self.set_phase("roi", roi = 1, insts = 0)
             if (self._roi > 0):
                 self._processor.schedule_max_insts(self._roi, core0_only=True, 
                                                    already_running=False)
@@ -64,11 +73,34 @@ class RestoreCheckpointManager(EventManager):
     handler dictionary
     """
     def get_exit_event_handlers(self) -> Dict[ExitEvent, Generator]:
-        return {
+        return self.add_preemption({
             ExitEvent.WORKEND : self.handle_workend(),
             ExitEvent.MAX_INSTS : self.handle_maxinsts()
+        })
+
+    """
+    preemption state:
+    caches aren't checkpointed, so a restore preempted in its warmup
+    carries on with what's left of it (the cache contents lost are
+    rewarmed along the way); ROI stats can't be split across runs, so
+    preemption waits for the end of the ROI, where the run is done anyway
+    """
+    def can_preempt(self) -> bool:
+        return self._phase != "roi"
+
+    def get_state(self) -> Dict[str, Any]:
+        return {
+            "phase": self._phase,
+            "remaining_insts": self._warmup - self._processor.get_total_insts(core0_only=True),
+            "total_ticks": self._total_ticks
         }
 
+    def set_state(self, state: Dict[str, Any]) -> None:
+        # counts restart from 0 after a restore
+        self._warmup = max(state["remaining_insts"], 1)
+        self._total_ticks = state["total_ticks"]
+        print(f"***Resuming in {state['phase']} with {self._warmup} instructions left")
+
     """
     workend:
     """
@@ -78,6 +110,8 @@ class RestoreCheckpointManager(EventManager):
         print("===Exiting ROI at workend")
         m5.stats.dump()
         m5.stats.reset()
+        self.log_event("roi_end")
+        self.set_phase("done")
         yield True # terminate simulation
 
     """
@@ -89,6 +123,7 @@ class RestoreCheckpointManager(EventManager):
             self._start_tick = m5.curTick()
             print("===Entering ROI at end of warmup")
             m5.stats.reset()
+            self.set_phase("roi", roi = 1)
             if (self._roi > 0):
                 self._processor.schedule_max_insts(self._roi, core0_only=True)
             yield False
@@ -96,4 +131,6 @@ class RestoreCheckpointManager(EventManager):
         print("===Exiting ROI after max insts")
         m5.stats.dump()
         m5.stats.reset()
+        self.log_event("roi_end")
+        self.set_phase("done")
         yield True # terminate simulation
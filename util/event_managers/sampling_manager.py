@@ -3,10 +3,52 @@ Sets up periodic sampling management, allowing for a simulation to
 be fastforwarded for an inital interval, then stepped through intervals
 of X million insts of fast-forward, switch to timing proc, Y million 
 insts of warmup, Z million insts of ROI with stats collection, switch back
+
+With --func_warmup W, the sample starts with W million instructions of
+functional warming on the processor's warming cores (--warm_core_type,
+e.g. atomic, which fills the caches at a fraction of the cost of the
+detailed core) before switching to the timing processor, so that the
+detailed --warmup only needs to cover the core's own state and the tail
+of the cache warmup.
+
+With --target_error, sampling stops early once the ROIs seen so far
+estimate whole-program CPI to within that relative error (at
+--confidence), as if MAX_ROIS had been reached.  Each ROI is one sample
+of its core 0 instructions and ticks (cycles up to a constant factor,
+which doesn't change relative errors), and CPI is their ratio estimate,
+as in util/stats/sampling.py.
+
+With --fork_rois N, the detailed intervals run in parallel with the
+fast-forwarding (as in pFSA): at the end of each FF interval the process
+forks (m5.fork), and the child switches to the timing processor, runs
+the warmup and ROI with its own outdir (OUTDIR/roi.<n>), dumps its stats
+there and exits, while the parent fast-forwards over the sample and on to
+the next one.  At most N children run at once; the parent waits for one
+to finish before forking another.  Each child also writes its sample to
+roi.<n>/roi_sample.json, which the parent reads when it reaps the child,
+so --target_error works as well (though up to N ROIs late).  Once
+sampling is over (or the benchmark ends), the parent waits for the
+remaining children and concatenates their ROI dumps, in ROI order, into
+OUTDIR/stats.rois.txt.  Forking needs gem5's listeners off (done here)
+and is incompatible with preemption.
+
+If the processor has several switch targets (--switch_variants, see
+components/processors/simargs_switchable_processor.py), each sample is
+run once per target, from the same fast-forwarded state, by one child
+each (OUTDIR/roi.<n>.<variant>), and each target's ROIs are merged into
+OUTDIR/stats.rois.<variant>.txt, so one fast-forward serves a whole CPU
+sweep.  gem5 can't snapshot a running system in memory, so this needs
+--fork_rois; --target_error waits for every target's estimate.
 """
+import json
+import math
+import os
+import signal
+import statistics
 import sys
 import time
-from typing import Dict, Generator
+from pathlib import Path
+from typing import Any, Dict, Generator, List, Optional, Tuple
 from enum import Enum
 
 import m5
@@ -14,6 +56,7 @@ from gem5.simulate.exit_event import ExitEvent
 from gem5.components.processors.base_cpu_processor import BaseCPUProcessor
 
 from util.event_managers.event_manager import EventManager
+from util.stats.reader import BEGIN_MARKER, END_MARKER, StatsFile
 import util.simarglib as simarglib
 
 ###
@@ -22,19 +65,35 @@ parser = simarglib.add_parser("Periodic Sampling")
 parser.add_argument("--ff", required=True, type=int, help="Fast-forwarding interval between ROIs, in millions of instructions [REQUIRED]")
 parser.add_argument("--warmup", required=True, type=int, help="Warmup interval before ROIs, in millions of instructions [REQUIRED]")
 parser.add_argument("--roi", required=True, type=int, help="ROI length in millions of instructions [REQUIRED]")
+parser.add_argument("--func_warmup", type=int, help="Functional warming interval on the warming cores before WARMUP, in millions of instructions (default: none)")
 parser.add_argument("--init_ff", type=int, help="Fast-forward the first INIT_FF million instructions after benchmark start")
 parser.add_argument("--max_rois", type=int, help="Stop sampling after MAX_ROIS ROIs (default: no max)")
-parser.add_argument("--continue", default=False, action="store_true", help="After MAX_ROIs reached, continue fast-forward execution (default: terminate)")
+parser.add_argument("--continue", default=False, action="store_true", help="After MAX_ROIs (or TARGET_ERROR) reached, continue fast-forward execution (default: terminate)")
+parser.add_argument("--target_error", type=float, help="Stop sampling once CPI is estimated to within this relative error, e.g. 0.03 (default: no target)")
+parser.add_argument("--confidence", type=float, default=0.95, help="Confidence level for --target_error (default: 0.95)")
+parser.add_argument("--min_rois", type=int, default=10, help="With --target_error, take at least MIN_ROIS ROIs (default: 10)")
+parser.add_argument("--fork_rois", type=int, help="Run each warmup+ROI in a forked child, up to FORK_ROIS at once, while fast-forwarding on (default: no forking)")
 ###
 
+# Written by forked children (see --fork_rois)
+FORKED_OUTDIR = "roi.{}"
+ROI_SAMPLE_FILE = "roi_sample.json"
+MERGED_STATS_FILE = "stats.rois.txt"
+# ... with several switch targets
+VARIANT_FORKED_OUTDIR = "roi.{}.{}"
+VARIANT_MERGED_STATS_FILE = "stats.rois.{}.txt"
+
 class Interval(Enum):
     NO_WORK = 1 # not even in benchmark yet
     FF_INIT = 2 # initial FF window
     FF_WORK = 3 # sampling FF interval
-    WARMUP = 4  # sampling warmup interval
-    ROI = 5     # sampling ROI interval
+    FUNC_WARMUP = 4 # sampling functional (cache) warming interval
+    WARMUP = 5  # sampling warmup interval
+    ROI = 6     # sampling ROI interval
 
 class SamplingManager(EventManager):
+    preemptible = True
+
     def __init__(self, processor : BaseCPUProcessor) -> None:
         super().__init__(processor = processor)
 
@@ -58,6 +117,15 @@ class SamplingManager(EventManager):
             print("ROI length cannot be negative!")
             sys.exit(1)
         self._roi_interval *= 1000000
+
+        self._func_warmup_interval = simarglib.get("func_warmup") or 0
+        if (self._func_warmup_interval < 0):
+            print("FUNC_WARMUP interval cannot be negative!")
+            sys.exit(1)
+        self._func_warmup_interval *= 1000000
+        if self._func_warmup_interval and self._processor.get_warm_key() is None:
+            print("FUNC_WARMUP needs a processor with warming cores (--warm_core_type)!")
+            sys.exit(1)
         
         self._init_ff = simarglib.get("init_ff")
         if self._init_ff:
@@ -74,32 +142,302 @@ class SamplingManager(EventManager):
 
         self._continueSim = simarglib.get("continue")
 
+        self._target_error = simarglib.get("target_error")
+        if self._target_error is not None:
+            if (self._target_error <= 0):
+                print("TARGET_ERROR must be positive!")
+                sys.exit(1)
+            confidence = simarglib.get("confidence")
+            if not (0 < confidence < 1):
+                print("CONFIDENCE must be between 0 and 1!")
+                sys.exit(1)
+            self._z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+            self._min_rois = max(simarglib.get("min_rois"), 2)
+        # (core 0 insts, ticks) of each ROI
+        self._completed_rois = 0
+        self._samples: List[List[int]] = []
+        self._roi_start_insts = 0
+
+        self._fork_rois = simarglib.get("fork_rois")
+        if self._fork_rois is not None:
+            if (self._fork_rois < 1):
+                print("FORK_ROIS must be positive!")
+                sys.exit(1)
+            if self._preempt_dir:
+                print("***Forking ROIs: preemption disabled")
+                self._preempt_dir = None
+                self._plan["preemptible"] = False
+                for sig in [signal.SIGTERM, signal.SIGUSR1]:
+                    signal.signal(sig, signal.SIG_DFL)
+            # m5.fork() refuses to fork with GDB listeners open
+            m5.disableAllListeners()
+        # switch targets to run each sample on
+        self._variants = self._processor.get_switch_keys()
+        if len(self._variants) > 1 and not self._fork_rois:
+            print("Sampling several switch variants requires --fork_rois!")
+            sys.exit(1)
+        # forked children still running: pid -> (ROI number, variant)
+        self._children: Dict[int, Tuple[int, str]] = {}
+        self._forked_rois: List[int] = []
+        # samples of the forked ROIs of each variant
+        self._variant_samples: Dict[str, List[List[int]]] = {}
+        self._is_child = False
+        self._variant: Optional[str] = None
+
+        if self._maxRois:
+            self._plan["planned_rois"] = self._maxRois
+            if not self._continueSim:
+                self._plan["planned_insts"] = (self._init_ff or 0) + self._maxRois * (
+                    self._ff_interval + self._func_warmup_interval + self._warmup_interval
+                    + self._roi_interval)
+
     """
     handler dictionary
     """
     def get_exit_event_handlers(self) -> Dict[ExitEvent, Generator]:
-        return {
+        return self.add_preemption({
             ExitEvent.WORKBEGIN : self.handle_workbegin(),
             ExitEvent.WORKEND : self.handle_workend(),
             ExitEvent.MAX_INSTS : self.handle_maxinsts()
+        })
+
+    """
+    preemption state
+    """
+    def get_state(self) -> Dict[str, Any]:
+        interval = self._current_interval
+        remaining = None
+        if interval in [Interval.FF_INIT, Interval.FF_WORK]:
+            remaining = self._ff_end - self._processor.get_total_insts(core0_only=True)
+        elif interval in [Interval.FUNC_WARMUP, Interval.WARMUP, Interval.ROI]:
+            # caches aren't checkpointed, so the sample starts over (from
+            # the point it was interrupted at, on the start cores the
+            # checkpoint is taken on): warm up right after resuming
+            interval = Interval.FF_WORK
+            remaining = 1
+        return {
+            "interval": interval.name,
+            "completed_rois": self._completed_rois,
+            "total_ticks": self._total_ticks,
+            "remaining_insts": remaining,
+            "samples": self._samples
         }
 
+    def set_state(self, state: Dict[str, Any]) -> None:
+        self._current_interval = Interval[state["interval"]]
+        self._completed_rois = state["completed_rois"]
+        self._total_ticks = state["total_ticks"]
+        self._samples = state.get("samples", [])
+        self._start_time = time.time()
+        remaining = state["remaining_insts"]
+        print(f"***Resuming in {self._current_interval.name} after {self._completed_rois} ROIs")
+        if remaining is not None:
+            # counts restart from 0 after a restore; board isn't running yet
+            self._ff_end = max(remaining, 1)
+            self._processor.schedule_max_insts(self._ff_end, core0_only=True,
+                                               already_running=False)
+        self.set_phase(self._current_interval.name.lower(), insts = 0)
+
+    def _end_roi(self) -> None:
+        """ Count the ROI that just ended (its stats already dumped) """
+        end_tick = m5.curTick()
+        self._total_ticks += (end_tick - self._start_tick)
+        self._completed_rois += 1
+        insts = self._processor.get_total_insts(core0_only=True) - self._roi_start_insts
+        if insts > 0:
+            self._samples.append([insts, end_tick - self._start_tick])
+        if self._is_child:
+            with open(Path(m5.options.outdir) / ROI_SAMPLE_FILE, "w") as f:
+                json.dump({"roi": self._completed_rois, "insts": insts,
+                           "ticks": end_tick - self._start_tick}, f)
+        self._log_roi_end()
+
+    def _log_roi_end(self, **fields) -> None:
+        error = self.get_cpi_error()
+        if error is None:
+            self.log_event("roi_end", **fields)
+        else:
+            num_samples = min(len(samples) for samples in self._sample_sets())
+            print(f"***CPI relative error after {num_samples} ROIs: {error:.2%}")
+            self.log_event("roi_end", cpi_error = error, **fields)
+
+    def _forked_outdir(self, roi: int, variant: str) -> str:
+        if len(self._variants) > 1:
+            return VARIANT_FORKED_OUTDIR.format(roi, variant)
+        return FORKED_OUTDIR.format(roi)
+
+    def _fork_roi(self) -> bool:
+        """ Fork a child per variant to run the next sample; True in the
+        children """
+        roi = self._completed_rois + 1
+        for variant in self._variants:
+            self._reap_children(block = len(self._children) >= self._fork_rois)
+            print(f"***Forking ROI #{roi}{f' on {variant}' if len(self._variants) > 1 else ''}"
+                  " (end of fast-forward interval)")
+            pid = m5.fork(f"%(parent)s/{self._forked_outdir(roi, variant)}")
+            if pid == 0:
+                self._is_child = True
+                self._variant = variant
+                self._children = {}
+                self._variant_samples = {}
+                self._total_ticks = 0
+                # log to (and save the args in) the child's own outdir
+                if self._event_log is not None:
+                    self._event_log.close()
+                    self._event_log = None
+                if simarglib.get("event_log"):
+                    simarglib.args["event_log"] = os.path.join(m5.options.outdir, "events.jsonl")
+                simarglib.args["switch_variant"] = variant
+                simarglib.save()
+                return True
+            self._children[pid] = (roi, variant)
+            self.log_event("roi_forked", forked_roi = roi, variant = variant, pid = pid)
+        self._forked_rois.append(roi)
+        self._completed_rois += 1
+        return False
+
+    def _reap_children(self, block: bool = False, wait_all: bool = False) -> None:
+        """ Collect the samples of finished children (waiting for one if
+        BLOCK, or for every one if WAIT_ALL) """
+        while self._children:
+            pid, status = os.waitpid(-1, 0 if (block or wait_all) else os.WNOHANG)
+            if pid == 0:
+                return
+            if pid not in self._children:
+                continue
+            roi, variant = self._children.pop(pid)
+            block = False
+            sample_path = Path(m5.options.outdir) / self._forked_outdir(roi, variant) / ROI_SAMPLE_FILE
+            if os.waitstatus_to_exitcode(status) != 0 or not sample_path.exists():
+                print(f"***Forked ROI #{roi} ({variant}) failed (exit status {os.waitstatus_to_exitcode(status)})")
+                self.log_event("roi_failed", forked_roi = roi, variant = variant)
+                continue
+            with open(sample_path, "r") as f:
+                sample = json.load(f)
+            samples = self._variant_samples.setdefault(variant, [])
+            if variant == self._variants[0]:
+                # (count each sample's ticks once)
+                self._total_ticks += sample["ticks"]
+            if sample["insts"] > 0:
+                samples.append([sample["insts"], sample["ticks"]])
+            self._log_roi_end(forked_roi = roi, variant = variant)
+
+    def _merge_forked_rois(self) -> None:
+        """ Wait for all children, then concatenate their ROI dumps """
+        if self._is_child or not self._forked_rois:
+            return
+        print(f"***Waiting for {len(self._children)} forked ROIs")
+        self._reap_children(wait_all = True)
+        outdir = Path(m5.options.outdir)
+        for variant in self._variants:
+            merged = outdir / (VARIANT_MERGED_STATS_FILE.format(variant)
+                               if len(self._variants) > 1 else MERGED_STATS_FILE)
+            with open(merged, "w") as out:
+                for roi in self._forked_rois:
+                    stats_path = outdir / self._forked_outdir(roi, variant) / "stats.txt"
+                    if not (stats_path.parent / ROI_SAMPLE_FILE).exists():
+                        continue
+                    # (the ROI is the child's first dump; any later one is
+                    # gem5's final block)
+                    with StatsFile(stats_path.as_posix(), save_index = False) as stats:
+                        if len(stats):
+                            out.write(f"\n{BEGIN_MARKER.decode()}\n{stats.raw(0)}{END_MARKER.decode()}\n")
+            print(f"***Merged stats of {len(self._forked_rois)} forked ROIs into {merged}")
+        self._forked_rois = []
+
+    def _sample_sets(self) -> List[List[List[int]]]:
+        if self._variant_samples:
+            return [self._variant_samples.get(variant, []) for variant in self._variants]
+        return [self._samples]
+
+    def get_cpi_error(self) -> Optional[float]:
+        """ Relative half-width of the CPI confidence interval so far, the
+        worst over the variants (None without --target_error, or before
+        two ROIs) """
+        if self._target_error is None:
+            return None
+        errors = []
+        for samples in self._sample_sets():
+            n = len(samples)
+            if n < 2:
+                return None
+            insts = sum(sample[0] for sample in samples)
+            ticks = sum(sample[1] for sample in samples)
+            ratio = ticks / insts
+            var = sum((t - ratio * i) ** 2 for i, t in samples) / (n - 1)
+            errors.append(self._z * math.sqrt(var) / (ratio * insts / n) / math.sqrt(n))
+        return max(errors)
+
+    def _sampling_done(self) -> bool:
+        if (self._maxRois and self._completed_rois >= self._maxRois):
+            print("***Max ROIs reached")
+            return True
+        if self._target_error is not None and \
+                min(len(samples) for samples in self._sample_sets()) >= self._min_rois:
+            error = self.get_cpi_error()
+            if error is not None and error <= self._target_error:
+                print(f"***Target CPI error reached ({error:.2%} <= {self._target_error:.2%})")
+                return True
+        return False
+
+    def _next_sample(self) -> bool:
+        """ Schedule the next FF interval, unless we're done sampling;
+        True to terminate """
+        if not self._sampling_done():
+            insts = self._ff_interval
+            if self._fork_rois and not self._is_child:
+                # the child runs the sample: fast-forward over it too
+                insts += self._func_warmup_interval + self._warmup_interval + self._roi_interval
+            self._schedule_ff(insts)
+            return False
+        if (self._continueSim):
+            print("***Fast-forwarding remainder of benchmark")
+            return False
+        self._merge_forked_rois()
+        print("***Terminating simulation")
+        m5.stats.reset() # clear unwanted final stats block
+        self.set_phase("done")
+        return True
+
+    def _start_warmup(self) -> None:
+        """ Switch to the timing processor (this child's variant, if
+        forked) and start the detailed warmup """
+        if self._variant is not None:
+            print(f"***Switching to timing processor {self._variant} (forked ROI)")
+            self._processor.switch_to(self._variant)
+        else:
+            print("***Switching to timing processor (end of fast-forward interval)")
+            self._processor.switch_to(self._processor.get_switch_keys()[0])
+        self._current_interval = Interval.WARMUP
+        self.set_phase("warmup", roi = self._completed_rois + 1)
+        # schedule end of WARMUP interval
+        self._processor.schedule_max_insts(self._warmup_interval, core0_only=True)
+
+    def _schedule_ff(self, insts: int) -> None:
+        self._ff_end = self._processor.get_total_insts(core0_only=True) + insts
+        self._processor.schedule_max_insts(insts, core0_only=True)
+
     """
     workbegin
     """
     def handle_workbegin(self):
         while True:
             self._completed_rois = 0
+            self._samples = []
+            self._variant_samples = {}
+            self._forked_rois = []
             print("***Beginning benchmark execution")
             if (self._init_ff):
                 # Initial fast-forward set: no core switch, but set up next exit event
                 print("***Beginning initial fast-forward")
                 self._current_interval = Interval.FF_INIT
-                self._processor.schedule_max_insts(self._init_ff, core0_only=True)
+                self.set_phase("ff_init")
+                self._schedule_ff(self._init_ff)
             else:
                 # No initial FF, we should start sampling iterations
                 self._current_interval = Interval.FF_WORK
-                self._processor.schedule_max_insts(self._ff_interval, core0_only=True)
+                self.set_phase("ff")
+                self._schedule_ff(self._ff_interval)
             self._start_time = time.time()
             yield False
     
@@ -114,17 +452,22 @@ class SamplingManager(EventManager):
                 print(f"===Exiting stats ROI #{self._completed_rois + 1} at benchmark end."
                       f" Took {round(time.time()-self._start_time, 2)} seconds")
                 m5.stats.dump()
-                end_tick = m5.curTick()
-                self._total_ticks += (end_tick - self._start_tick)
-                self._completed_rois += 1
-            if (self._current_interval in [Interval.ROI, Interval.WARMUP]):
+                self._end_roi()
+            if self._is_child:
+                # the sample ends with the benchmark
+                m5.stats.reset()
+                self.set_phase("done")
+                yield True
+            if (self._current_interval in [Interval.ROI, Interval.WARMUP, Interval.FUNC_WARMUP]):
                 # We're mid-ROI or mid-warmup
                 print("***Switching to fast-forward processor for post-benchmark")
                 self._processor.switch()
             # Gem5 will always dump an annoying final stats block when it
             # exits, if any stats have changed since last one. Zero it, anyway
+            self._merge_forked_rois()
             m5.stats.reset()
             self._current_interval = Interval.NO_WORK
+            self.set_phase("no_work")
             yield False
 
     """
@@ -137,24 +480,22 @@ class SamplingManager(EventManager):
                 print(f"===Exiting stats ROI #{self._completed_rois + 1}."
                       f" Took {round(time.time()-self._start_time, 2)} seconds")
                 m5.stats.dump()
-                end_tick = m5.curTick()
-                self._total_ticks += (end_tick - self._start_tick)
-                self._completed_rois += 1
+                self._end_roi()
+
+                if self._is_child:
+                    # forked sample done: the parent has moved on
+                    m5.stats.reset()
+                    self.set_phase("done")
+                    yield True # terminate .run()
 
                 print("***Switching to fast-forward processor")
                 self._processor.switch()
                 self._current_interval = Interval.FF_WORK
+                self.set_phase("ff")
 
-                # schedule end of FF_WORK interval (if we're not out of MAX_ROIs)
-                if (self._maxRois and self._completed_rois >= self._maxRois):
-                    if (self._continueSim):
-                        print("***Max ROIs reached, fast-forwarding remainder of benchmark")
-                    else:
-                        print("***Max ROIs reached, terminating simulation")
-                        m5.stats.reset() # clear unwanted final stats block
-                        yield True # terminate .run()
-                else:
-                    self._processor.schedule_max_insts(self._ff_interval, core0_only=True)
+                # schedule end of FF_WORK interval (if we're not done sampling)
+                if self._next_sample():
+                    yield True # terminate .run()
             
             # WARMUP -> ROI: end of warmup, reset stats and start ROI
             elif (self._current_interval == Interval.WARMUP):
@@ -162,24 +503,41 @@ class SamplingManager(EventManager):
                       f" Warmup took {round(time.time()-self._start_time, 2)} seconds")
                 m5.stats.reset()
                 self._start_tick = m5.curTick()
+                self._roi_start_insts = self._processor.get_total_insts(core0_only=True)
                 self._current_interval = Interval.ROI
+                self.set_phase("roi", roi = self._completed_rois + 1)
                 # schedule end of ROI interval
                 self._processor.schedule_max_insts(self._roi_interval, core0_only=True)
 
-            # FF_WORK -> WARMUP: end of fast-forward, switch processors and enter warmup
+            # FUNC_WARMUP -> WARMUP: caches warm, switch to timing proc and enter warmup
+            elif (self._current_interval == Interval.FUNC_WARMUP):
+                print(f"***End of functional warming. Took {round(time.time()-self._start_time, 2)} seconds")
+                self._start_warmup()
+
+            # FF_WORK -> (FUNC_WARMUP or) WARMUP: end of fast-forward, switch processors
             elif (self._current_interval == Interval.FF_WORK):
-                print("***Switching to timing processor (end of fast-forward interval)")
-                self._processor.switch()
-                self._current_interval = Interval.WARMUP
-                # schedule end of WARMUP interval
-                self._processor.schedule_max_insts(self._warmup_interval, core0_only=True)
+                if self._fork_rois and not self._is_child and not self._fork_roi():
+                    # parent: the child has the sample, keep fast-forwarding
+                    self.set_phase("ff")
+                    if self._next_sample():
+                        yield True # terminate .run()
+                elif self._func_warmup_interval:
+                    print("***Switching to warming processor (end of fast-forward interval)")
+                    self._processor.switch_to(self._processor.get_warm_key())
+                    self._current_interval = Interval.FUNC_WARMUP
+                    self.set_phase("func_warmup", roi = self._completed_rois + 1)
+                    # schedule end of FUNC_WARMUP interval
+                    self._processor.schedule_max_insts(self._func_warmup_interval, core0_only=True)
+                else:
+                    self._start_warmup()
 
             # FF_INIT -> FF_WORK: done with init, begin ff/warmup/roi iteration
             elif (self._current_interval == Interval.FF_INIT):
                 print(f"***End of initial fast-forward. Took {round(time.time()-self._start_time, 2)} seconds")
                 self._current_interval = Interval.FF_WORK
+                self.set_phase("ff")
                 # schedule end of FF_WORK interval
-                self._processor.schedule_max_insts(self._ff_interval, core0_only=True)
+                self._schedule_ff(self._ff_interval)
 
             # else: current_interval == Interval.NO_WORK: nothing to do!
             # (this occurs if workend arrived mid-sample-interval, leaving one schedule maxinsts)
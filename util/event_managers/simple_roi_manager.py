@@ -14,6 +14,7 @@ from util.event_managers.event_manager import EventManager
 class SimpleROIManager(EventManager):
     def __init__(self, processor : BaseCPUProcessor) -> None:
         super().__init__(processor = processor)
+        self._rois = 0
 
     """ handler dictionary """
     def get_exit_event_handlers(self) -> Dict[ExitEvent, Generator]:
@@ -30,6 +31,8 @@ class SimpleROIManager(EventManager):
         
             print("===Entering ROI")
             m5.stats.reset()
+            self._rois += 1
+            self.set_phase("roi", roi = self._rois)
             yield False
     
     def handle_workend(self):
@@ -39,6 +42,8 @@ class SimpleROIManager(EventManager):
             print("===Exiting ROI")
             m5.stats.dump()
             m5.stats.reset()
+            self.log_event("roi_end")
             print("***Switching to fast-forward processor")
             self._processor.switch()
+            self.set_phase("ff")
             yield False
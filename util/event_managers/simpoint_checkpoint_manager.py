@@ -0,0 +1,150 @@
+"""
+Takes checkpoints at the simulation points picked from a BBV profile
+(see bbv_profile_manager.py and pick_simpoints.py), WARMUP million
+instructions before the start of each, so that restoring one with
+RestoreCheckpointManager and --warmup WARMUP --roi <BBV interval>
+simulates exactly that interval.
+
+Each checkpoint dir (CHECKPOINTS_DIR/chkpt.<tick>) also gets a
+simpoint.json with the point's interval, weight and instruction counts,
+for weighting the restored runs' stats.  Its warmup_insts is the warmup
+the checkpoint actually has before the point, which is less than WARMUP
+near the start of the program and where points' warmups overlap.  Must
+be run on the same core type and from the same starting point as the
+profiling pass.
+"""
+import json
+import sys
+from pathlib import Path
+from typing import Dict, Generator
+
+import m5
+from gem5.simulate.exit_event import ExitEvent
+from gem5.components.processors.base_cpu_processor import BaseCPUProcessor
+
+from util.event_managers.event_manager import EventManager
+import util.simarglib as simarglib
+
+###
+# PARSER CONFIGURATION
+parser = simarglib.add_parser("SimPoint Checkpointing")
+parser.add_argument("--simpoints", required=True, type=str, help="JSON file of simulation points, from pick_simpoints.py [REQUIRED]")
+parser.add_argument("--checkpoints_dir", type=str, default="checkpoints", help="The enclosing directory in which to store checkpoint dirs (default: checkpoints/)")
+parser.add_argument("--simpoint_warmup", type=int, default=0, help="Checkpoint SIMPOINT_WARMUP million instructions before each simulation point (default: 0)")
+###
+
+# Written into each checkpoint dir
+SIMPOINT_FILE = "simpoint.json"
+
+class SimPointCheckpointManager(EventManager):
+    def __init__(self, processor : BaseCPUProcessor) -> None:
+        super().__init__(processor = processor)
+
+        try:
+            with open(simarglib.get("simpoints"), "r") as f:
+                picked = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not read simulation points: {e}")
+            sys.exit(1)
+        self._bbv_interval = picked["interval"]
+
+        warmup = simarglib.get("simpoint_warmup")
+        if (warmup < 0):
+            print("SIMPOINT_WARMUP must be non-negative!")
+            sys.exit(1)
+        warmup *= 1000000
+
+        # checkpoints to take, in order of instruction count
+        self._points = []
+        for simpoint in picked["simpoints"]:
+            checkpoint_insts = max(simpoint["start_insts"] - warmup, 0)
+            self._points.append(dict(simpoint,
+                                     checkpoint_insts = checkpoint_insts,
+                                     warmup_insts = simpoint["start_insts"] - checkpoint_insts,
+                                     roi_insts = self._bbv_interval))
+        self._points.sort(key = lambda point: point["checkpoint_insts"])
+        if not self._points:
+            print("No simulation points to checkpoint!")
+            sys.exit(1)
+        self._next = 0
+
+        self._chkptDir = Path(simarglib.get("checkpoints_dir"))
+        self._chkptDir.mkdir(parents = True, exist_ok = True)
+
+        self._plan["planned_rois"] = len(self._points)
+        self._plan["planned_insts"] = self._points[-1]["checkpoint_insts"]
+
+    def initialize(self) -> None:
+        super().initialize()
+        # board is not initialized yet, so must pass a flag to that effect
+        # to schedule_max_insts()!
+        self._schedule_next(already_running = False)
+        self.set_phase("ff", roi = 1, insts = 0)
+
+    def _schedule_next(self, already_running: bool = True) -> None:
+        insts = self._points[self._next]["checkpoint_insts"]
+        if already_running:
+            insts -= self._processor.get_total_insts(core0_only=True)
+        self._processor.schedule_max_insts(max(insts, 1), core0_only=True,
+                                           already_running=already_running)
+
+    """
+    handler dictionary
+    """
+    def get_exit_event_handlers(self) -> Dict[ExitEvent, Generator]:
+        return {
+            ExitEvent.WORKBEGIN : self.handle_workbegin(),
+            ExitEvent.WORKEND : self.handle_workend(),
+            ExitEvent.MAX_INSTS : self.handle_maxinsts()
+        }
+
+    """
+    workbegin: nothing to do, points are counted from the start
+    """
+    def handle_workbegin(self):
+        while True:
+            print("***Beginning benchmark execution")
+            yield False
+
+    """
+    workend:
+    """
+    def handle_workend(self):
+        print(f"***End of benchmark execution with {len(self._points) - self._next}"
+              " simulation point(s) left to checkpoint!")
+        self.set_phase("done")
+        yield True # terminate simulation
+
+    """
+    maxinsts:
+    """
+    def handle_maxinsts(self):
+        while True:
+            # record where the checkpoint actually is: points whose warmups
+            # overlap may be due at the same place, and only one checkpoint
+            # can be taken there, so the others come late
+            insts = self._processor.get_total_insts(core0_only=True)
+            point = dict(self._points[self._next], checkpoint_insts = insts,
+                         warmup_insts = self._points[self._next]["start_insts"] - insts)
+            if point["warmup_insts"] < 0:
+                print(f"###Skipping simulation point {self._next + 1} (interval {point['interval']}):"
+                      f" already {-point['warmup_insts']} instructions past its start")
+                self.log_event("checkpoint_skipped", checkpoint = self._next + 1)
+            else:
+                checkpoint = self._chkptDir / f"chkpt.{m5.curTick()}"
+                print(f"###Checkpoint {self._next + 1} of {len(self._points)} (interval"
+                      f" {point['interval']}, weight {point['weight']:.3f},"
+                      f" warmup {point['warmup_insts']}): {checkpoint}")
+                m5.checkpoint(checkpoint.as_posix())
+                with open(checkpoint / SIMPOINT_FILE, "w") as f:
+                    json.dump(point, f, indent = 1)
+                self.log_event("checkpoint", checkpoint = self._next + 1, path = checkpoint.as_posix())
+
+            self._next += 1
+            if self._next < len(self._points):
+                self.set_phase("ff", roi = self._next + 1)
+                self._schedule_next()
+                yield False
+            else:
+                self.set_phase("done")
+                yield True # terminate simulation
@@ -40,6 +40,9 @@ class TakeCheckpointsManager(EventManager):
         else:
             self._interval = 0
 
+        if self._max_checkpoints and self._interval:
+            self._plan["planned_insts"] = (self._max_checkpoints - 1) * self._interval
+
         # Create enclosing checkpoint directory
         self._chkptDir = Path(self._checkpoints_dir)
         self._chkptDir.mkdir(parents = True, exist_ok = True)
@@ -63,6 +66,7 @@ class TakeCheckpointsManager(EventManager):
         print("===Exiting ROI")
         m5.stats.dump()
         m5.stats.reset()
+        self.set_phase("done")
         yield True # terminate simulation
 
     """
@@ -72,11 +76,13 @@ class TakeCheckpointsManager(EventManager):
         self._start_tick = m5.curTick()
         print("===Entering ROI")
         m5.stats.reset()
+        self.set_phase("roi")
         print(f"###Taking checkpoints every {self._interval} instructions")
         self._checkpoint_num += 1
         checkpoint = (self._chkptDir / f"chkpt.{str(self._start_tick)}").as_posix()
         print(f"###Checkpoint 1 (start of ROI): {checkpoint}")
         m5.checkpoint(str(checkpoint))
+        self.log_event("checkpoint", checkpoint = self._checkpoint_num, path = checkpoint)
         # If we have more checkpoints to take, keep going, otherwise we're done
         if not self._max_checkpoints or (self._checkpoint_num < self._max_checkpoints):
             self._processor.schedule_max_insts(self._interval, core0_only=True)
@@ -93,6 +99,7 @@ class TakeCheckpointsManager(EventManager):
             checkpoint = (self._chkptDir / f"chkpt.{str(m5.curTick())}").as_posix()
             print(f"###Checkpoint {self._checkpoint_num}: {checkpoint}")
             m5.checkpoint(str(checkpoint))
+            self.log_event("checkpoint", checkpoint = self._checkpoint_num, path = checkpoint)
             # If we have more checkpoints to take, keep going, otherwise we're done
             if not self._max_checkpoints or (self._checkpoint_num < self._max_checkpoints):
                 self._processor.schedule_max_insts(self._interval, core0_only=True)
@@ -0,0 +1,408 @@
+"""
+Coordinator/worker mode for the command runner
+
+The coordinator is the usual runner (dependencies, ledger, retries,
+result cache) but instead of launching commands itself it hands them to
+worker processes, on this or other hosts, that connect to it over TCP
+("host:port") or a Unix socket (a path).  Workers pull jobs when they
+have a free slot, run them exactly as the local runner would, and send
+back their exit status and the final stats files of the job's outdir.
+
+The protocol is one JSON object per line:
+
+  worker -> coordinator
+    {"type": "hello", "worker": NAME, "slots": N}
+    {"type": "request"}                          a slot is free
+    {"type": "heartbeat", "running": [JOB, ...], "eta": {JOB: SECS, ...}}
+    {"type": "started", "job": JOB}
+    {"type": "file", "job": JOB, "name": FILE, "offset": N, "data": BASE64}
+    {"type": "result", "job": JOB, "exit_code": N, "failure": KIND,
+     "files": [FILE, ...]}
+
+  coordinator -> worker
+    {"type": "job", "name": JOB, "cmd": CMD, "timeout": SECS,
+     "cwd": DIR, "env": {VAR: VALUE, ...}}       (cwd/env null: inherit)
+    {"type": "cancel", "job": JOB}
+    {"type": "done"}                             no more work, exit
+
+A worker that disconnects or misses heartbeats for HEARTBEAT_TIMEOUT
+seconds is considered dead, and the jobs it was running are handed to
+other workers.
+
+Heartbeats also carry the estimated time left of each running job (from
+its event log, see dashboard.py), which the runner uses to spot
+stragglers.  Their backup copies are sent to a different worker.
+"""
+import asyncio
+import base64
+import collections
+import fnmatch
+import json
+import os
+import socket
+import time
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from util.runner.failures import FailureKind
+from util.runner.jobs import Job
+
+# How often workers report in
+HEARTBEAT_SECS = 10
+# How long a silent worker is given before its jobs are reassigned
+HEARTBEAT_TIMEOUT = 60
+# Files of a finished job's outdir sent back to the coordinator (globs;
+# stats.rois*.txt: forked ROIs merged by the sampling manager)
+RESULT_FILES = ["stats.txt", "stats.rois.txt", "stats.rois.*.txt", "config.ini", "config.json"]
+# Raw bytes per "file" message (each line must fit in _LINE_LIMIT)
+FILE_CHUNK_SIZE = 256 * 1024
+_LINE_LIMIT = 1 << 20
+
+def _is_unix(address: str) -> bool:
+    return "/" in address or ":" not in address
+
+
+def _split_tcp(address: str) -> Tuple[str, int]:
+    host, port = address.rsplit(":", 1)
+    return host or "0.0.0.0", int(port)
+
+
+def result_files(outdir: str) -> List[str]:
+    """The names of the files of OUTDIR that match RESULT_FILES (or are
+    them gzipped, if the stager compresses results).
+    """
+    patterns = RESULT_FILES + [f"{pattern}.gz" for pattern in RESULT_FILES]
+    names = os.listdir(outdir) if os.path.isdir(outdir) else []
+    return sorted(name for name in names
+                  if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+                  and os.path.isfile(os.path.join(outdir, name)))
+
+
+async def _send(writer: asyncio.StreamWriter, **msg) -> None:
+    writer.write(json.dumps(msg).encode() + b"\n")
+    await writer.drain()
+
+
+class _Worker:
+    def __init__(self, name: str, writer: asyncio.StreamWriter) -> None:
+        self.name = name
+        self.writer = writer
+        self.last_seen = time.time()
+        # free slots the worker has asked to fill
+        self.requests = 0
+        self.jobs: Set[str] = set()
+
+
+class Coordinator:
+    def __init__(self, address: str, heartbeat_timeout: float = HEARTBEAT_TIMEOUT) -> None:
+        """
+        :param address: "host:port" to listen on TCP, or a Unix socket path.
+        :param heartbeat_timeout: Seconds of silence before a worker is dead.
+        """
+        self._address = address
+        self._heartbeat_timeout = heartbeat_timeout
+        self._queue: Deque[Job] = collections.deque()
+        self._jobs: Dict[str, Job] = {}
+        self._timeouts: Dict[str, Optional[float]] = {}
+        self._started: Dict[str, Optional[Callable[[], None]]] = {}
+        # workers jobs must not be sent to (backups avoid the original's)
+        self._avoid: Dict[str, Optional[str]] = {}
+        # latest estimated seconds left of running jobs
+        self._etas: Dict[str, Optional[float]] = {}
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._workers: Dict[int, _Worker] = {}
+        self._server = None
+        self._monitor = None
+        self._connections: Set[asyncio.Task] = set()
+        self._closing = False
+
+    async def start(self) -> None:
+        if _is_unix(self._address):
+            if os.path.exists(self._address):
+                os.unlink(self._address)
+            self._server = await asyncio.start_unix_server(
+                self._serve, self._address, limit = _LINE_LIMIT)
+        else:
+            host, port = _split_tcp(self._address)
+            self._server = await asyncio.start_server(
+                self._serve, host, port, limit = _LINE_LIMIT)
+        self._monitor = asyncio.create_task(self._watch_heartbeats())
+        print(f"Waiting for workers on {self._address}...")
+
+    async def close(self) -> None:
+        """Tell all workers to exit and stop listening.
+        """
+        self._closing = True
+        if self._monitor:
+            self._monitor.cancel()
+        for worker in list(self._workers.values()):
+            try:
+                await _send(worker.writer, type = "done")
+            except ConnectionError:
+                pass
+        # let the workers hang up first
+        if self._connections:
+            await asyncio.wait(self._connections, timeout = HEARTBEAT_SECS)
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        if _is_unix(self._address) and os.path.exists(self._address):
+            os.unlink(self._address)
+
+    async def run(
+        self,
+        job: Job,
+        timeout: Optional[float] = None,
+        started: Optional[Callable[[], None]] = None,
+        avoid: Optional[str] = None
+    ) -> Tuple[int, Optional[FailureKind]]:
+        """Run JOB on the next worker with a free slot, killing it after
+        TIMEOUT seconds; returns its exit code and, if it failed, why.
+        STARTED is called when a worker starts running it.  If possible,
+        JOB isn't run on the worker named AVOID.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._futures[job.name] = future
+        self._jobs[job.name] = job
+        self._timeouts[job.name] = timeout
+        self._started[job.name] = started
+        self._avoid[job.name] = avoid
+        self._queue.append(job)
+        await self._dispatch()
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if job in self._queue:
+                self._queue.remove(job)
+            for worker in self._workers.values():
+                if job.name in worker.jobs:
+                    worker.jobs.discard(job.name)
+                    try:
+                        await _send(worker.writer, type = "cancel", job = job.name)
+                    except ConnectionError:
+                        pass
+            raise
+        finally:
+            del self._futures[job.name]
+            del self._jobs[job.name]
+            del self._timeouts[job.name]
+            del self._started[job.name]
+            del self._avoid[job.name]
+            self._etas.pop(job.name, None)
+
+    def worker_of(self, name: str) -> Optional[str]:
+        """Name of the worker running job NAME, if any.
+        """
+        for worker in self._workers.values():
+            if name in worker.jobs:
+                return worker.name
+        return None
+
+    def eta(self, name: str) -> Optional[float]:
+        """Seconds left of job NAME, as its worker last estimated them.
+        """
+        return self._etas.get(name)
+
+    def idle(self, avoid: Optional[str] = None) -> bool:
+        """Whether nothing is queued and a worker (other than AVOID) has
+        a free slot.
+        """
+        return not self._queue and any(
+            worker.requests > 0 and worker.name != avoid for worker in self._workers.values())
+
+    async def _dispatch(self) -> None:
+        for job in list(self._queue):
+            # fill the worker with the most free slots first
+            ready = [w for w in self._workers.values() if w.requests > 0]
+            if not ready:
+                return
+            if len(ready) > 1 or ready[0].name != self._avoid[job.name]:
+                ready = [w for w in ready if w.name != self._avoid[job.name]]
+            worker = max(ready, key = lambda w: w.requests)
+            self._queue.remove(job)
+            worker.requests -= 1
+            worker.jobs.add(job.name)
+            print(f"Sending {job.name} to worker {worker.name}.")
+            try:
+                await _send(worker.writer, type = "job", name = job.name, cmd = job.cmd,
+                            timeout = self._timeouts[job.name], cwd = job.cwd, env = job.env)
+            except ConnectionError:
+                self._lost(worker, "connection lost")
+
+    def _lost(self, worker: _Worker, reason: str) -> None:
+        """Hand a dead worker's jobs to the others.
+        """
+        if id(worker.writer) not in self._workers:
+            return
+        del self._workers[id(worker.writer)]
+        worker.writer.close()
+        if self._closing:
+            return
+        print(f"Lost worker {worker.name} ({reason}).")
+        for name in sorted(worker.jobs):
+            if name in self._jobs:
+                print(f"Reassigning {name}.")
+                self._queue.appendleft(self._jobs[name])
+        worker.jobs.clear()
+
+    async def _watch_heartbeats(self) -> None:
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECS)
+            now = time.time()
+            for worker in list(self._workers.values()):
+                if now - worker.last_seen > self._heartbeat_timeout:
+                    self._lost(worker, f"no heartbeat for {now - worker.last_seen:.0f} s")
+            await self._dispatch()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        worker = None
+        self._connections.add(asyncio.current_task())
+        try:
+            while line := await reader.readline():
+                msg = json.loads(line)
+                if msg["type"] == "hello":
+                    worker = _Worker(msg["worker"], writer)
+                    self._workers[id(writer)] = worker
+                    print(f"Worker {worker.name} connected with {msg['slots']} slot(s).")
+                    continue
+                if worker is None or id(writer) not in self._workers:
+                    break
+                worker.last_seen = time.time()
+                if msg["type"] == "request":
+                    worker.requests += 1
+                    await self._dispatch()
+                elif msg["type"] == "heartbeat":
+                    for name, eta in msg.get("eta", {}).items():
+                        if name in worker.jobs:
+                            self._etas[name] = eta
+                elif msg["type"] == "started" and msg["job"] in worker.jobs:
+                    print(f"Worker {worker.name} started {msg['job']}.")
+                    if self._started[msg["job"]]:
+                        self._started[msg["job"]]()
+                elif msg["type"] == "file" and msg["job"] in worker.jobs:
+                    self._write_part(self._jobs[msg["job"]], msg["name"],
+                                     base64.b64decode(msg["data"]), msg["offset"])
+                elif msg["type"] == "result" and msg["job"] in worker.jobs:
+                    worker.jobs.discard(msg["job"])
+                    job = self._jobs[msg["job"]]
+                    for name in msg.get("files", []):
+                        os.replace(self._part(job, name), os.path.join(job.outdir, name))
+                    failure = FailureKind(msg["failure"]) if msg["failure"] else None
+                    self._futures[job.name].set_result((msg["exit_code"], failure))
+        except (ConnectionError, ValueError, KeyError) as e:
+            if worker:
+                print(f"Bad message from worker {worker.name}: {e}")
+        finally:
+            self._connections.discard(asyncio.current_task())
+            if worker:
+                self._lost(worker, "disconnected")
+                await self._dispatch()
+
+    def _part(self, job: Job, name: str) -> str:
+        return os.path.join(job.outdir, f".{name}.part")
+
+    def _write_part(self, job: Job, name: str, data: bytes, offset: int) -> None:
+        if os.path.basename(name) != name:
+            raise ValueError(f"bad result file name {name}")
+        os.makedirs(job.outdir, exist_ok = True)
+        with open(self._part(job, name), "r+b" if offset else "wb") as f:
+            f.seek(offset)
+            f.write(data)
+
+
+async def _connect(address: str):
+    if _is_unix(address):
+        return await asyncio.open_unix_connection(address, limit = _LINE_LIMIT)
+    host, port = _split_tcp(address)
+    return await asyncio.open_connection(host, port, limit = _LINE_LIMIT)
+
+
+class Worker:
+    def __init__(self, address: str, executor, slots: int = 8, name: Optional[str] = None) -> None:
+        """
+        :param address: Where the coordinator listens ("host:port" or a path).
+        :param executor: JobExecutor whose run_job() runs each command.
+        :param slots: Most jobs to run at once.
+        :param name: How the coordinator refers to this worker
+        (default: HOST.PID).
+        """
+        self._address = address
+        self._executor = executor
+        self._slots = slots
+        self.name = name or f"{socket.gethostname()}.{os.getpid()}"
+        self._running: Dict[str, asyncio.Task] = {}
+
+    def run(self) -> None:
+        asyncio.run(self.run_async())
+
+    async def run_async(self) -> None:
+        # The coordinator may not be up yet
+        for attempt in range(HEARTBEAT_TIMEOUT):
+            try:
+                reader, writer = await _connect(self._address)
+                break
+            except (ConnectionError, FileNotFoundError):
+                await asyncio.sleep(1)
+        else:
+            print(f"Could not connect to coordinator at {self._address}.")
+            return
+
+        await _send(writer, type = "hello", worker = self.name, slots = self._slots)
+        for _ in range(self._slots):
+            await _send(writer, type = "request")
+        heartbeat = asyncio.create_task(self._heartbeat(writer))
+        try:
+            while line := await reader.readline():
+                msg = json.loads(line)
+                if msg["type"] == "job":
+                    job = Job(msg["cmd"], name = msg["name"], timeout = msg["timeout"],
+                              cwd = msg.get("cwd"), env = msg.get("env"))
+                    self._running[job.name] = asyncio.create_task(self._run(job, writer))
+                elif msg["type"] == "cancel" and msg["job"] in self._running:
+                    self._running[msg["job"]].cancel()
+                elif msg["type"] == "done":
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            heartbeat.cancel()
+            for task in self._running.values():
+                task.cancel()
+            await asyncio.gather(*self._running.values(), return_exceptions = True)
+            writer.close()
+
+    async def _heartbeat(self, writer: asyncio.StreamWriter) -> None:
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECS)
+            await _send(writer, type = "heartbeat", running = sorted(self._running),
+                        eta = {name: self._executor.eta(name) for name in self._running})
+
+    async def _run(self, job: Job, writer: asyncio.StreamWriter) -> None:
+        try:
+            await _send(writer, type = "started", job = job.name)
+            res, failure = await self._executor.run_job(job)
+            files = result_files(job.outdir)
+            for name in files:
+                await self._send_file(writer, job, name, os.path.join(job.outdir, name))
+            await _send(writer, type = "result", job = job.name, exit_code = res,
+                        failure = failure.value if failure else None, files = files)
+        finally:
+            del self._running[job.name]
+            # the slot is free again, however the job ended (cancelled too)
+            if not writer.is_closing():
+                try:
+                    await _send(writer, type = "request")
+                except ConnectionError:
+                    pass
+
+    async def _send_file(self, writer: asyncio.StreamWriter, job: Job, name: str, path: str) -> None:
+        with open(path, "rb") as f:
+            offset = 0
+            while True:
+                data = f.read(FILE_CHUNK_SIZE)
+                if not data and offset:
+                    return
+                await _send(writer, type = "file", job = job.name, name = name,
+                            offset = offset, data = base64.b64encode(data).decode())
+                if not data:
+                    return
+                offset += len(data)
@@ -0,0 +1,575 @@
+"""
+Multi-user job daemon for the command runner
+
+A long-running daemon (run_cmds_daemon.py) runs the commands users submit
+to it over a Unix socket (queue_cmds.py), so that everyone sharing a
+machine goes through one budget of memory and cores instead of each
+running their own run_cmds_locally.py and hoping for the best.
+
+Each user has their own queue, ordered by job priority (priority=N in the
+command file) and then by submission.  Across users, jobs start in
+fair-share order: the next one comes from the user with the smallest
+dominant share, i.e. the larger of the fractions of the budget's memory
+and cores their running jobs hold, divided by their weight.  Users can
+also be capped by a quota of memory and cores (as with the budget, a job
+bigger than its user's whole quota can still run on its own).  Quotas and
+weights come from a JSON file:
+
+  {"*":     {"cores": 8, "mem": "64G"},            defaults for everyone
+   "alice": {"cores": 16, "mem": "128G", "weight": 2}}
+
+Users are identified by the credentials of the process connecting to the
+socket, not by anything the client claims.  Commands run in the directory
+and with the environment they were submitted from: as the submitting user
+if the daemon runs as root, otherwise as the daemon's own user, in which
+case the socket's permissions decide who may submit.
+
+Command files are parsed as by run_cmds_locally.py.  after= dependencies
+refer to the same user's jobs, in the same submission or an earlier one.
+Anonymous jobs are named job<ID>.
+
+The protocol is one JSON request and one JSON reply per connection:
+
+  {"type": "submit", "lines": [LINE, ...], "cwd": DIR, "env": {...}}
+      -> {"ok": true, "jobs": [{"id": N, "name": NAME}, ...]}
+  {"type": "list", "all": BOOL}
+      -> {"ok": true, "jobs": [JOB, ...], "users": {USER: USAGE}}
+  {"type": "cancel", "ids": [N, ...]}         (no ids: all the user's jobs)
+      -> {"ok": true, "cancelled": [N, ...]}
+  any error
+      -> {"ok": false, "error": MESSAGE}
+
+Unfinished jobs are saved in STATE_DIR/queue.json, so a restarted daemon
+picks them up again.  Jobs still running when the daemon stops are
+stopped and requeued.
+"""
+import asyncio
+import json
+import os
+import pwd
+import signal
+import socket
+import struct
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from util.runner.dashboard import JobProgress
+from util.runner.executor import JobExecutor, ADMISSION_POLL_SECS
+from util.runner.failures import FailureKind, DEFAULT_RETRYABLE
+from util.runner.jobs import Job, parse_job_line, parse_size
+from util.runner.logs import log_basename
+from util.runner.resources import ResourceBudget, estimate_footprint
+
+# Where the daemon listens unless told otherwise
+DEFAULT_SOCKET = os.environ.get("GEM5_RUNNER_SOCKET", "/tmp/gem5_runner.sock")
+# Finished jobs remembered for listing and dependencies
+FINISHED_KEPT = 1000
+# Longest request (a submission of a big command file)
+_LINE_LIMIT = 64 << 20
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+SKIPPED = "skipped"
+
+def _user_name(uid: int) -> str:
+    try:
+        return pwd.getpwuid(uid).pw_name
+    except KeyError:
+        return str(uid)
+
+
+def _peer_uid(writer: asyncio.StreamWriter) -> int:
+    sock = writer.get_extra_info("socket")
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    _, uid, _ = struct.unpack("3i", creds)
+    return uid
+
+
+class Quota:
+    def __init__(self, mem: Optional[int] = None, cores: Optional[int] = None, weight: float = 1.0) -> None:
+        """
+        :param mem: Most memory a user's running jobs may hold (None: no cap).
+        :param cores: Most cores a user's running jobs may hold (None: no cap).
+        :param weight: Relative share of the budget, in fair-share order.
+        """
+        if weight <= 0:
+            raise ValueError(f"weight must be positive, not {weight}")
+        self.mem = mem
+        self.cores = cores
+        self.weight = weight
+
+
+def read_quotas(path: str) -> Dict[str, Quota]:
+    """Read per-user quotas from a JSON file ("*" for the default).
+    """
+    with open(path, "r") as f:
+        spec = json.load(f)
+    quotas = {}
+    for user, fields in spec.items():
+        unknown = set(fields) - {"mem", "cores", "weight"}
+        if unknown:
+            raise ValueError(f"unknown quota field(s) for {user}: {', '.join(sorted(unknown))}")
+        quotas[user] = Quota(
+            mem = parse_size(str(fields["mem"])) if "mem" in fields else None,
+            cores = fields.get("cores"),
+            weight = fields.get("weight", 1.0)
+        )
+    return quotas
+
+
+class SubmittedJob:
+    def __init__(self, id: int, user: str, uid: int, job: Job, submitted: Optional[float] = None) -> None:
+        self.id = id
+        self.user = user
+        self.uid = uid
+        self.job = job
+        self.state = QUEUED
+        self.submitted = submitted or time.time()
+        self.started: Optional[float] = None
+        self.ended: Optional[float] = None
+        self.exit_code: Optional[int] = None
+        self.failure: Optional[FailureKind] = None
+        self.attempts = 0
+        # no (re)start before this time (retry backoff)
+        self.not_before = 0.0
+        self.footprint = estimate_footprint(job)
+
+    @property
+    def finished(self) -> bool:
+        return self.state not in [QUEUED, RUNNING]
+
+    def to_record(self) -> Dict[str, Any]:
+        return {"id": self.id, "user": self.user, "uid": self.uid,
+                "line": self.job.to_line(), "cwd": self.job.cwd, "env": self.job.env,
+                "submitted": self.submitted, "attempts": self.attempts}
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "SubmittedJob":
+        job = parse_job_line(record["line"])
+        job.cwd = record["cwd"]
+        job.env = record["env"]
+        submitted = cls(record["id"], record["user"], record["uid"], job, record["submitted"])
+        submitted.attempts = record["attempts"]
+        return submitted
+
+
+class JobDaemon:
+    def __init__(
+        self,
+        socket_path: str,
+        state_dir: str,
+        budget: ResourceBudget,
+        max_mem: int,
+        max_cores: int,
+        quotas: Optional[Dict[str, Quota]] = None,
+        socket_mode: int = 0o660,
+        default_timeout: Optional[float] = None,
+        default_retries: int = 0,
+        retry_backoff: float = 60.0,
+        retryable: List[FailureKind] = DEFAULT_RETRYABLE,
+        **log_args
+    ) -> None:
+        """
+        :param socket_path: Unix socket to take requests on.
+        :param state_dir: Where the queue and the jobs' logs are kept.
+        :param budget: Memory/core budget all users' jobs share.
+        :param max_mem: The budget's memory, to compute users' shares.
+        :param max_cores: The budget's cores, to compute users' shares.
+        :param quotas: Per-user quotas and weights ("*" for the default).
+        :param socket_mode: Permissions of the socket (who may submit).
+        :param default_timeout: Wall-clock limit in seconds for jobs that
+        don't declare one (None: no limit).
+        :param default_retries: Reruns allowed for jobs that don't declare
+        how many.
+        :param retry_backoff: Seconds before the first rerun of a job,
+        doubling for each one after that.
+        :param retryable: Kinds of failure that are worth a rerun.
+        :param log_args: Passed on to RotatingLog.
+        """
+        self._socket_path = socket_path
+        self._state_dir = state_dir
+        self._budget = budget
+        self._max_mem = max_mem
+        self._max_cores = max_cores
+        self._quotas = quotas or {}
+        self._socket_mode = socket_mode
+        self._default_timeout = default_timeout
+        self._default_retries = default_retries
+        self._retry_backoff = retry_backoff
+        self._retryable = retryable
+        self._log_args = log_args
+
+        self._jobs: Dict[int, SubmittedJob] = {}
+        self._next_id = 1
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._executors: Dict[int, JobExecutor] = {}
+        self._stopping = False
+
+    def run(self) -> None:
+        asyncio.run(self.run_async())
+
+    async def run_async(self) -> None:
+        os.makedirs(self._state_dir, exist_ok = True)
+        self._load()
+        self._wake = asyncio.Event()
+
+        loop = asyncio.get_running_loop()
+        for sig in [signal.SIGINT, signal.SIGTERM]:
+            loop.add_signal_handler(sig, self._stop)
+        if os.path.exists(self._socket_path):
+            os.unlink(self._socket_path)
+        server = await asyncio.start_unix_server(self._serve, self._socket_path, limit = _LINE_LIMIT)
+        os.chmod(self._socket_path, self._socket_mode)
+        print(f"Listening on {self._socket_path} with {self._count(QUEUED)} queued job(s).")
+        try:
+            while not self._stopping:
+                self._schedule()
+                self._wake.clear()
+                try:
+                    # (queued jobs may fit once the machine frees up)
+                    await asyncio.wait_for(self._wake.wait(),
+                                           ADMISSION_POLL_SECS if self._count(QUEUED) else None)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for sig in [signal.SIGINT, signal.SIGTERM]:
+                loop.remove_signal_handler(sig)
+            server.close()
+            await server.wait_closed()
+            if os.path.exists(self._socket_path):
+                os.unlink(self._socket_path)
+            if self._tasks:
+                print(f"Stopping {len(self._tasks)} running job(s), to be requeued...")
+                tasks = list(self._tasks.values())
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions = True)
+            self._save()
+
+    def _stop(self) -> None:
+        self._stopping = True
+        self._wake.set()
+
+    def _count(self, state: str) -> int:
+        return sum(1 for sj in self._jobs.values() if sj.state == state)
+
+    """
+    scheduling
+    """
+    def _quota(self, user: str) -> Quota:
+        return self._quotas.get(user) or self._quotas.get("*") or Quota()
+
+    def _usage(self, user: str) -> Tuple[int, int]:
+        mem = cores = 0
+        for sj in self._jobs.values():
+            if sj.user == user and sj.state == RUNNING:
+                mem += sj.footprint[0]
+                cores += sj.footprint[1]
+        return mem, cores
+
+    def _share(self, user: str) -> float:
+        mem, cores = self._usage(user)
+        return max(mem / self._max_mem, cores / self._max_cores) / self._quota(user).weight
+
+    def _find(self, user: str, name: str) -> Optional[SubmittedJob]:
+        """The user's latest job named NAME, if any.
+        """
+        found = [sj for sj in self._jobs.values() if sj.user == user and sj.job.name == name]
+        return max(found, key = lambda sj: sj.id) if found else None
+
+    def _deps_state(self, sj: SubmittedJob) -> str:
+        state = COMPLETED
+        for name in sj.job.deps:
+            dep = self._find(sj.user, name)
+            if dep is None or dep.state in [FAILED, CANCELLED, SKIPPED]:
+                return FAILED
+            if dep.state != COMPLETED:
+                state = QUEUED
+        return state
+
+    def _schedule(self) -> None:
+        """Start queued jobs in fair-share order until nothing else fits.
+        """
+        now = time.time()
+        self._budget.refresh()
+        for sj in list(self._jobs.values()):
+            if sj.state == QUEUED and self._deps_state(sj) == FAILED:
+                print(f"Skipping job {sj.id} ({sj.user}/{sj.job.name}): a dependency did not complete.")
+                sj.state = SKIPPED
+                sj.ended = now
+                self._save()
+
+        while True:
+            ready: Dict[str, List[SubmittedJob]] = {}
+            for sj in self._jobs.values():
+                if sj.state == QUEUED and sj.not_before <= now and self._deps_state(sj) == COMPLETED:
+                    ready.setdefault(sj.user, []).append(sj)
+            started = False
+            for user in sorted(ready, key = self._share):
+                sj = self._next_job(user, ready[user])
+                if sj:
+                    self._start(sj)
+                    started = True
+                    # (shares have changed)
+                    break
+            if not started:
+                return
+
+    def _next_job(self, user: str, ready: List[SubmittedJob]) -> Optional[SubmittedJob]:
+        """The user's first ready job (by priority, then submission) that
+        fits in their quota and the budget, which is reserved for it.
+        """
+        quota = self._quota(user)
+        used_mem, used_cores = self._usage(user)
+        for sj in sorted(ready, key = lambda sj: (-sj.job.priority, sj.id)):
+            mem, cores = sj.footprint
+            if used_mem or used_cores:
+                if quota.mem is not None and used_mem + mem > quota.mem:
+                    continue
+                if quota.cores is not None and used_cores + cores > quota.cores:
+                    continue
+            if self._budget.admit(sj.job):
+                return sj
+        return None
+
+    def _log_dir(self, user: str) -> str:
+        return os.path.join(self._state_dir, "logs", log_basename(user))
+
+    def _executor(self, sj: SubmittedJob) -> JobExecutor:
+        if sj.uid not in self._executors:
+            log_dir = self._log_dir(sj.user)
+            os.makedirs(log_dir, exist_ok = True)
+            run_as = None
+            if os.geteuid() == 0 and sj.uid != 0:
+                # the user's gem5 writes its event log in there
+                run_as = sj.uid
+                os.chown(log_dir, sj.uid, pwd.getpwuid(sj.uid).pw_gid)
+            self._executors[sj.uid] = JobExecutor(
+                log_dir = log_dir,
+                default_timeout = self._default_timeout,
+                run_as = run_as,
+                **self._log_args
+            )
+        return self._executors[sj.uid]
+
+    def _start(self, sj: SubmittedJob) -> None:
+        print(f"Starting job {sj.id} ({sj.user}/{sj.job.name}).")
+        sj.state = RUNNING
+        sj.started = time.time()
+        self._tasks[sj.id] = asyncio.create_task(self._run(sj))
+
+    async def _run(self, sj: SubmittedJob) -> None:
+        try:
+            res, failure = await self._executor(sj).run_job(sj.job)
+        except asyncio.CancelledError:
+            # cancelled by its user, or the daemon is stopping
+            if sj.state == RUNNING:
+                sj.state = QUEUED
+            return
+        except Exception as e:
+            print(f"Job {sj.id} ({sj.user}/{sj.job.name}) could not run: {e}")
+            res, failure = 1, FailureKind.UNKNOWN
+        finally:
+            self._budget.release(sj.job)
+            del self._tasks[sj.id]
+            self._wake.set()
+        self._finish(sj, res, failure)
+
+    def _finish(self, sj: SubmittedJob, res: int, failure: Optional[FailureKind]) -> None:
+        if sj.state == CANCELLED:
+            # (ended on its own just as it was cancelled)
+            return
+        sj.ended = time.time()
+        sj.exit_code = res
+        sj.failure = failure
+        if res == 0:
+            sj.state = COMPLETED
+        else:
+            sj.attempts += 1
+            retries = sj.job.retries if sj.job.retries is not None else self._default_retries
+            if failure in self._retryable and sj.attempts <= retries:
+                delay = self._retry_backoff * 2 ** (sj.attempts - 1)
+                print(f"Retrying job {sj.id} ({sj.user}/{sj.job.name}) in {delay:.0f} s "
+                      f"(rerun {sj.attempts} of {retries}, {failure.value} failure).")
+                sj.state = QUEUED
+                sj.not_before = time.time() + delay
+            else:
+                sj.state = FAILED
+        self._prune()
+        self._save()
+
+    def _prune(self) -> None:
+        finished = sorted((sj for sj in self._jobs.values() if sj.finished), key = lambda sj: sj.id)
+        for sj in finished[:-FINISHED_KEPT]:
+            del self._jobs[sj.id]
+
+    """
+    persistence
+    """
+    def _queue_file(self) -> str:
+        return os.path.join(self._state_dir, "queue.json")
+
+    def _save(self) -> None:
+        records = [sj.to_record() for sj in self._jobs.values() if not sj.finished]
+        tmp = f"{self._queue_file()}.tmp"
+        # (private: it holds the users' environments)
+        with os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+            json.dump({"next_id": self._next_id, "jobs": records}, f)
+        os.replace(tmp, self._queue_file())
+
+    def _load(self) -> None:
+        if not os.path.exists(self._queue_file()):
+            return
+        with open(self._queue_file(), "r") as f:
+            saved = json.load(f)
+        self._next_id = saved["next_id"]
+        for record in saved["jobs"]:
+            try:
+                sj = SubmittedJob.from_record(record)
+            except (KeyError, ValueError) as e:
+                print(f"Dropping saved job {record.get('id')}: {e}")
+                continue
+            self._jobs[sj.id] = sj
+
+    """
+    requests
+    """
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            uid = _peer_uid(writer)
+            msg = json.loads(await reader.readline())
+            handlers = {"submit": self._submit, "list": self._list, "cancel": self._cancel}
+            if msg.get("type") not in handlers:
+                raise ValueError(f"unknown request type {msg.get('type')}")
+            reply = {"ok": True, **handlers[msg["type"]](uid, msg)}
+        except (ValueError, KeyError, TypeError) as e:
+            reply = {"ok": False, "error": str(e)}
+        try:
+            writer.write(json.dumps(reply).encode() + b"\n")
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _submit(self, uid: int, msg: Dict[str, Any]) -> Dict[str, Any]:
+        user = _user_name(uid)
+        jobs = []
+        for num, text in enumerate(msg["lines"], start = 1):
+            job = parse_job_line(text, line = num)
+            if job:
+                job.cwd = msg["cwd"]
+                job.env = msg["env"]
+                jobs.append(job)
+        if not jobs:
+            raise ValueError("no commands to submit")
+
+        # check the whole submission before queueing any of it
+        names = set()
+        for job in jobs:
+            if job.anonymous:
+                continue
+            if job.name in names:
+                raise ValueError(f"job {job.name} is submitted twice")
+            other = self._find(user, job.name)
+            if other and not other.finished:
+                raise ValueError(f"job {job.name} is already {other.state} (id {other.id})")
+            names.add(job.name)
+        for job in jobs:
+            for dep in job.deps:
+                if dep not in names and self._find(user, dep) is None:
+                    raise ValueError(f"job {job.name} depends on unknown job {dep}")
+
+        submitted = []
+        for job in jobs:
+            sj = SubmittedJob(self._next_id, user, uid, job)
+            self._next_id += 1
+            if job.anonymous:
+                job.name = f"job{sj.id}"
+                job.anonymous = False
+            self._jobs[sj.id] = sj
+            submitted.append({"id": sj.id, "name": job.name})
+        print(f"Queued {len(submitted)} job(s) from {user}.")
+        self._save()
+        self._wake.set()
+        return {"jobs": submitted}
+
+    def _list(self, uid: int, msg: Dict[str, Any]) -> Dict[str, Any]:
+        user = _user_name(uid)
+        now = time.time()
+        jobs = []
+        for sj in sorted(self._jobs.values(), key = lambda sj: sj.id):
+            if sj.user != user and not msg.get("all"):
+                continue
+            info = {
+                "id": sj.id, "user": sj.user, "name": sj.job.name, "state": sj.state,
+                "priority": sj.job.priority, "cmd": sj.job.cmd,
+                "mem": sj.footprint[0], "cores": sj.footprint[1],
+                "submitted": sj.submitted, "started": sj.started, "ended": sj.ended,
+                "exit_code": sj.exit_code, "failure": sj.failure.value if sj.failure else None
+            }
+            if sj.state == RUNNING:
+                progress = JobProgress(sj.job.name, os.path.join(
+                    self._log_dir(sj.user), f"{log_basename(sj.job.name)}.events.jsonl"))
+                progress.update()
+                info["phase"] = progress.phase
+                info["rois_done"] = progress.rois_done
+                info["eta"] = progress.eta(now)
+            jobs.append(info)
+
+        users = {}
+        for name in sorted(set(sj.user for sj in self._jobs.values() if not sj.finished)):
+            mem, cores = self._usage(name)
+            users[name] = {
+                "running": sum(1 for sj in self._jobs.values() if sj.user == name and sj.state == RUNNING),
+                "queued": sum(1 for sj in self._jobs.values() if sj.user == name and sj.state == QUEUED),
+                "mem": mem, "cores": cores, "share": self._share(name)
+            }
+        return {"jobs": jobs, "users": users}
+
+    def _cancel(self, uid: int, msg: Dict[str, Any]) -> Dict[str, Any]:
+        user = _user_name(uid)
+        admin = uid in [0, os.getuid()]
+        ids = msg.get("ids")
+        if ids:
+            targets = []
+            for id in ids:
+                if id not in self._jobs:
+                    raise ValueError(f"no job {id}")
+                if self._jobs[id].user != user and not admin:
+                    raise ValueError(f"job {id} belongs to {self._jobs[id].user}")
+                targets.append(self._jobs[id])
+        else:
+            targets = [sj for sj in self._jobs.values() if sj.user == user]
+
+        cancelled = []
+        for sj in targets:
+            if sj.finished:
+                continue
+            print(f"Cancelling job {sj.id} ({sj.user}/{sj.job.name}) for {user}.")
+            was_running = sj.state == RUNNING
+            sj.state = CANCELLED
+            sj.ended = time.time()
+            if was_running:
+                self._tasks[sj.id].cancel()
+            cancelled.append(sj.id)
+        self._save()
+        self._wake.set()
+        return {"cancelled": cancelled}
+
+
+def send_request(socket_path: str, **msg) -> Dict[str, Any]:
+    """Send one request to the daemon at SOCKET_PATH and return its reply.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(msg).encode() + b"\n")
+        with sock.makefile("rb") as reply:
+            line = reply.readline()
+    if not line:
+        raise ConnectionError("the daemon hung up")
+    return json.loads(line)
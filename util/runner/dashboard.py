@@ -0,0 +1,141 @@
+"""
+Live progress of running gem5 jobs, from their event logs
+
+Every job the runner launches gets $GEM5_EVENT_LOG pointing at its own
+LOG_DIR/NAME.events.jsonl, which the event managers append progress
+events to (see util/event_managers/event_manager.py).  The dashboard
+tails those files and periodically prints one line per running job:
+its current phase, ROIs done, simulated KIPS and estimated time left.
+
+KIPS is over the last completed phase, so a job that just switched from
+KVM to O3 still shows the KVM rate until the first O3 interval ends.
+ETAs come from the manager's plan (total instructions, or else ROIs) and
+the average rate since the job's first phase change.
+"""
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+def _format_secs(secs: float) -> str:
+    secs = int(secs)
+    return f"{secs // 3600}:{secs // 60 % 60:02d}:{secs % 60:02d}"
+
+
+class JobProgress:
+    def __init__(self, name: str, path: str) -> None:
+        self.name = name
+        self._path = path
+        self._offset = 0
+        self._plan: Dict[str, Any] = {}
+        # first and last two events that counted instructions
+        self._first: Optional[Dict[str, Any]] = None
+        self._recent: List[Dict[str, Any]] = []
+        self.phase = "starting"
+        self.roi: Optional[int] = None
+        self.rois_done = 0
+
+    def update(self) -> None:
+        """Read the events written since the last update.
+        """
+        try:
+            with open(self._path, "rb") as f:
+                f.seek(self._offset)
+                data = f.read()
+        except OSError:
+            return
+        # (leave a partly written last line for next time)
+        end = data.rfind(b"\n") + 1
+        self._offset += end
+        for line in data[:end].splitlines():
+            try:
+                self._add(json.loads(line))
+            except ValueError:
+                continue
+
+    def _add(self, event: Dict[str, Any]) -> None:
+        if event["event"] == "plan":
+            self._plan = event
+            return
+        self.phase = event.get("phase", self.phase)
+        self.roi = event.get("roi")
+        if event["event"] == "roi_end":
+            self.rois_done += 1
+        if event.get("insts") is None:
+            return
+        if self._first is None and event["event"] == "phase":
+            self._first = event
+        if self._recent and event["insts"] == self._recent[-1]["insts"]:
+            # (e.g. ROI end and the next phase: no work in between)
+            self._recent[-1] = event
+        else:
+            self._recent = (self._recent + [event])[-2:]
+
+    def kips(self) -> Optional[float]:
+        if len(self._recent) < 2:
+            return None
+        prev, last = self._recent
+        secs = last["host_time"] - prev["host_time"]
+        if secs <= 0:
+            return None
+        return (last["insts"] - prev["insts"]) / secs / 1000
+
+    def eta(self, now: float) -> Optional[float]:
+        if self._first is None or not self._recent:
+            return None
+        last = self._recent[-1]
+        elapsed = last["host_time"] - self._first["host_time"]
+        if elapsed <= 0:
+            return None
+        eta = None
+        done_insts = last["insts"] - self._first["insts"]
+        if self._plan.get("planned_insts") and done_insts > 0:
+            eta = (self._plan["planned_insts"] - done_insts) * elapsed / done_insts
+        elif self._plan.get("planned_rois") and self.rois_done:
+            eta = (self._plan["planned_rois"] - self.rois_done) * elapsed / self.rois_done
+        if eta is None:
+            return None
+        return max(0.0, eta - (now - last["host_time"]))
+
+    def row(self, now: float) -> str:
+        rois = str(self.rois_done)
+        if self._plan.get("planned_rois"):
+            rois += f"/{self._plan['planned_rois']}"
+        kips = self.kips()
+        eta = self.eta(now)
+        return (f"  {self.name:<24} {self.phase:<10} {rois:>7} "
+                f"{f'{kips:.1f}' if kips is not None else '-':>10} "
+                f"{_format_secs(eta) if eta is not None else '-':>10}")
+
+
+class Dashboard:
+    def __init__(self, interval: float = 60.0) -> None:
+        """
+        :param interval: Seconds between progress reports.
+        """
+        self._interval = interval
+        self._jobs: Dict[str, JobProgress] = {}
+
+    def watch(self, name: str, path: str) -> None:
+        self._jobs[name] = JobProgress(name, path)
+
+    def unwatch(self, name: str) -> None:
+        self._jobs.pop(name, None)
+
+    def report(self) -> None:
+        """Print the progress of every job that has reported any.
+        """
+        for job in self._jobs.values():
+            job.update()
+        jobs = [job for job in self._jobs.values() if job.phase != "starting"]
+        if not jobs:
+            return
+        now = time.time()
+        print(f"=== Progress at {time.strftime('%H:%M:%S')}: {len(self._jobs)} running\n"
+              f"  {'job':<24} {'phase':<10} {'ROIs':>7} {'KIPS':>10} {'ETA':>10}\n"
+              + "\n".join(job.row(now) for job in jobs))
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            self.report()
@@ -0,0 +1,718 @@
+"""
+asyncio executor for the local command runner
+
+Commands are launched straight from one event loop (no worker process
+per slot), their output is copied to log files by coroutines, and the
+command file is read lazily, only LOOKAHEAD jobs ahead of the ones that
+have started, so a file with hundreds of thousands of lines starts
+running immediately.  Commands without shell syntax are exec'd directly
+rather than through /bin/sh.
+
+Every command runs in its own process group, so timeouts and Ctrl-C
+stop gem5 and anything it spawned, not just the shell in front of it.
+
+Failed commands are classified (see failures.py) and those that failed
+for a retryable reason are rerun after an exponentially growing delay.
+
+With a coordinator (see cluster.py), commands are handed to worker
+processes instead, which run them with run_job() on their own hosts.
+
+Each command is pointed at its own event log with $GEM5_EVENT_LOG, and
+with a dashboard (see dashboard.py) the progress gem5 reports there is
+printed periodically.
+
+With a result cache (see result_cache.py), gem5 commands whose exact
+simulation has been run before get their stored outdir instead of
+being launched, and successful ones are added to the cache.
+
+Jobs waiting for resources preempt running gem5 jobs of lower priority
+whose event manager supports it: the runner sends them SIGTERM, they
+checkpoint into OUTDIR/preempt/ and exit with PREEMPTED_EXIT_CODE, and
+are queued again to resume from that checkpoint with --start_from.  The
+stats dumped before each preemption are put back in front of the final
+stats.txt.  (Local jobs only: jobs run by workers are never preempted.)
+
+Jobs that fall far behind their predicted runtime (from the runtime
+history, projected from the live progress in their event logs where
+there is any) are stragglers: if a slot is idle, a backup copy of the
+job starts, with its own outdir (and, with a coordinator, on a different
+worker).  Whichever copy completes first wins: the other is stopped, and
+the winner's output ends up in the job's outdir.
+
+With a stager (see staging.py), gem5 commands write to a scratch outdir
+instead, copied to the real one once they end.  A job's cores are given
+back as soon as its command exits, so the next one can start while the
+results are being copied.
+"""
+import asyncio
+import json
+import os
+import pwd
+import re
+import shlex
+import shutil
+import signal
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from util.runner.cluster import Coordinator
+from util.runner.dashboard import Dashboard, JobProgress
+from util.runner.failures import (
+    FailureKind, classify_failure, DEFAULT_RETRYABLE, MANAGER_STATE_FILE, PREEMPTED_STATS_FILE
+)
+from util.runner.history import RuntimeHistory
+from util.runner.jobs import Job, JobGraph, add_simarg, split_gem5_command, with_gem5_outdir
+from util.runner.ledger import JobLedger
+from util.runner.logs import RotatingLog, LineTail, capture, log_basename
+from util.runner.result_cache import ResultCache
+from util.runner.resources import ResourceBudget, estimate_footprint, GiB
+from util.runner.staging import OutdirStager
+
+# How often to re-check the machine when jobs are waiting for resources
+ADMISSION_POLL_SECS = 10
+# How long a stopped command gets to exit before it's killed
+KILL_GRACE_SECS = 10
+# Exit code reported for a command killed by its timeout (as coreutils timeout)
+TIMEOUT_EXIT_CODE = 124
+# How often running jobs are checked for stragglers
+STRAGGLER_CHECK_SECS = 30
+# Jobs aren't judged before they've run this long (progress is noisy early on)
+STRAGGLER_MIN_SECS = 300
+
+# Anything matching this needs a real shell
+_SHELL_SYNTAX = re.compile(r"[|&;<>()`\\*?\[\]{}~!#\n]")
+# ... as do shell builtins that aren't also programs
+_SHELL_BUILTINS = ["cd", "exit", "export", "source", ".", "set", "unset", "exec", "eval", "ulimit"]
+
+def direct_argv(cmd: str, env: Optional[Dict[str, str]] = None) -> Optional[List[str]]:
+    """The argv to exec CMD (in ENV, default os.environ) without a shell,
+    or None if it needs one.
+    """
+    env = os.environ if env is None else env
+    if _SHELL_SYNTAX.search(cmd):
+        return None
+    if "$" in cmd:
+        # only plain $VAR expansion of variables that are set
+        if "'" in cmd:
+            return None
+        for var in re.findall(r"\$(\w*)", cmd):
+            if var not in env:
+                return None
+    try:
+        argv = shlex.split(cmd)
+    except ValueError:
+        return None
+    if not argv or "=" in argv[0] or argv[0] in _SHELL_BUILTINS:
+        return None
+    return [re.sub(r"\$(\w+)|\$\{(\w+)\}", lambda m: env[m.group(1) or m.group(2)], arg)
+            for arg in argv]
+
+
+def _succeeded(task: asyncio.Task) -> bool:
+    """Whether a finished run_job()-like TASK completed successfully.
+    """
+    return (task.done() and not task.cancelled() and task.exception() is None
+            and task.result()[0] == 0)
+
+
+class JobExecutor:
+    def __init__(
+        self,
+        max_parallel: int = 8,
+        budget: Optional[ResourceBudget] = None,
+        ledger: Optional[JobLedger] = None,
+        history: Optional[RuntimeHistory] = None,
+        log_dir: str = "logs",
+        lookahead: int = 1000,
+        default_timeout: Optional[float] = None,
+        default_retries: int = 0,
+        retry_backoff: float = 60.0,
+        retryable: List[FailureKind] = DEFAULT_RETRYABLE,
+        cache: Optional[ResultCache] = None,
+        coordinator: Optional[Coordinator] = None,
+        dashboard: Optional[Dashboard] = None,
+        run_as: Optional[int] = None,
+        straggler_factor: float = 0.0,
+        stager: Optional[OutdirStager] = None,
+        **log_args
+    ) -> None:
+        """
+        :param max_parallel: Most commands to run at once.
+        :param budget: Memory/core budget jobs must fit in to start.
+        :param ledger: Records progress; jobs it has as completed are skipped.
+        :param history: Predicts runtimes, to start the longest work first.
+        :param log_dir: Where each command's stdout/stderr logs go.
+        :param lookahead: Most jobs to read ahead of the ones started.
+        :param default_timeout: Wall-clock limit in seconds for jobs that
+        don't declare one (None: no limit).
+        :param default_retries: Reruns allowed for jobs that don't declare
+        how many.
+        :param retry_backoff: Seconds before the first rerun of a job,
+        doubling for each one after that.
+        :param retryable: Kinds of failure that are worth a rerun.
+        :param cache: Stored results to reuse instead of rerunning gem5.
+        :param coordinator: Runs the commands on workers rather than here.
+        :param dashboard: Reports the progress of running gem5 commands.
+        :param run_as: UID to run the commands as (needs root).
+        :param straggler_factor: Start a backup copy of jobs projected to
+        take this many times their predicted runtime (0: never).
+        :param stager: Runs gem5 commands in scratch outdirs.
+        :param log_args: Passed on to RotatingLog.
+        """
+        self._max_parallel = max_parallel
+        self._budget = budget
+        self._ledger = ledger
+        self._history = history
+        self._log_dir = log_dir
+        self._lookahead = lookahead
+        self._default_timeout = default_timeout
+        self._default_retries = default_retries
+        self._retry_backoff = retry_backoff
+        self._retryable = retryable
+        self._cache = cache
+        self._coordinator = coordinator
+        self._dashboard = dashboard
+        self._run_as = run_as
+        self._straggler_factor = straggler_factor
+        self._stager = stager
+        self._log_args = log_args
+
+        # exit code of every job that ran
+        self.results: Dict[str, int] = {}
+        self._all_ok = True
+        self._start_times: Dict[str, float] = {}
+        # jobs whose results came from the cache
+        self._cached = set()
+        # running local commands and their event logs (for preemption)
+        self._procs: Dict[str, asyncio.subprocess.Process] = {}
+        self._event_logs: Dict[str, str] = {}
+        self._preempting: Optional[str] = None
+        # preempted jobs: checkpoint to resume from, and cache key
+        self._resume_from: Dict[str, str] = {}
+        self._cache_keys: Dict[str, Optional[str]] = {}
+        # live progress of the running local commands
+        self._progress: Dict[str, JobProgress] = {}
+        # jobs waiting to start, and backup copies running
+        self._pending: List[Job] = []
+        self._num_backups = 0
+        # jobs running in a scratch outdir, and those whose results are
+        # being copied out of it (their resources already released)
+        self._staged: Dict[str, Job] = {}
+        self._flushing = set()
+
+    def run(self, jobs: Iterable[Job]) -> bool:
+        """Run JOBS; returns whether all of them completed successfully.
+        """
+        return asyncio.run(self.run_async(jobs))
+
+    async def run_async(self, jobs: Iterable[Job]) -> bool:
+        os.makedirs(self._log_dir, exist_ok = True)
+        self._all_ok = True
+        self._running: Dict[asyncio.Task, Job] = {}
+        self._attempts: Dict[str, int] = {}
+        # jobs waiting out their backoff before a rerun
+        self._backoffs: Dict[asyncio.Task, Job] = {}
+
+        # Ctrl-C or SIGTERM: stop all the commands cleanly
+        loop = asyncio.get_running_loop()
+        main = asyncio.current_task()
+        for sig in [signal.SIGINT, signal.SIGTERM]:
+            loop.add_signal_handler(sig, main.cancel)
+        reporter = asyncio.create_task(self._dashboard.run()) if self._dashboard else None
+        try:
+            if self._coordinator:
+                await self._coordinator.start()
+            await self._schedule(iter(jobs))
+        except asyncio.CancelledError:
+            print(f"Interrupted: stopping {len(self._running)} running command(s)...")
+            for task in [*self._running, *self._backoffs]:
+                task.cancel()
+            await asyncio.gather(*self._running, *self._backoffs, return_exceptions = True)
+            self._all_ok = False
+        finally:
+            for sig in [signal.SIGINT, signal.SIGTERM]:
+                loop.remove_signal_handler(sig)
+            if self._coordinator:
+                await self._coordinator.close()
+            if reporter:
+                reporter.cancel()
+        if self._cache:
+            print(f"Result cache: {self._cache.summary()}.")
+        return self._all_ok
+
+    async def _schedule(self, jobs: Iterator[Job]) -> None:
+        self._graph = JobGraph(self._history.predict if self._history else None)
+        pending: List[Job] = []
+        self._pending = pending
+        # jobs read but not yet started or skipped
+        self._backlog = 0
+        exhausted = False
+
+        while True:
+            # Read ahead in the command file
+            while not exhausted and self._backlog < self._lookahead:
+                try:
+                    job = next(jobs)
+                    skipped = self._graph.add(job)
+                except StopIteration:
+                    exhausted = True
+                    break
+                except ValueError as e:
+                    print(f"Bad command file: {e}. Not reading any further.")
+                    self._all_ok = False
+                    exhausted = True
+                    break
+                self._backlog += 1
+                for job in skipped:
+                    self._skip(job, "a dependency did not complete")
+
+            # (jobs completed in an earlier run may make more jobs ready)
+            ready = self._graph.pop_ready()
+            while ready:
+                for job in ready:
+                    if self._ledger and self._ledger.completed(job):
+                        print(f"Skipping {job.name}: already completed.")
+                        self._backlog -= 1
+                        self._graph.complete(job, True)
+                    else:
+                        pending.append(job)
+                ready = self._graph.pop_ready()
+
+            if exhausted and self._graph.finished():
+                break
+
+            # Start whatever fits, highest priority and then longest
+            # expected work first (file order among equals). First fit:
+            # smaller jobs may start ahead of a big one that's waiting
+            pending.sort(key = lambda job: (-job.priority, -self._graph.critical_path(job)))
+            if self._budget:
+                self._budget.refresh()
+            for job in list(pending):
+                if len(self._running) - len(self._flushing) + self._num_backups >= self._max_parallel:
+                    break
+                if self._budget and not self._budget.admit(job):
+                    continue
+                pending.remove(job)
+                self._backlog -= 1
+                self._running[asyncio.create_task(self.run_job(job))] = job
+            if pending and not self._preempting:
+                self._preempt_for(pending[0])
+
+            if not self._running and pending:
+                mem, cores = estimate_footprint(pending[0])
+                print(f"Waiting for {mem / GiB:.1f} GiB of free memory and "
+                      f"{cores} idle core(s) to start {pending[0].name}...")
+            if not self._running and not self._backoffs:
+                if pending:
+                    await asyncio.sleep(ADMISSION_POLL_SECS)
+                continue
+
+            done, _ = await asyncio.wait(
+                [*self._running, *self._backoffs],
+                timeout = ADMISSION_POLL_SECS if pending else None,
+                return_when = asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task in self._backoffs:
+                    # backoff over, queue the job again
+                    pending.append(self._backoffs.pop(task))
+                    self._backlog += 1
+                else:
+                    self._finish(self._running.pop(task), *task.result())
+
+    def _skip(self, job: Job, reason: str) -> None:
+        print(f"Skipping {job.name}: {reason}.")
+        self._backlog -= 1
+        self._all_ok = False
+        if self._ledger:
+            self._ledger.record_skip(job)
+
+    def _preempt_for(self, waiting: Job) -> None:
+        """
+        Preempt the lowest-priority running job below WAITING's priority
+        that can checkpoint, to free its resources.
+        """
+        candidates = [
+            job for job in self._running.values()
+            if job.priority < waiting.priority and job.name in self._procs
+            and self._preemptible(job)
+        ]
+        if not candidates:
+            return
+        victim = min(candidates, key = lambda job: (job.priority, -self._start_times[job.name]))
+        print(f"Preempting {victim.name} for {waiting.name} (priority {waiting.priority}).")
+        self._preempting = victim.name
+        try:
+            os.killpg(self._procs[victim.name].pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def _preemptible(self, job: Job) -> bool:
+        # gem5's event manager says so in the plan it logs first
+        try:
+            with open(self._event_logs[job.name], "r") as f:
+                plan = json.loads(f.readline())
+        except (KeyError, OSError, ValueError):
+            return False
+        return bool(plan.get("preemptible"))
+
+    def _resume_point(self, job: Job) -> Optional[str]:
+        """
+        The newest complete checkpoint of a preempted JOB (older ones are
+        removed), or None.
+        """
+        preempt_dir = os.path.join(job.outdir, "preempt")
+        if not os.path.isdir(preempt_dir):
+            return None
+        chkpts = sorted(
+            (os.path.join(preempt_dir, name) for name in os.listdir(preempt_dir)
+             if name.startswith("preempt.") and name[len("preempt."):].isdigit()),
+            key = lambda path: int(path.rsplit(".", 1)[1])
+        )
+        complete = [path for path in chkpts
+                    if os.path.exists(os.path.join(path, MANAGER_STATE_FILE))]
+        if not complete:
+            return None
+        for path in chkpts:
+            if path != complete[-1]:
+                shutil.rmtree(path, ignore_errors = True)
+        return os.path.abspath(complete[-1])
+
+    def _release(self, job: Job) -> None:
+        if self._budget and job.name not in self._flushing:
+            self._budget.release(job)
+
+    def _finish(self, job: Job, res: int, failure: Optional[FailureKind]) -> None:
+        self._release(job)
+        self._flushing.discard(job.name)
+        if self._ledger:
+            self._ledger.record_end(job, res, failure.value if failure else None)
+        if self._preempting == job.name:
+            self._preempting = None
+
+        if failure == FailureKind.PREEMPTED:
+            resume = self._resume_point(self._staged.get(job.name, job))
+            if resume:
+                # (not a rerun: nothing went wrong)
+                print(f"Preempted {job.name}: will resume from {resume}.")
+                self._resume_from[job.name] = resume
+                self._backoffs[asyncio.create_task(asyncio.sleep(0))] = job
+                return
+
+        if res != 0:
+            self._attempts[job.name] = self._attempts.get(job.name, 0) + 1
+            retries = job.retries if job.retries is not None else self._default_retries
+            if failure in self._retryable and self._attempts[job.name] <= retries:
+                delay = self._retry_backoff * 2 ** (self._attempts[job.name] - 1)
+                print(f"Retrying {job.name} in {delay:.0f} s "
+                      f"(rerun {self._attempts[job.name]} of {retries}, {failure.value} failure).")
+                self._backoffs[asyncio.create_task(asyncio.sleep(delay))] = job
+                return
+
+        self.results[job.name] = res
+        if res != 0:
+            self._all_ok = False
+        if self._history and res == 0 and job.name not in self._cached:
+            self._history.record(job, time.time() - self._start_times[job.name])
+        for skipped in self._graph.complete(job, res == 0):
+            self._skip(skipped, f"dependency {job.name} did not complete")
+
+    async def run_job(self, job: Job) -> Tuple[int, Optional[FailureKind]]:
+        """Run a single job, logging its output to LOG_DIR/NAME.{out,err}.
+        Returns its exit code and, if it failed, why.
+        """
+        log_prefix = os.path.join(self._log_dir, log_basename(job.name))
+        if self._ledger:
+            self._ledger.record_start(job)
+        self._start_times[job.name] = time.time()
+
+        key = self._cache_keys.get(job.name)
+        if self._cache and job.name not in self._resume_from:
+            # (hashing a checkpoint can take a while the first time)
+            key, hit = await asyncio.to_thread(self._cache.fetch, job)
+            if hit:
+                print(f"Cached result for \"{job.cmd}\" copied to {job.outdir}")
+                self._cached.add(job.name)
+                return 0, None
+            self._cache_keys[job.name] = key
+
+        # (workers stage the jobs they're given themselves)
+        run = job
+        if self._stager and not self._coordinator and self._stager.stageable(job):
+            if job.name not in self._staged:
+                self._staged[job.name] = self._stager.stage(job, fresh = job.name not in self._resume_from)
+            run = self._staged[job.name]
+        try:
+            if self._straggler_factor and self._history and self._history.known(job) \
+                    and split_gem5_command(job.cmd)[0] and job.name not in self._resume_from:
+                res, failure = await self._run_speculatively(job, log_prefix, run)
+            else:
+                res, failure = await self._attempt(run, log_prefix)
+        except asyncio.CancelledError:
+            if run is not job:
+                self._stager.discard(self._staged.pop(job.name))
+            raise
+        if res == 0 and job.name in self._resume_from:
+            self._merge_preempted(run)
+        if run is not job and failure != FailureKind.PREEMPTED:
+            # (kept for the resumed job otherwise)
+            del self._staged[job.name]
+            self._release(job)
+            self._flushing.add(job.name)
+            if not await self._stager.flush(run, job) and res == 0:
+                res, failure = 1, FailureKind.IO
+        if res == 0 and key:
+            await asyncio.to_thread(self._cache.store, job, key)
+        return res, failure
+
+    async def _attempt(
+        self, job: Job, log_prefix: str, avoid: Optional[str] = None
+    ) -> Tuple[int, Optional[FailureKind]]:
+        if self._coordinator:
+            return await self._coordinator.run(
+                job, job.timeout or self._default_timeout,
+                # (runtime history should not count time spent queued)
+                lambda: self._start_times.__setitem__(job.name, time.time()),
+                avoid = avoid
+            )
+        return await self._launch(job, log_prefix)
+
+    async def _run_speculatively(
+        self, job: Job, log_prefix: str, run: Optional[Job] = None
+    ) -> Tuple[int, Optional[FailureKind]]:
+        """
+        Run JOB (as RUN, if staged), starting a backup copy if it turns out
+        to be a straggler.  Returns the result of the first copy to complete
+        successfully, or else of the original.
+        """
+        run = run or job
+        primary = asyncio.create_task(self._attempt(run, log_prefix))
+        attempts = {primary: run}
+        backup = None
+        flagged = False
+        try:
+            while True:
+                running = [task for task in attempts if not task.done()]
+                if not running:
+                    break
+                await asyncio.wait(running, timeout = STRAGGLER_CHECK_SECS,
+                                   return_when = asyncio.FIRST_COMPLETED)
+                if any(_succeeded(task) for task in attempts):
+                    break
+                if backup is None and not primary.done() and self._straggling(job, not flagged):
+                    flagged = True
+                    backup_job = Job(with_gem5_outdir(run.cmd, run.outdir.rstrip("/") + ".backup"),
+                                     name = f"{job.name}.backup", mem = job.mem, cores = job.cores,
+                                     timeout = job.timeout, priority = job.priority,
+                                     cwd = job.cwd, env = job.env)
+                    if self._admit_backup(job, backup_job):
+                        backup = asyncio.create_task(self._run_backup(job, backup_job))
+                        attempts[backup] = backup_job
+        finally:
+            for task in attempts:
+                task.cancel()
+            await asyncio.gather(*attempts, return_exceptions = True)
+
+        winner = next((task for task in [primary, backup] if task and _succeeded(task)), primary)
+        if backup:
+            backup_job = attempts[backup]
+            if winner is backup:
+                print(f"Backup of {job.name} completed first; stopped the original.")
+                os.makedirs(run.outdir, exist_ok = True)
+                for name in os.listdir(backup_job.outdir):
+                    dest = os.path.join(run.outdir, name)
+                    if os.path.isdir(dest) and not os.path.islink(dest):
+                        shutil.rmtree(dest)
+                    os.replace(os.path.join(backup_job.outdir, name), dest)
+            elif _succeeded(primary):
+                print(f"Original {job.name} completed first; stopped its backup.")
+            shutil.rmtree(backup_job.outdir, ignore_errors = True)
+        return winner.result()
+
+    def _straggling(self, job: Job, report: bool = True) -> bool:
+        """Whether JOB is projected to take far longer than predicted.
+        """
+        if job.name not in self._start_times:
+            return False
+        elapsed = time.time() - self._start_times[job.name]
+        if elapsed < STRAGGLER_MIN_SECS:
+            return False
+        # (without progress reports, all we know is it hasn't finished yet)
+        eta = self._coordinator.eta(job.name) if self._coordinator else self.eta(job.name)
+        projected = elapsed + (eta or 0)
+        predicted = self._history.predict(job)
+        if projected <= self._straggler_factor * predicted:
+            return False
+        if report:
+            print(f"Straggler: {job.name} is projected to take {projected / 60:.0f} min, "
+                  f"vs {predicted / 60:.0f} min predicted.")
+        return True
+
+    def _admit_backup(self, job: Job, backup_job: Job) -> bool:
+        """Whether there's an idle slot for BACKUP_JOB (reserved if so).
+        Real work always comes first: nothing may be waiting to start.
+        """
+        if self._coordinator:
+            return self._coordinator.idle(avoid = self._coordinator.worker_of(job.name))
+        if self._pending or len(self._running) + self._num_backups >= self._max_parallel:
+            return False
+        if self._budget:
+            self._budget.refresh()
+            if not self._budget.admit(backup_job):
+                return False
+        self._num_backups += 1
+        return True
+
+    async def _run_backup(self, job: Job, backup_job: Job) -> Tuple[int, Optional[FailureKind]]:
+        print(f"Starting a backup copy of {job.name} in {backup_job.outdir}.")
+        shutil.rmtree(backup_job.outdir, ignore_errors = True)
+        try:
+            return await self._attempt(backup_job, os.path.join(self._log_dir, log_basename(backup_job.name)),
+                                       avoid = self._coordinator.worker_of(job.name) if self._coordinator else None)
+        finally:
+            if not self._coordinator:
+                self._num_backups -= 1
+                if self._budget:
+                    self._budget.release(backup_job)
+
+    def eta(self, name: str) -> Optional[float]:
+        """Estimated seconds left of the running local job NAME, from the
+        progress in its event log (None if unknown).
+        """
+        if name not in self._progress:
+            return None
+        self._progress[name].update()
+        return self._progress[name].eta(time.time())
+
+    async def _launch(self, job: Job, log_prefix: str) -> Tuple[int, Optional[FailureKind]]:
+        cmd = job.cmd
+        if job.name in self._resume_from:
+            cmd = add_simarg(cmd, "--start_from", self._resume_from[job.name])
+            print(f"Resuming command: \"{cmd}\"")
+        else:
+            print(f"Running command: \"{cmd}\"")
+
+        # gem5's event managers report progress here
+        events = os.path.abspath(f"{log_prefix}.events.jsonl")
+        if os.path.exists(events):
+            os.remove(events)
+        env = dict(job.env or os.environ, GEM5_EVENT_LOG = events)
+        # where preemptible gem5 jobs checkpoint when sent SIGTERM
+        if split_gem5_command(job.cmd)[0]:
+            preempt_dir = os.path.abspath(os.path.join(job.outdir, "preempt"))
+            env["GEM5_PREEMPT_DIR"] = preempt_dir
+            if job.name not in self._resume_from:
+                # (left by an earlier run of the runner)
+                shutil.rmtree(preempt_dir, ignore_errors = True)
+                if os.path.exists(os.path.join(job.outdir, PREEMPTED_STATS_FILE)):
+                    os.remove(os.path.join(job.outdir, PREEMPTED_STATS_FILE))
+        if self._dashboard:
+            self._dashboard.watch(job.name, events)
+        self._event_logs[job.name] = events
+        self._progress[job.name] = JobProgress(job.name, events)
+        try:
+            return await self._launch_process(job, cmd, log_prefix, env)
+        finally:
+            if self._dashboard:
+                self._dashboard.unwatch(job.name)
+            self._event_logs.pop(job.name, None)
+            self._progress.pop(job.name, None)
+            self._procs.pop(job.name, None)
+
+    async def _launch_process(
+        self, job: Job, cmd: str, log_prefix: str, env: Dict[str, str]
+    ) -> Tuple[int, Optional[FailureKind]]:
+        pipes = dict(
+            stdin = asyncio.subprocess.DEVNULL,
+            stdout = asyncio.subprocess.PIPE,
+            stderr = asyncio.subprocess.PIPE,
+            start_new_session = True,
+            cwd = job.cwd,
+            env = env
+        )
+        if self._run_as is not None:
+            user = pwd.getpwuid(self._run_as)
+            pipes.update(user = user.pw_uid, group = user.pw_gid,
+                         extra_groups = os.getgrouplist(user.pw_name, user.pw_gid))
+        argv = direct_argv(cmd, env)
+        try:
+            if argv:
+                proc = await asyncio.create_subprocess_exec(*argv, **pipes)
+            else:
+                proc = await asyncio.create_subprocess_shell(cmd, **pipes)
+        except OSError as e:
+            print(f"Command failed: \"{cmd}\" ({e}).")
+            return 127, FailureKind.CONFIG
+        self._procs[job.name] = proc
+
+        tails = {"out": LineTail(), "err": LineTail()}
+        logs = {suffix: RotatingLog(f"{log_prefix}.{suffix}", **self._log_args) for suffix in tails}
+        copiers = [
+            asyncio.create_task(capture(stream, logs[suffix], tails[suffix]))
+            for stream, suffix in [(proc.stdout, "out"), (proc.stderr, "err")]
+        ]
+
+        timeout = job.timeout or self._default_timeout
+        timed_out = False
+        try:
+            res = await asyncio.wait_for(proc.wait(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Command timed out after {timeout:.0f} s: \"{cmd}\"")
+            await self._stop(proc)
+            res = TIMEOUT_EXIT_CODE
+            timed_out = True
+        except asyncio.CancelledError:
+            await self._stop(proc)
+            await asyncio.gather(*copiers)
+            raise
+        await asyncio.gather(*copiers)
+
+        # Check for error
+        if res != 0:
+            failure = classify_failure(res, tails["err"].lines(), timed_out)
+            if failure == FailureKind.PREEMPTED:
+                print(f"Command preempted: \"{cmd}\"")
+                return res, failure
+            # errors usually end up on stderr, but not always
+            tail = tails["err"].lines() or tails["out"].lines()
+            print(f"Command failed: \"{cmd}\" (error code {res}, {failure.value})."
+                  f" Last output (full logs in {logs['out'].path} and {logs['err'].path}):\n"
+                  + "\n".join("    " + line for line in tail))
+            return res, failure
+        print(f"Command completed successfully: \"{cmd}\"")
+        return res, None
+
+    def _merge_preempted(self, job: Job) -> None:
+        """
+        Put the stats a resumed job dumped before it was preempted back in
+        front of its stats.txt, and remove its preemption checkpoints.
+        """
+        preempted = os.path.join(job.outdir, PREEMPTED_STATS_FILE)
+        stats = os.path.join(job.outdir, "stats.txt")
+        if os.path.exists(preempted):
+            with open(preempted, "r") as f:
+                merged = f.read()
+            if os.path.exists(stats):
+                with open(stats, "r") as f:
+                    merged += f.read()
+            with open(f"{stats}.tmp", "w") as f:
+                f.write(merged)
+            os.replace(f"{stats}.tmp", stats)
+            os.remove(preempted)
+        shutil.rmtree(os.path.join(job.outdir, "preempt"), ignore_errors = True)
+        del self._resume_from[job.name]
+
+    async def _stop(self, proc: asyncio.subprocess.Process) -> None:
+        """Interrupt a command's whole process group, killing it if need be.
+        (Not SIGTERM: preemptible gem5 jobs would checkpoint first.)
+        """
+        for sig in [signal.SIGINT, signal.SIGKILL]:
+            try:
+                os.killpg(proc.pid, sig)
+            except ProcessLookupError:
+                pass
+            try:
+                await asyncio.wait_for(proc.wait(), KILL_GRACE_SECS)
+                return
+            except asyncio.TimeoutError:
+                continue
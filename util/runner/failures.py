@@ -0,0 +1,80 @@
+"""
+Classification of failed commands, to decide which are worth retrying
+
+A failure is classified from the way the command ended (timeout, signal,
+exit code) and the last lines of its output.  Deterministic failures like
+a bad config script or simarg will fail the same way every time, while a
+KVM hiccup or an NFS blip reading a disk image under /scratch/cluster
+usually won't happen twice.
+"""
+import re
+import signal
+from enum import Enum
+from typing import List
+
+class FailureKind(Enum):
+    TIMEOUT = "timeout"           # killed by the runner's wall-clock limit
+    OOM = "oom"                   # SIGKILLed (OOM killer) or out of memory
+    KVM = "kvm"                   # KVM errors or stalls
+    IO = "io"                     # transient filesystem/network errors
+    CONFIG = "config"             # Python/simarg/gem5 config errors
+    PREEMPTED = "preempted"       # checkpointed on request, to be resumed
+    UNKNOWN = "unknown"
+
+# Exit code of a simulation that checkpointed and exited when preempted
+# (EX_TEMPFAIL; see util/event_managers/event_manager.py)
+PREEMPTED_EXIT_CODE = 75
+# Written by gem5 next to a complete preemption checkpoint, and the stats
+# dumped before it
+MANAGER_STATE_FILE = "manager_state.json"
+PREEMPTED_STATS_FILE = "stats.preempted.txt"
+
+# Kinds retried unless the user says otherwise
+DEFAULT_RETRYABLE = [FailureKind.OOM, FailureKind.KVM, FailureKind.IO]
+
+# Patterns checked in this order; the first kind with a match wins
+_PATTERNS = [
+    (FailureKind.KVM, re.compile(r"\bKVM\b|/dev/kvm|\bkvm:", re.IGNORECASE)),
+    (FailureKind.IO, re.compile(
+        r"Stale file handle|Input/output error|Transport endpoint is not connected|"
+        r"Resource temporarily unavailable|Connection (timed out|reset|refused)|"
+        r"No space left on device|Remote I/O error"
+    )),
+    (FailureKind.OOM, re.compile(
+        r"std::bad_alloc|MemoryError|Cannot allocate memory|[Oo]ut of memory"
+    )),
+    (FailureKind.CONFIG, re.compile(
+        r"^Traceback \(most recent call last\)|^\w+Error:|^fatal:|"
+        r"^usage: |: error: (argument|the following arguments)",
+        re.MULTILINE
+    )),
+]
+
+def classify_failure(exit_code: int, output: List[str], timed_out: bool = False) -> FailureKind:
+    """
+    Classify a failed command from its exit code (negative for a signal,
+    as subprocess reports it) and the last lines of its output.
+    """
+    if timed_out:
+        return FailureKind.TIMEOUT
+    if exit_code == PREEMPTED_EXIT_CODE:
+        return FailureKind.PREEMPTED
+    text = "\n".join(output)
+    for kind, pattern in _PATTERNS:
+        if pattern.search(text):
+            return kind
+    # killed without a word: the OOM killer (as seen directly or via a shell)
+    if exit_code in [-signal.SIGKILL, 128 + signal.SIGKILL]:
+        return FailureKind.OOM
+    return FailureKind.UNKNOWN
+
+
+def parse_failure_kinds(text: str) -> List[FailureKind]:
+    """Parse a comma-separated list of failure kinds, e.g. "kvm,io".
+    """
+    kinds = []
+    for name in text.split(","):
+        name = name.strip()
+        if name:
+            kinds.append(FailureKind(name))
+    return kinds
@@ -0,0 +1,106 @@
+"""
+Checkpoint fan-out: one restore job per checkpoint
+
+fs_gapparsec_take_checkpoints.py (and fs_spec06gap_simpoint_checkpoints.py)
+leave a directory of chkpt.<tick> checkpoints.  fanout_jobs() turns a
+restore command (e.g. fs_restore_checkpoint.py) into one runner job per
+checkpoint, each with its own outdir, OUTDIR/chkpt.<tick>, and
+
+    --start_from CHECKPOINTS_DIR/chkpt.<tick> --warmup W --roi R
+
+W and R (millions of instructions) are the same for every checkpoint, or
+else come from the checkpoint's simpoint.json (written by
+SimPointCheckpointManager), which also weights its results.  The
+checkpoints, outdirs and weights are recorded in OUTDIR/fanout.json, so
+the per-checkpoint stats can be merged into whole-program estimates
+afterwards (see fan_out_checkpoints.py and util/stats/sampling.py).
+"""
+import json
+import os
+import re
+from typing import Any, Dict, Iterator, List, Optional
+
+from util.runner.jobs import Job, add_simarg, parse_job_line, split_gem5_command, with_gem5_outdir
+
+CHECKPOINT_DIR = re.compile(r"chkpt\.(\d+)")
+# Written by SimPointCheckpointManager into each checkpoint
+SIMPOINT_FILE = "simpoint.json"
+# Written to the fan-out's outdir
+MANIFEST_FILE = "fanout.json"
+
+def find_checkpoints(checkpoints_dir: str) -> List[str]:
+    """The chkpt.<tick> dirs in CHECKPOINTS_DIR, in tick order.
+    """
+    found = []
+    for name in os.listdir(checkpoints_dir):
+        match = CHECKPOINT_DIR.fullmatch(name)
+        if match and os.path.isdir(os.path.join(checkpoints_dir, name)):
+            found.append((int(match.group(1)), os.path.join(checkpoints_dir, name)))
+    return [path for _, path in sorted(found)]
+
+
+def _simpoint(checkpoint: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(checkpoint, SIMPOINT_FILE), "r") as f:
+            return json.load(f)
+    except OSError:
+        return None
+
+
+def plan_fanout(checkpoints_dir: str, outdir: str, warmup: Optional[int] = None,
+                roi: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    One entry per checkpoint in CHECKPOINTS_DIR: its checkpoint, outdir,
+    warmup and roi (millions of instructions: WARMUP/ROI, else from its
+    simpoint.json) and weight (from simpoint.json, else None).
+    """
+    runs = []
+    for checkpoint in find_checkpoints(checkpoints_dir):
+        simpoint = _simpoint(checkpoint)
+        run = dict(checkpoint = os.path.abspath(checkpoint),
+                   outdir = os.path.join(outdir, os.path.basename(checkpoint)),
+                   warmup = warmup, roi = roi,
+                   weight = simpoint["weight"] if simpoint else None)
+        if simpoint:
+            if warmup is None:
+                run["warmup"] = -(-simpoint["warmup_insts"] // 1000000)
+            if roi is None:
+                run["roi"] = -(-simpoint["roi_insts"] // 1000000)
+        if run["roi"] is None:
+            raise ValueError(f"{checkpoint} has no {SIMPOINT_FILE}: give the ROI length")
+        runs.append(run)
+    if any(run["weight"] is None for run in runs) and any(run["weight"] is not None for run in runs):
+        raise ValueError(f"only some checkpoints in {checkpoints_dir} have a {SIMPOINT_FILE}")
+    return runs
+
+
+def write_manifest(outdir: str, runs: List[Dict[str, Any]]) -> None:
+    os.makedirs(outdir, exist_ok = True)
+    path = os.path.join(outdir, MANIFEST_FILE)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(dict(runs = runs), f, indent = 1)
+    os.replace(f"{path}.tmp", path)
+
+
+def read_manifest(outdir: str) -> List[Dict[str, Any]]:
+    with open(os.path.join(outdir, MANIFEST_FILE), "r") as f:
+        return json.load(f)["runs"]
+
+
+def fanout_jobs(command: str, runs: List[Dict[str, Any]], attributes: str = "") -> Iterator[Job]:
+    """
+    A job per run of plan_fanout(): COMMAND (a gem5 restore command)
+    with the run's outdir and --start_from/--warmup/--roi, and the job
+    ATTRIBUTES (e.g. "timeout=12h retries=1").
+    """
+    script, _ = split_gem5_command(command)
+    if script is None:
+        raise ValueError("the restore command must run a .py config script")
+    for num, run in enumerate(runs):
+        cmd = with_gem5_outdir(command, run["outdir"])
+        cmd = add_simarg(cmd, "--start_from", run["checkpoint"])
+        if run["warmup"]:
+            cmd = add_simarg(cmd, "--warmup", str(run["warmup"]))
+        cmd = add_simarg(cmd, "--roi", str(run["roi"]))
+        name = re.sub(r"[^\w.-]", "_", run["outdir"])
+        yield parse_job_line(f"@{name} {attributes}: {cmd}", line = num + 1)
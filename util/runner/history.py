@@ -0,0 +1,102 @@
+"""
+Wall-clock history of past jobs, used to predict how long a job will run
+
+Jobs are keyed by a normalized form of their command: the config script
+plus only the arguments that determine how much work the simulation does
+(benchmark, core types and counts, sampling/checkpoint intervals).  Output
+dirs and other incidental arguments are ignored, so the same simulation
+in a different sweep still finds its history.
+"""
+import json
+import os
+import statistics
+from typing import Dict, List
+
+from util.runner.jobs import Job, split_gem5_command, get_arg
+
+# Arguments that change how long a simulation takes
+RUNTIME_ARGS = [
+    "--benchmark", "--size", "--cores",
+    "--core_type", "--start_core_type", "--switch_core_type", "--warm_core_type",
+    "--ff", "--func_warmup", "--warmup", "--roi", "--init_ff", "--max_rois", "--continue",
+    "--interval", "--max_checkpoints",
+    "--target_error", "--confidence", "--min_rois",
+    "--fork_rois", "--switch_variants"
+]
+
+# Prediction for a job with no history at all, in seconds.  Err on the
+# long side: an unknown job that turns out to be long is what hurts the
+# makespan most if it's started last.
+DEFAULT_RUNTIME = 3600.0
+
+# Number of most recent runs to average over
+HISTORY_LENGTH = 10
+
+def normalize_command(cmd: str) -> str:
+    script, args = split_gem5_command(cmd)
+    if script is None:
+        return " ".join(cmd.split())
+    parts = [os.path.basename(script)]
+    for arg in RUNTIME_ARGS:
+        if arg == "--continue":
+            if arg in args:
+                parts.append(arg)
+            continue
+        value = get_arg(args, arg)
+        if value is not None:
+            parts.append(f"{arg}={value}")
+    return " ".join(parts)
+
+
+class RuntimeHistory:
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._runtimes: Dict[str, List[float]] = self._load()
+
+    def _load(self) -> Dict[str, List[float]]:
+        try:
+            with open(self._path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def predict(self, job: Job) -> float:
+        """
+        Predicted wall-clock seconds for JOB: the mean of its own history
+        if it has one, else of other runs of the same script with the same
+        benchmark, else of the same script, else DEFAULT_RUNTIME.
+        """
+        key = normalize_command(job.cmd)
+        if key in self._runtimes:
+            return statistics.mean(self._runtimes[key])
+
+        fields = key.split(" ")
+        benchmark = [f for f in fields if f.startswith("--benchmark=")]
+        for prefix in [fields[:1] + benchmark, fields[:1]]:
+            similar = [
+                statistics.mean(times) for other, times in self._runtimes.items()
+                if all(f in other.split(" ") for f in prefix)
+            ]
+            if similar:
+                return statistics.mean(similar)
+        return DEFAULT_RUNTIME
+
+    def known(self, job: Job) -> bool:
+        """Whether JOB's own command has been run before.
+        """
+        return normalize_command(job.cmd) in self._runtimes
+
+    def record(self, job: Job, seconds: float) -> None:
+        """Add a successful run's wall-clock time and save the history.
+        """
+        key = normalize_command(job.cmd)
+        # other runners may have saved since we loaded
+        self._runtimes.update(self._load())
+        times = self._runtimes.setdefault(key, [])
+        times.append(round(seconds, 1))
+        del times[:-HISTORY_LENGTH]
+
+        tmp = f"{self._path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._runtimes, f, indent = 1, sort_keys = True)
+        os.replace(tmp, self._path)
@@ -0,0 +1,384 @@
+"""
+Job model for the local command runner (run_cmds_locally.py)
+
+A command file holds one job per line.  Plain lines are anonymous jobs
+with no dependencies, so old command files keep working unchanged.  A
+line starting with "@" names the job and may declare attributes before
+a ": " separator, e.g.
+
+    @ckpt_mcf: $GEM5 ... fs_gapparsec_take_checkpoints.py --benchmark mcf ...
+    @restore_mcf_1 after=ckpt_mcf: $GEM5 ... fs_restore_checkpoint.py ...
+
+Supported attributes:
+    after=A,B   don't start until jobs A and B (defined on earlier lines)
+                have completed successfully
+    mem=4G      host memory the job needs (default: estimated from command)
+    cores=2     host cores the job keeps busy (default: estimated from command)
+    timeout=2h  kill the job if it runs longer than this (s, m, h or d)
+    retries=2   rerun the job up to twice if it fails for a retryable reason
+    priority=1  jobs with a higher priority (default 0) that are waiting
+                for resources preempt running gem5 jobs of lower priority,
+                which checkpoint and are resumed later
+
+Blank lines and lines starting with "#" are ignored.
+"""
+import hashlib
+import os
+import re
+import shlex
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+class Job:
+    def __init__(
+        self,
+        cmd: str,
+        name: Optional[str] = None,
+        deps: Optional[List[str]] = None,
+        mem: Optional[int] = None,
+        cores: Optional[int] = None,
+        timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        priority: int = 0,
+        line: int = 0,
+        cwd: Optional[str] = None,
+        env: Optional[Dict[str, str]] = None
+    ) -> None:
+        self.cmd = cmd.strip()
+        # anonymous jobs are named after their line in the command file
+        self.anonymous = not name
+        self.name = name if name else f"line{line}"
+        self.deps = deps if deps else []
+        # host footprint in bytes / cores (None: estimate from command)
+        self.mem = mem
+        self.cores = cores
+        # wall-clock limit in seconds (None: the runner's default)
+        self.timeout = timeout
+        # number of reruns allowed after retryable failures (None: default)
+        self.retries = retries
+        # higher priority jobs may preempt lower priority ones
+        self.priority = priority
+        self.line = line
+        # directory and environment to run in (None: the runner's own),
+        # for jobs submitted from elsewhere
+        self.cwd = cwd
+        self.env = env
+
+    @property
+    def key(self) -> str:
+        """
+        Stable identity of this job across runs of the same command file.
+        Anonymous jobs are identified by their command alone, so inserting
+        lines above them doesn't change who they are.
+        """
+        ident = self.cmd if self.anonymous else f"{self.name}\n{self.cmd}"
+        return hashlib.sha1(ident.encode()).hexdigest()
+
+    @property
+    def outdir(self) -> str:
+        return os.path.join(self.cwd or "", gem5_outdir(self.cmd))
+
+    def to_line(self) -> str:
+        """This job as a line of a command file.
+        """
+        attrs = []
+        if self.deps:
+            attrs.append("after=" + ",".join(self.deps))
+        if self.mem:
+            attrs.append(f"mem={self.mem}")
+        if self.cores:
+            attrs.append(f"cores={self.cores}")
+        if self.timeout:
+            attrs.append(f"timeout={self.timeout:g}")
+        if self.retries is not None:
+            attrs.append(f"retries={self.retries}")
+        if self.priority:
+            attrs.append(f"priority={self.priority}")
+        if self.anonymous and not attrs:
+            return self.cmd
+        return f"@{' '.join([self.name] + attrs)}: {self.cmd}"
+
+    def __repr__(self) -> str:
+        return f"Job({self.name}: \"{self.cmd}\")"
+
+
+def _parse_attr(parse, key: str, value: str, line: int, allow_zero: bool = False):
+    try:
+        result = parse(value)
+    except ValueError:
+        result = None
+    if result is None or result < 0 or (result == 0 and not allow_zero):
+        raise ValueError(f"Line {line}: bad value for \"{key}\": {value}")
+    return result
+
+
+def parse_job_line(text: str, line: int = 0) -> Optional[Job]:
+    """Parse one line of a command file (None for blanks and comments).
+    """
+    text = text.strip()
+    if not text or text.startswith("#"):
+        return None
+    if not text.startswith("@"):
+        return Job(text, line = line)
+
+    header, sep, cmd = text[1:].partition(": ")
+    if not sep or not cmd.strip():
+        raise ValueError(f"Line {line}: expected \"@name [key=value ...]: command\"")
+    fields = header.split()
+    if not fields:
+        raise ValueError(f"Line {line}: missing job name before \":\"")
+
+    name = fields[0]
+    deps = []
+    mem = None
+    cores = None
+    timeout = None
+    retries = None
+    priority = 0
+    for field in fields[1:]:
+        key, sep, value = field.partition("=")
+        if not sep:
+            raise ValueError(f"Line {line}: malformed attribute \"{field}\"")
+        if key == "after":
+            deps += [dep for dep in value.split(",") if dep]
+        elif key == "mem":
+            mem = _parse_attr(parse_size, key, value, line)
+        elif key == "cores":
+            cores = _parse_attr(int, key, value, line)
+        elif key == "timeout":
+            timeout = _parse_attr(parse_duration, key, value, line)
+        elif key == "retries":
+            retries = _parse_attr(int, key, value, line, allow_zero = True)
+        elif key == "priority":
+            priority = _parse_attr(int, key, value, line, allow_zero = True)
+        else:
+            raise ValueError(f"Line {line}: unknown attribute \"{key}\"")
+
+    return Job(cmd, name = name, deps = deps, mem = mem, cores = cores,
+               timeout = timeout, retries = retries, priority = priority, line = line)
+
+
+def parse_size(text: str) -> int:
+    """Parse a memory size like "512M", "3GB" or "1.5G" into bytes.
+    """
+    units = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+    text = text.strip().upper()
+    if text.endswith("IB"):
+        text = text[:-2]
+    elif text.endswith("B"):
+        text = text[:-1]
+    suffix = text[-1:] if text[-1:] in units else ""
+    number = float(text[:len(text) - len(suffix)])
+    if number < 0:
+        raise ValueError(text)
+    return int(number * units[suffix])
+
+
+def parse_duration(text: str) -> float:
+    """Parse a duration like "90", "30m", "2h" or "1.5d" into seconds.
+    """
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    text = text.strip().lower()
+    if text[-1:] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+def split_gem5_command(cmd: str) -> Tuple[Optional[str], List[str]]:
+    """
+    Find the top-level config script in a gem5 command line and return it
+    with the arguments that follow it (the script's simargs).  Returns
+    (None, []) if the command doesn't run a .py script.
+    """
+    try:
+        tokens = shlex.split(cmd)
+    except ValueError:
+        return None, []
+    for i, token in enumerate(tokens):
+        if token.endswith(".py"):
+            args = []
+            # stop at the end of this command (redirects, pipes, &&, ;)
+            for arg in tokens[i + 1:]:
+                if arg in [">", ">>", "2>", "2>&1", "&>", "|", "&&", "||", ";", "&"]:
+                    break
+                args.append(arg)
+            return token, args
+    return None, []
+
+
+def gem5_outdir(cmd: str) -> str:
+    """The gem5 --outdir/-d given before the config script (default m5out).
+    """
+    try:
+        tokens = shlex.split(cmd)
+    except ValueError:
+        return "m5out"
+    outdir = "m5out"
+    for i, token in enumerate(tokens):
+        if token.endswith(".py"):
+            break
+        if token in ["--outdir", "-d"] and i + 1 < len(tokens):
+            outdir = tokens[i + 1]
+        elif token.startswith("--outdir="):
+            outdir = token[len("--outdir="):]
+        elif token.startswith("-d") and len(token) > 2 and not token.startswith("--"):
+            outdir = token[2:]
+    return outdir
+
+
+def with_gem5_outdir(cmd: str, outdir: str) -> str:
+    """CMD with its gem5 --outdir/-d changed (or set) to OUTDIR.
+    """
+    script, _ = split_gem5_command(cmd)
+    if script is None:
+        raise ValueError(f"not a gem5 command: {cmd}")
+    start = cmd.find(script)
+    # (the last one counts, as in gem5_outdir())
+    options = list(re.finditer(
+        r"(?<!\S)(?:--outdir[= ]\s*|-d\s*)('[^']*'|\"[^\"]*\"|\S+)", cmd[:start]))
+    if options:
+        value = options[-1]
+        return f"{cmd[:value.start(1)]}{shlex.quote(outdir)}{cmd[value.end(1):]}"
+    return f"{cmd[:start]}--outdir={shlex.quote(outdir)} {cmd[start:]}"
+
+
+def add_simarg(cmd: str, flag: str, value: str) -> str:
+    """
+    CMD with "FLAG VALUE" added after the config script's other simargs
+    (so it overrides any earlier FLAG), before any redirects or pipes.
+    """
+    script, _ = split_gem5_command(cmd)
+    if script is None:
+        raise ValueError(f"not a gem5 command: {cmd}")
+    start = cmd.find(script) + len(script)
+    end = re.search(r"\s(\d?>|&>|\||&&|;|&\s|&$)|$", cmd[start:]).start() + start
+    return f"{cmd[:end]} {flag} {shlex.quote(value)}{cmd[end:]}"
+
+
+def get_arg(args: List[str], flag: str) -> Optional[str]:
+    """Value of the last occurrence of FLAG in an argument list, if any.
+    """
+    value = None
+    for i, arg in enumerate(args):
+        if arg == flag and i + 1 < len(args):
+            value = args[i + 1]
+        elif arg.startswith(flag + "="):
+            value = arg[len(flag) + 1:]
+    return value
+
+
+def parse_job_lines(lines: Iterable[str]) -> Iterator[Job]:
+    """Lazily parse the lines of a command file into jobs.
+    """
+    for num, text in enumerate(lines, start = 1):
+        job = parse_job_line(text, line = num)
+        if job:
+            yield job
+
+
+class JobGraph:
+    """
+    Dependency graph over a batch of jobs, built up one job at a time as
+    the command file is read (so a job can only depend on jobs added before
+    it, which also rules out cycles).  Jobs become ready once all of their
+    dependencies have completed successfully; if a dependency fails,
+    everything downstream of it is skipped.
+
+    Given a runtime predictor, the graph also tracks each job's critical
+    path: its own runtime plus that of its longest chain of dependents.
+    Starting jobs in decreasing order of this gets long chains going first.
+    """
+    def __init__(self, runtime: Optional[Callable[[Job], float]] = None) -> None:
+        self._runtime = runtime if runtime else (lambda job: 0.0)
+        self._jobs: Dict[str, Job] = {}
+        # dependents of each job, and number of unfinished deps per job
+        self._dependents: Dict[str, List[str]] = {}
+        self._waiting_on: Dict[str, int] = {}
+        self._succeeded = set()
+        # jobs that failed or were skipped
+        self._failed = set()
+        # own predicted runtime and critical path length of each job
+        self._own_time: Dict[str, float] = {}
+        self._path: Dict[str, float] = {}
+        self._ready: List[Job] = []
+        self._unfinished = 0
+
+    def add(self, job: Job) -> List[Job]:
+        """Add a job to the graph. Returns [JOB] if it's skipped right away
+        because one of its dependencies already failed.
+        """
+        if job.name in self._jobs:
+            raise ValueError(f"Line {job.line}: duplicate job name \"{job.name}\"")
+        for dep in job.deps:
+            if dep not in self._jobs:
+                raise ValueError(f"Line {job.line}: job \"{job.name}\" depends on "
+                                 f"unknown job \"{dep}\" (dependencies must be "
+                                 f"defined on earlier lines)")
+
+        self._jobs[job.name] = job
+        self._dependents[job.name] = []
+        if any(dep in self._failed for dep in job.deps):
+            self._failed.add(job.name)
+            return [job]
+
+        self._unfinished += 1
+        self._own_time[job.name] = self._runtime(job)
+        self._path[job.name] = self._own_time[job.name]
+        for dep in job.deps:
+            self._dependents[dep].append(job.name)
+            self._extend_path(dep, self._path[job.name])
+
+        self._waiting_on[job.name] = len([dep for dep in job.deps if dep not in self._succeeded])
+        if self._waiting_on[job.name] == 0:
+            self._ready.append(job)
+        return []
+
+    def _extend_path(self, name: str, child_path: float) -> None:
+        # propagate a new, possibly longer chain up through NAME's ancestors
+        stack = [(name, child_path)]
+        while stack:
+            name, child_path = stack.pop()
+            length = self._own_time[name] + child_path
+            if length <= self._path[name]:
+                continue
+            self._path[name] = length
+            stack += [(dep, length) for dep in self._jobs[name].deps]
+
+    def critical_path(self, job: Job) -> float:
+        return self._path[job.name]
+
+    def pop_ready(self) -> List[Job]:
+        """Return (and forget) all jobs whose dependencies are satisfied.
+        """
+        ready, self._ready = self._ready, []
+        return ready
+
+    def complete(self, job: Job, success: bool) -> List[Job]:
+        """Record a finished job. Returns the jobs skipped because of it.
+        """
+        self._unfinished -= 1
+        if success:
+            self._succeeded.add(job.name)
+            for name in self._dependents[job.name]:
+                self._waiting_on[name] -= 1
+                if self._waiting_on[name] == 0:
+                    self._ready.append(self._jobs[name])
+            return []
+
+        # skip everything downstream of a failed job
+        self._failed.add(job.name)
+        skipped = []
+        frontier = list(self._dependents[job.name])
+        while frontier:
+            name = frontier.pop()
+            if name in self._failed:
+                continue
+            self._failed.add(name)
+            self._unfinished -= 1
+            skipped.append(self._jobs[name])
+            frontier += self._dependents[name]
+        return skipped
+
+    def finished(self) -> bool:
+        """Whether every job added so far has finished (or been skipped).
+        """
+        return self._unfinished == 0
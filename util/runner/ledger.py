@@ -0,0 +1,91 @@
+"""
+Persistent record of a batch's progress, so an interrupted batch can be
+resumed without rerunning the jobs that already finished
+
+The ledger is an append-only JSONL file with one record per state change
+of a job:
+
+    {"key": ..., "name": ..., "cmd": ..., "outdir": ...,
+     "state": "started" | "completed" | "failed" | "skipped",
+     "exit_code": ..., "failure": ..., "start_time": ..., "end_time": ...}
+
+Only the last record for each job matters.  A job whose last record is
+"started" was interrupted (the runner or the machine died under it).
+"""
+import json
+import os
+import time
+from typing import Dict, Optional
+
+from util.runner.jobs import Job
+
+class JobLedger:
+    def __init__(self, path: str, resume: bool = False) -> None:
+        self._path = path
+        # last known record for each job key
+        self._records: Dict[str, dict] = {}
+        if resume:
+            self._load()
+        elif os.path.exists(path):
+            # fresh batch: start a fresh ledger
+            os.remove(path)
+        # jobs already done before this run started
+        self._completed = set(
+            key for key, record in self._records.items() if record["state"] == "completed"
+        )
+        self._file = open(path, "a")
+
+    def _load(self) -> None:
+        if not os.path.exists(self._path):
+            return
+        with open(self._path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # torn final write from a crash
+                    continue
+                self._records[record["key"]] = record
+
+    def summary(self) -> Dict[str, int]:
+        """Count of jobs by last recorded state (interrupted = "started").
+        """
+        counts = {}
+        for record in self._records.values():
+            counts[record["state"]] = counts.get(record["state"], 0) + 1
+        return counts
+
+    def completed(self, job: Job) -> bool:
+        """Whether JOB had completed in a previous run of this batch.
+        """
+        return job.key in self._completed
+
+    def _write(self, job: Job, **fields) -> None:
+        record = self._records.get(job.key, {})
+        record.update(
+            key = job.key,
+            name = job.name,
+            cmd = job.cmd,
+            outdir = job.outdir,
+            **fields
+        )
+        self._records[job.key] = record
+        self._file.write(json.dumps(record) + "\n")
+        # make sure the record survives a crash or reboot
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def record_start(self, job: Job) -> None:
+        self._write(job, state = "started", exit_code = None, failure = None,
+                    start_time = time.time(), end_time = None)
+
+    def record_end(self, job: Job, exit_code: int, failure: Optional[str] = None) -> None:
+        self._write(job, state = "completed" if exit_code == 0 else "failed",
+                    exit_code = exit_code, failure = failure, end_time = time.time())
+
+    def record_skip(self, job: Job) -> None:
+        self._write(job, state = "skipped", exit_code = None, failure = None,
+                    start_time = None, end_time = None)
+
+    def close(self) -> None:
+        self._file.close()
@@ -0,0 +1,128 @@
+"""
+Per-job capture of a command's stdout/stderr
+
+Output is streamed in chunks straight to a rotating set of log files
+(optionally gzipped as they're rotated out), so a job that prints
+gigabytes of gem5 warnings costs neither runner memory nor unbounded
+disk.  Only the last few lines of each stream are kept in memory, to be
+shown if the job fails.
+"""
+import asyncio
+import collections
+import gzip
+import os
+import re
+import shutil
+from typing import List
+
+# bytes read from a pipe at a time
+CHUNK_SIZE = 1 << 16
+# longest line kept in a tail (the rest of a huge line is dropped)
+MAX_TAIL_LINE = 1024
+
+def log_basename(name: str) -> str:
+    """Filesystem-safe version of a job name.
+    """
+    return re.sub(r"[^\w.-]", "_", name)
+
+
+class RotatingLog:
+    """
+    Log file that moves to PATH.1, PATH.2, ... as it reaches MAX_BYTES
+    (0: never), keeping at most BACKUPS old segments (gzipped, if COMPRESS).
+    """
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 100 << 20,
+        backups: int = 5,
+        compress: bool = False
+    ) -> None:
+        self._path = path
+        self._max_bytes = max_bytes
+        self._backups = backups
+        self._compress = compress
+        self._suffix = ".gz" if compress else ""
+        self._file = open(path, "wb")
+        self._size = 0
+
+    @property
+    def path(self) -> str:
+        """Where the latest output ends up once the log is closed."""
+        return self._path + self._suffix
+
+    def write(self, data: bytes) -> None:
+        if self._max_bytes <= 0:
+            self._file.write(data)
+            self._size += len(data)
+            return
+        while data:
+            room = self._max_bytes - self._size
+            self._file.write(data[:room])
+            self._size += min(room, len(data))
+            data = data[room:]
+            if self._size >= self._max_bytes:
+                self._rotate()
+
+    def _segment(self, num: int) -> str:
+        return f"{self._path}.{num}{self._suffix}"
+
+    def _rotate(self) -> None:
+        self._file.close()
+        if self._backups > 0:
+            # drop the oldest, shift the rest down
+            if os.path.exists(self._segment(self._backups)):
+                os.remove(self._segment(self._backups))
+            for num in range(self._backups - 1, 0, -1):
+                if os.path.exists(self._segment(num)):
+                    os.replace(self._segment(num), self._segment(num + 1))
+            self._finish_segment(self._path, self._segment(1))
+        self._file = open(self._path, "wb")
+        self._size = 0
+
+    def _finish_segment(self, src: str, dest: str) -> None:
+        if self._compress:
+            with open(src, "rb") as fin, gzip.open(dest, "wb") as fout:
+                shutil.copyfileobj(fin, fout)
+            os.remove(src)
+        else:
+            os.replace(src, dest)
+
+    def close(self) -> None:
+        self._file.close()
+        if self._compress:
+            self._finish_segment(self._path, self._path + ".gz")
+
+
+class LineTail:
+    """The last MAX_LINES lines written to it.
+    """
+    def __init__(self, max_lines: int = 20) -> None:
+        self._lines = collections.deque(maxlen = max_lines)
+        self._partial = b""
+
+    def write(self, data: bytes) -> None:
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()[:MAX_TAIL_LINE]
+        for line in lines[-self._lines.maxlen:]:
+            self._lines.append(line[:MAX_TAIL_LINE])
+
+    def lines(self) -> List[str]:
+        lines = list(self._lines)
+        if self._partial:
+            lines.append(self._partial)
+        return [line.decode(errors = "replace") for line in lines[-self._lines.maxlen:]]
+
+
+async def capture(stream: asyncio.StreamReader, log: RotatingLog, tail: LineTail) -> None:
+    """Copy STREAM to LOG and TAIL until EOF.
+    """
+    try:
+        while True:
+            data = await stream.read(CHUNK_SIZE)
+            if not data:
+                break
+            log.write(data)
+            tail.write(data)
+    finally:
+        log.close()
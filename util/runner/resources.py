@@ -0,0 +1,165 @@
+"""
+Host resource accounting for the local command runner
+
+Each job has a memory and core footprint, either declared in the command
+file (mem=, cores=) or estimated from the gem5 command line.  Jobs are
+only started when they fit in the runner's budget AND the machine itself
+currently has the free memory and idle cores for them (other people's
+jobs count too).
+"""
+import os
+import re
+from typing import Dict, Optional, Tuple
+
+from util.runner.jobs import Job, split_gem5_command, get_arg, parse_size
+
+GiB = 1 << 30
+
+# Rough host-side costs of a gem5 process on top of its simulated DRAM
+GEM5_BASE_MEM = GiB // 2
+GEM5_PER_CORE_MEM = GiB // 4
+# Anything that isn't a gem5 config script
+OTHER_CMD_MEM = GiB // 4
+
+# Simulated DRAM assumed when the config script can't be inspected
+DEFAULT_SIM_MEM = 3 * GiB
+
+_sim_mem_cache = {}
+
+def _simulated_memory(script: str) -> int:
+    """Simulated DRAM size declared in a top-level config script.
+    """
+    if script not in _sim_mem_cache:
+        size = DEFAULT_SIM_MEM
+        try:
+            with open(script, "r") as f:
+                # e.g. memory = DualChannelDDR4_2400(size="3GB")
+                match = re.search(r"DDR\w*\(\s*size\s*=\s*[\"']([^\"']+)[\"']", f.read())
+            if match:
+                size = parse_size(match.group(1))
+        except (OSError, ValueError):
+            pass
+        _sim_mem_cache[script] = size
+    return _sim_mem_cache[script]
+
+
+def estimate_footprint(job: Job) -> Tuple[int, int]:
+    """
+    Return (memory bytes, host cores) for a job, using the values declared
+    in the command file where given.
+
+    FS runs touch most of their simulated DRAM (kernel, page cache, disk
+    image buffers), so they're charged for all of it.  SE runs only touch
+    what the binary uses.  gem5 simulates on one host thread, except KVM,
+    which runs one thread per simulated core.
+    """
+    script, args = split_gem5_command(job.cmd)
+    if script is None:
+        mem, cores = OTHER_CMD_MEM, 1
+    else:
+        num_cores = int(get_arg(args, "--cores") or 1)
+        mem = GEM5_BASE_MEM + num_cores * GEM5_PER_CORE_MEM
+        if os.path.basename(script).startswith("fs_"):
+            mem += _simulated_memory(os.path.join(job.cwd or "", script))
+
+        # switchable processors start on KVM by default
+        start_core = get_arg(args, "--start_core_type") or get_arg(args, "--core_type")
+        if start_core == "kvm":
+            cores = num_cores
+        else:
+            cores = 1
+
+    if job.mem:
+        mem = job.mem
+    if job.cores:
+        cores = job.cores
+    return mem, cores
+
+
+def host_available_memory() -> Optional[int]:
+    """MemAvailable from /proc/meminfo, in bytes (None if unknown).
+    """
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def host_total_memory() -> Optional[int]:
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+class ResourceBudget:
+    """
+    Tracks the memory and cores held by the runner's own jobs against a
+    fixed budget, and checks the live state of the machine before
+    admitting anything new.
+    """
+    def __init__(
+        self,
+        max_mem: int,
+        max_cores: int,
+        min_free_mem: int = 2 * GiB,
+        max_load: Optional[float] = None
+    ) -> None:
+        self._max_mem = max_mem
+        self._max_cores = max_cores
+        self._min_free_mem = min_free_mem
+        self._max_load = max_load if max_load is not None else float(os.cpu_count() or 1)
+        self._used_mem = 0
+        self._used_cores = 0
+        # footprints of admitted jobs
+        self._held: Dict[int, Tuple[int, int]] = {}
+        self.refresh()
+
+    def idle(self) -> bool:
+        return not self._held
+
+    def refresh(self) -> None:
+        """
+        Snapshot the machine's free memory and load.  Call this before each
+        round of admissions: jobs admitted in the same round are deducted
+        from the snapshot, since they won't show up in it until they've
+        actually started allocating.
+        """
+        self._available = host_available_memory()
+        # Load average lags behind job starts, so charge our own running
+        # jobs in full and only the (whole cores of) excess to everyone else
+        self._others_load = max(0, round(os.getloadavg()[0] - self._used_cores))
+
+    def admit(self, job: Job) -> bool:
+        """Reserve resources for JOB if it fits now; return whether it did.
+        """
+        mem, cores = estimate_footprint(job)
+
+        # A job bigger than the whole budget can still run on its own
+        if not self.idle():
+            if self._used_mem + mem > self._max_mem:
+                return False
+            if self._used_cores + cores > self._max_cores:
+                return False
+
+        # Live checks, which also account for other users' jobs
+        if self._available is not None and self._available - mem < self._min_free_mem:
+            return False
+        if self._others_load + self._used_cores + cores > self._max_load:
+            return False
+
+        if self._available is not None:
+            self._available -= mem
+        self._used_mem += mem
+        self._used_cores += cores
+        self._held[id(job)] = (mem, cores)
+        return True
+
+    def release(self, job: Job) -> None:
+        mem, cores = self._held.pop(id(job))
+        self._used_mem -= mem
+        self._used_cores -= cores
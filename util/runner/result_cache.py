@@ -0,0 +1,242 @@
+"""
+Content-addressed cache of simulation results
+
+A gem5 run is determined by the gem5 binary, the config script (and the
+local modules it imports), the fully resolved simarg table, the
+checkpoint it starts from and the disk image it boots.  The cache key is
+a sha256 over all of these, so rerunning the exact same simulation, even
+spelled differently on the command line or in a different sweep, copies
+the stored outdir (stats.txt, config.ini, ...) instead of launching gem5.
+
+Only the top-level files of an outdir are stored.  Commands that write
+checkpoints (to --checkpoint_dir/--checkpoints_dir, outside the outdir)
+have side effects a hit couldn't reproduce, so they're never cached.
+
+Files named by other simargs (e.g. --switch_variants JSON, a SimPoint
+file, an SE binary) are hashed too: their paths alone don't say what
+they hold.  Checkpoints and gem5 binaries are big, so content hashes are
+remembered in the cache dir by (path, size, mtime) and only recomputed
+when a file changes.  Disk images are identified by path, size and mtime
+alone; hashing a multi-GB image for every job would cost more than it
+saves.
+"""
+import ast
+import hashlib
+import json
+import os
+import shlex
+import shutil
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from util.runner.jobs import Job, split_gem5_command
+from util.runner.script_args import script_parser, script_sources, resolve_simargs
+
+# simargs naming dirs that a simulation writes to outside its outdir
+SIDE_EFFECT_ARGS = ["checkpoint_dir", "checkpoints_dir"]
+
+# gem5 options that don't change what a simulation computes
+_OUTDIR_OPTS = ["--outdir", "-d"]
+
+_CHUNK_SIZE = 1 << 20
+
+def _gem5_options(cmd: str, script: str) -> List[str]:
+    """The tokens of CMD before SCRIPT (gem5 binary and options), minus the outdir.
+    """
+    tokens = shlex.split(cmd)
+    opts = tokens[:tokens.index(script)]
+    kept = []
+    skip = False
+    for token in opts:
+        if skip:
+            skip = False
+        elif token in _OUTDIR_OPTS:
+            skip = True
+        elif not (token.startswith("--outdir=")
+                  or (token.startswith("-d") and not token.startswith("--"))):
+            kept.append(token)
+    return kept
+
+
+def disk_image_paths(sources: List[str], simargs: Dict[str, Any]) -> List[str]:
+    """
+    Disk images a simulation may boot: the literal paths given to
+    DiskImageResource in SOURCES, plus IMAGE_DIR/NAME-image/NAME for the
+    workloads that take --disk_image.
+    """
+    paths = []
+    for path in sources:
+        with open(path, "r") as f:
+            tree = ast.parse(f.read(), filename = path)
+        for node in ast.walk(tree):
+            if (isinstance(node, ast.Call) and node.args
+                    and getattr(node.func, "id", getattr(node.func, "attr", None)) == "DiskImageResource"
+                    and isinstance(node.args[0], ast.Constant)):
+                paths.append(node.args[0].value)
+    name = simargs.get("disk_image")
+    if name and simargs.get("image_dir"):
+        paths.append(f"{simargs['image_dir']}/{name}-image/{name}")
+    return paths
+
+
+def _identity(path: str) -> List[Any]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return [path, None]
+    return [os.path.realpath(path), st.st_size, st.st_mtime_ns]
+
+
+class ResultCache:
+    def __init__(self, path: str) -> None:
+        """
+        :param path: Cache directory (created if need be).
+        """
+        self._path = path
+        os.makedirs(path, exist_ok = True)
+        self._digest_file = os.path.join(path, "digests.json")
+        try:
+            with open(self._digest_file, "r") as f:
+                self._digests: Dict[str, str] = json.load(f)
+        except (OSError, ValueError):
+            self._digests = {}
+        # Lookups run in worker threads
+        self._lock = threading.Lock()
+        self._parsers = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.uncacheable = 0
+
+    def _file_digest(self, path: str) -> str:
+        st = os.stat(path)
+        memo = f"{os.path.realpath(path)}|{st.st_size}|{st.st_mtime_ns}"
+        with self._lock:
+            if memo in self._digests:
+                return self._digests[memo]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(_CHUNK_SIZE):
+                h.update(chunk)
+        with self._lock:
+            self._digests[memo] = h.hexdigest()
+            tmp = f"{self._digest_file}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self._digests, f)
+            os.replace(tmp, self._digest_file)
+        return h.hexdigest()
+
+    def _tree_digest(self, path: str) -> Optional[str]:
+        if os.path.isfile(path):
+            return self._file_digest(path)
+        if not os.path.isdir(path):
+            return None
+        h = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                file = os.path.join(root, name)
+                h.update(os.path.relpath(file, path).encode() + b"\0")
+                h.update(self._file_digest(file).encode() + b"\0")
+        return h.hexdigest()
+
+    def _input_digests(self, simargs: Dict[str, Any], skip: List[str]) -> Dict[str, List[str]]:
+        """
+        The content hashes of the files SIMARGS name (e.g.
+        --switch_variants, --simpoints), which a path alone doesn't
+        identify.  Disk images in SKIP are left to their identity.
+        """
+        digests = {}
+        for arg, value in simargs.items():
+            if arg == "start_from":
+                continue
+            paths = value if isinstance(value, list) else [value]
+            if paths and all(isinstance(path, str) and os.path.isfile(path) and path not in skip
+                             for path in paths):
+                digests[arg] = [self._file_digest(path) for path in paths]
+        return digests
+
+    def key(self, job: Job) -> Optional[str]:
+        """
+        The cache key of JOB, or None if its results can't be cached (not
+        a gem5 command, simargs that don't resolve, or side effects).
+        """
+        script, args = split_gem5_command(job.cmd)
+        if script is None or not os.path.isfile(script):
+            return None
+        try:
+            with self._lock:
+                if script not in self._parsers:
+                    self._parsers[script] = (script_sources(script), script_parser(script))
+                sources, parser = self._parsers[script]
+            simargs = resolve_simargs(parser, args)
+            options = _gem5_options(job.cmd, script)
+        except (ValueError, SyntaxError, OSError):
+            return None
+        if any(simargs.get(arg) for arg in SIDE_EFFECT_ARGS):
+            return None
+
+        binary = options[0] if options else ""
+        if os.path.isfile(binary):
+            binary = self._file_digest(binary)
+        start_from = simargs.get("start_from")
+        disk_images = disk_image_paths(sources, simargs)
+        key = {
+            "gem5": binary,
+            "gem5_options": options[1:],
+            "sources": [self._file_digest(path) for path in sources],
+            "simargs": simargs,
+            "input_files": self._input_digests(simargs, disk_images),
+            "checkpoint": self._tree_digest(start_from) if start_from else None,
+            "disk_images": [_identity(path) for path in disk_images]
+        }
+        text = json.dumps(key, sort_keys = True, default = str)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def _entry(self, key: str) -> str:
+        return os.path.join(self._path, key[:2], key)
+
+    def fetch(self, job: Job) -> Tuple[Optional[str], bool]:
+        """
+        Copy the stored outdir of JOB into place if the cache has it.
+        Returns the key JOB was looked up under (None if uncacheable) and
+        whether it was a hit.
+        """
+        key = self.key(job)
+        if key is None:
+            self.uncacheable += 1
+            return None, False
+        entry = self._entry(key)
+        if not os.path.isdir(entry):
+            self.misses += 1
+            return key, False
+        os.makedirs(job.outdir, exist_ok = True)
+        for name in os.listdir(entry):
+            shutil.copy2(os.path.join(entry, name), os.path.join(job.outdir, name))
+        self.hits += 1
+        return key, True
+
+    def store(self, job: Job, key: str) -> None:
+        """Store the top-level files of JOB's outdir under KEY.
+        """
+        entry = self._entry(key)
+        if os.path.isdir(entry) or not os.path.isdir(job.outdir):
+            return
+        os.makedirs(os.path.dirname(entry), exist_ok = True)
+        tmp = f"{entry}.{os.getpid()}.{threading.get_ident()}.tmp"
+        os.makedirs(tmp, exist_ok = True)
+        for name in os.listdir(job.outdir):
+            src = os.path.join(job.outdir, name)
+            if os.path.isfile(src):
+                shutil.copy2(src, os.path.join(tmp, name))
+        try:
+            os.rename(tmp, entry)
+            self.stored += 1
+        except OSError:
+            # stored concurrently by another run
+            shutil.rmtree(tmp, ignore_errors = True)
+
+    def summary(self) -> str:
+        return (f"{self.hits} hit(s), {self.misses} miss(es), {self.stored} stored, "
+                f"{self.uncacheable} uncacheable")
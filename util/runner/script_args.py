@@ -0,0 +1,144 @@
+"""
+Rebuilds the simarglib argument parser of a top-level config script
+without running gem5
+
+The script and every local module it (transitively) imports are parsed
+with Python's ast module, and each literal parser.add_argument(...) call
+found is replayed onto a fresh argparse parser.  Tools outside gem5 (the
+sweep expander, the result cache) can then validate simargs against the
+registered choices and types, and resolve the full argument table with
+defaults, exactly as simarglib.parse() would inside the simulation.
+"""
+import argparse
+import ast
+import os
+from typing import Any, Dict, List, Optional
+
+# argparse type= callables that may appear in add_argument calls
+_TYPES = {"int": int, "float": float, "str": str}
+
+class ScriptArgsError(ValueError):
+    pass
+
+
+class _CheckingParser(argparse.ArgumentParser):
+    # raise instead of printing usage and exiting
+    def error(self, message: str):
+        raise ScriptArgsError(message)
+
+
+def _module_path(root: str, module: str) -> Optional[str]:
+    path = os.path.join(root, *module.split("."))
+    if os.path.isfile(path + ".py"):
+        return path + ".py"
+    return None
+
+
+def _local_imports(tree: ast.AST, root: str) -> List[str]:
+    """Paths of the repo-local modules imported in TREE, in import order.
+    """
+    paths = []
+    for node in ast.walk(tree):
+        names = []
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            # "from a.b import c" may import module a.b or a.b.c
+            names = [node.module] + [f"{node.module}.{alias.name}" for alias in node.names]
+        for name in names:
+            path = _module_path(root, name)
+            if path:
+                paths.append(path)
+    return paths
+
+
+def _add_argument_calls(tree: ast.AST) -> List[ast.Call]:
+    return [
+        node for node in ast.walk(tree)
+        if isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and node.func.attr == "add_argument"
+    ]
+
+
+def _replay(parser: argparse.ArgumentParser, call: ast.Call) -> None:
+    try:
+        flags = [ast.literal_eval(arg) for arg in call.args]
+    except ValueError:
+        return
+    kwargs = {}
+    for keyword in call.keywords:
+        if keyword.arg == "type":
+            if isinstance(keyword.value, ast.Name) and keyword.value.id in _TYPES:
+                kwargs["type"] = _TYPES[keyword.value.id]
+            continue
+        try:
+            kwargs[keyword.arg] = ast.literal_eval(keyword.value)
+        except ValueError:
+            # computed values (e.g. defaults from the environment) are
+            # left to argparse's defaults
+            pass
+    parser.add_argument(*flags, **kwargs)
+
+
+def script_sources(script: str) -> List[str]:
+    """
+    Paths of SCRIPT and every repo-local module it (transitively) imports.
+    Local modules are looked up relative to the script's directory, as
+    gem5 does.
+    """
+    root = os.path.dirname(os.path.abspath(script))
+    sources = []
+    todo = [os.path.abspath(script)]
+    while todo:
+        path = todo.pop(0)
+        if path in sources:
+            continue
+        sources.append(path)
+        todo += _local_imports(_parse(path), root)
+    return sources
+
+
+def _parse(path: str) -> ast.AST:
+    with open(path, "r") as f:
+        return ast.parse(f.read(), filename = path)
+
+
+def script_parser(script: str) -> argparse.ArgumentParser:
+    """
+    The parser simarglib would have for SCRIPT.
+    """
+    parser = _CheckingParser(prog = os.path.basename(script), add_help = False,
+                             conflict_handler = "resolve")
+    for path in script_sources(script):
+        for call in _add_argument_calls(_parse(path)):
+            _replay(parser, call)
+    return parser
+
+
+def simargs_argv(values: Dict[str, Any], parser: argparse.ArgumentParser) -> List[str]:
+    """Turn {dest: value} into command-line arguments for PARSER.
+    """
+    actions = {action.dest: action for action in parser._actions}
+    argv = []
+    for dest, value in values.items():
+        if dest not in actions:
+            raise ScriptArgsError(f"{parser.prog} has no simarg \"{dest}\"")
+        action = actions[dest]
+        flag = action.option_strings[0]
+        if isinstance(action, argparse._StoreTrueAction):
+            if value:
+                argv.append(flag)
+        else:
+            argv += [flag, str(value)]
+    return argv
+
+
+def resolve_simargs(parser: argparse.ArgumentParser, argv: List[str]) -> Dict[str, Any]:
+    """
+    Validate ARGV against PARSER and return the full argument table, with
+    defaults, as simarglib.parse() would.  Raises ScriptArgsError if any
+    value is of the wrong type, not one of the allowed choices, or a
+    required argument is missing.
+    """
+    return vars(parser.parse_args(argv))
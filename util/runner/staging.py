@@ -0,0 +1,142 @@
+"""
+Scratch-space staging of gem5 outdirs
+
+Dozens of gem5 jobs writing stats.txt, config.ini/json and checkpoints
+straight to the shared filesystem make for a lot of small NFS writes.
+With a scratch dir (tmpfs or a local SSD), the runner points each gem5
+job's --outdir at SCRATCH/NAME instead, and when the job ends copies the
+results to the real outdir from a pool of I/O threads, so a slow shared
+filesystem holds up neither the event loop nor the next job's cores.
+
+Each file is copied to a temporary name, read back and checked against
+the SHA-256 of the original before being renamed into place, and the
+digests are written to OUTDIR/SHA256SUMS (as sha256sum -c reads them).
+A copy that doesn't verify is retried; if it still fails, the scratch
+outdir is left where it is so nothing is lost.
+
+Optionally, files are gzipped on the way (as NAME.gz, except for those
+already compressed), in which case SHA256SUMS has the digests of the .gz
+files and the verification decompresses them.
+"""
+import asyncio
+import concurrent.futures
+import gzip
+import hashlib
+import os
+import shutil
+from typing import Optional, Tuple
+
+from util.runner.jobs import Job, split_gem5_command, with_gem5_outdir
+from util.runner.logs import log_basename
+
+# Attempts at copying a file before giving up on it
+FLUSH_ATTEMPTS = 3
+# Digests of the files copied, in the destination outdir
+MANIFEST_FILE = "SHA256SUMS"
+# Files not worth gzipping again
+_COMPRESSED = (".gz", ".bz2", ".xz", ".zst", ".zip")
+_BLOCK_SIZE = 1 << 20
+
+def _sha256(path: str, decompress: bool = False) -> str:
+    digest = hashlib.sha256()
+    with (gzip.open(path, "rb") if decompress else open(path, "rb")) as f:
+        while block := f.read(_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class OutdirStager:
+    def __init__(self, scratch_dir: str, max_workers: int = 4, compress: bool = False) -> None:
+        """
+        :param scratch_dir: Local directory for the jobs' outdirs.
+        :param max_workers: Most files copied to their outdirs at once.
+        :param compress: Gzip files as they're copied.
+        """
+        self._scratch_dir = os.path.abspath(scratch_dir)
+        self._compress = compress
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers = max_workers, thread_name_prefix = "flush")
+
+    def stageable(self, job: Job) -> bool:
+        return split_gem5_command(job.cmd)[0] is not None
+
+    def stage(self, job: Job, fresh: bool = True) -> Job:
+        """
+        A copy of JOB that writes to its own scratch outdir.  Unless
+        FRESH is false (e.g. resuming the job), anything left there by
+        an earlier run is removed first.
+        """
+        scratch = os.path.join(self._scratch_dir, log_basename(job.name))
+        if fresh:
+            shutil.rmtree(scratch, ignore_errors = True)
+        os.makedirs(scratch, exist_ok = True)
+        return Job(with_gem5_outdir(job.cmd, scratch), name = job.name, deps = job.deps,
+                   mem = job.mem, cores = job.cores, timeout = job.timeout,
+                   retries = job.retries, priority = job.priority, line = job.line,
+                   cwd = job.cwd, env = job.env)
+
+    def discard(self, staged: Job) -> None:
+        shutil.rmtree(staged.outdir, ignore_errors = True)
+
+    async def flush(self, staged: Job, job: Job) -> bool:
+        """
+        Copy the scratch outdir of STAGED to JOB's outdir, verifying
+        every file, and remove it.  Returns whether everything made it.
+        """
+        files = []
+        for root, _, names in os.walk(staged.outdir):
+            for name in names:
+                files.append(os.path.relpath(os.path.join(root, name), staged.outdir))
+        files.sort()
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*[
+            loop.run_in_executor(self._pool, self._copy, staged.outdir, job.outdir, name)
+            for name in files
+        ])
+
+        errors = [error for _, error in results if error]
+        if errors:
+            print(f"Could not copy {len(errors)} file(s) of {job.name} to {job.outdir} "
+                  f"({errors[0]}); the results are still in {staged.outdir}.")
+            return False
+        os.makedirs(job.outdir, exist_ok = True)
+        with open(os.path.join(job.outdir, MANIFEST_FILE), "w") as f:
+            for (stored, digest), _ in results:
+                f.write(f"{digest}  {stored}\n")
+        shutil.rmtree(staged.outdir, ignore_errors = True)
+        return True
+
+    def _copy(self, src_dir: str, dest_dir: str, name: str) -> Tuple[Optional[Tuple[str, str]], Optional[str]]:
+        """
+        Copy (and maybe gzip) one file; returns ((stored name, digest of
+        the stored file), None), or (None, why it failed).
+        """
+        src = os.path.join(src_dir, name)
+        compress = self._compress and not name.endswith(_COMPRESSED)
+        stored = f"{name}.gz" if compress else name
+        dest = os.path.join(dest_dir, stored)
+        tmp = f"{dest}.flush.tmp"
+        error = None
+        for _ in range(FLUSH_ATTEMPTS):
+            try:
+                os.makedirs(os.path.dirname(dest), exist_ok = True)
+                expected = _sha256(src)
+                if compress:
+                    with open(src, "rb") as fin, gzip.open(tmp, "wb") as fout:
+                        shutil.copyfileobj(fin, fout, _BLOCK_SIZE)
+                else:
+                    shutil.copyfile(src, tmp)
+                if _sha256(tmp, decompress = compress) != expected:
+                    error = f"{stored} did not verify"
+                    continue
+                digest = _sha256(tmp) if compress else expected
+                os.replace(tmp, dest)
+                return (stored, digest), None
+            except OSError as e:
+                error = str(e)
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return None, error
+
+    def close(self) -> None:
+        self._pool.shutdown(wait = True)
@@ -0,0 +1,160 @@
+"""
+Parameter sweeps over simargs, expanded lazily into runner jobs
+
+A sweep spec is a JSON file, e.g.
+
+    {
+      "command": "$GEM5_HOME/build/X86/gem5.opt --outdir={outdir} gem5-configs/fs_spec06gap_with_sampling.py",
+      "outdir": "results/{benchmark}/{llc_repl}-{l1d_size}",
+      "attributes": "timeout=12h retries=1",
+      "fixed": {"ff": 100, "warmup": 10, "roi": 10},
+      "grid": {"benchmark": ["mcf", "lbm"], "llc_repl": "*"},
+      "zip": {"l1d_size": ["32kB", "64kB"], "l1d_assoc": [8, 16]},
+      "sample": {"method": "lhs", "count": 8, "seed": 1,
+                 "params": {"nDelta": {"range": [1, 8]}, "l2_pref": "*"}}
+    }
+
+Keys are simarg names (the argparse dest, e.g. "l1d_size").  Every
+combination of the "grid" values is run; "zip" lists are stepped through
+together; "sample" draws COUNT random ("random") or Latin-hypercube
+("lhs") points, each param taking values from a list, a numeric
+{"range": [low, high]} (integer if both ends are), or "*" for all the
+choices the simarg was registered with ("*" works in "grid" too).  The
+three are combined as a cross product, and "fixed" args go on every job.
+
+Each point is validated against the config script's simarglib parser
+(see script_args.py) before it becomes a job.  Jobs get a unique outdir
+from the "outdir" template (default: sweep/ plus the varied values),
+substituted into the "{outdir}" of the command.
+"""
+import itertools
+import json
+import os
+import random
+import re
+import shlex
+from typing import Any, Dict, Iterator, List
+
+from util.runner.jobs import Job, parse_job_line, split_gem5_command
+from util.runner.script_args import (
+    ScriptArgsError, script_parser, simargs_argv, resolve_simargs
+)
+
+def _domain(parser, dest: str, values: Any) -> Any:
+    """Expand "*" to the simarg's registered choices.
+    """
+    if values != "*":
+        return values
+    for action in parser._actions:
+        if action.dest == dest:
+            if not action.choices:
+                raise ScriptArgsError(f"simarg \"{dest}\" has no registered choices for \"*\"")
+            return list(action.choices)
+    raise ScriptArgsError(f"{parser.prog} has no simarg \"{dest}\"")
+
+
+def _sample_points(spec: Dict[str, Any], parser) -> List[Dict[str, Any]]:
+    """Random or Latin-hypercube samples over the "sample" params.
+    """
+    count = spec.get("count", 1)
+    rng = random.Random(spec.get("seed"))
+    method = spec.get("method", "lhs")
+    if method not in ["lhs", "random"]:
+        raise ScriptArgsError(f"unknown sampling method \"{method}\"")
+
+    points = [{} for _ in range(count)]
+    for dest, values in spec.get("params", {}).items():
+        values = _domain(parser, dest, values)
+        if method == "lhs":
+            # one draw from each of COUNT equal strata, in random order
+            strata = list(range(count))
+            rng.shuffle(strata)
+            draws = [(stratum + rng.random()) / count for stratum in strata]
+        else:
+            draws = [rng.random() for _ in range(count)]
+
+        for point, u in zip(points, draws):
+            if isinstance(values, dict):
+                low, high = values["range"]
+                if isinstance(low, int) and isinstance(high, int):
+                    point[dest] = min(high, low + int(u * (high - low + 1)))
+                else:
+                    point[dest] = low + u * (high - low)
+            else:
+                point[dest] = values[min(len(values) - 1, int(u * len(values)))]
+    return points
+
+
+def expand_points(spec: Dict[str, Any], parser) -> Iterator[Dict[str, Any]]:
+    """Lazily generate the varied simarg values of every sweep point.
+    """
+    grid = spec.get("grid", {})
+    grid_axes = [
+        [(dest, value) for value in _domain(parser, dest, values)]
+        for dest, values in grid.items()
+    ]
+
+    zipped = spec.get("zip", {})
+    lengths = set(len(values) for values in zipped.values())
+    if len(lengths) > 1:
+        raise ScriptArgsError("all \"zip\" lists must be the same length")
+    zip_axis = [
+        dict(zip(zipped.keys(), values)) for values in zip(*zipped.values())
+    ] or [{}]
+
+    samples = _sample_points(spec["sample"], parser) if "sample" in spec else [{}]
+
+    for grid_point in itertools.product(*grid_axes):
+        for zip_point in zip_axis:
+            for sample_point in samples:
+                point = dict(grid_point)
+                point.update(zip_point)
+                point.update(sample_point)
+                yield point
+
+
+def _outdir_name(point: Dict[str, Any]) -> str:
+    parts = [f"{dest}-{value}" for dest, value in point.items()]
+    return re.sub(r"[^\w.=+-]", "_", "_".join(parts)) or "run"
+
+
+def sweep_jobs(spec: Dict[str, Any]) -> Iterator[Job]:
+    """Lazily generate one validated job per point of a sweep spec.
+    """
+    command = spec["command"]
+    script, _ = split_gem5_command(command)
+    if script is None:
+        raise ScriptArgsError("sweep \"command\" must run a .py config script")
+    parser = script_parser(os.path.expandvars(script))
+    fixed = spec.get("fixed", {})
+    template = spec.get("outdir")
+    attributes = spec.get("attributes", "")
+
+    outdirs = set()
+    for num, point in enumerate(expand_points(spec, parser)):
+        values = dict(fixed)
+        values.update(point)
+        argv = simargs_argv(values, parser)
+        try:
+            resolve_simargs(parser, argv)
+        except ScriptArgsError as e:
+            raise ScriptArgsError(f"sweep point {point}: {e}")
+
+        if template:
+            outdir = template.format(**values)
+        else:
+            outdir = os.path.join("sweep", _outdir_name(point))
+        if outdir in outdirs:
+            # e.g. random samples that landed on the same values
+            outdir = f"{outdir}.{num}"
+        outdirs.add(outdir)
+
+        cmd = command.replace("{outdir}", outdir) + " " + " ".join(shlex.quote(arg) for arg in argv)
+        name = re.sub(r"[^\w.-]", "_", outdir)
+        yield parse_job_line(f"@{name} {attributes}: {cmd}", line = num + 1)
+
+
+def read_sweep_file(file: str) -> Iterator[Job]:
+    with open(file, "r") as f:
+        spec = json.load(f)
+    yield from sweep_jobs(spec)
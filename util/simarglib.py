@@ -2,11 +2,19 @@
 Library implementing shared argparsing between modules, with each
 module able to add its own argument group.  If arguments conflict,
 bad things will happen.  No attempt is made to fix this! :-)
+
+The parsed args, and the component classes the config script chose (see
+record_component()), are saved to simargs.json in gem5's outdir, so
+results can be matched up with what produced them (see
+util/stats/index.py).
 Based on: https://www.doc.ic.ac.uk/~nuric/coding/
 argparse-with-multiple-files-to-handle-configuration-in-python.html
 """
 import argparse
-from typing import Dict, Any
+import json
+import os
+import sys
+from typing import Dict, Any, Optional
 
 # Global parser
 parser = argparse.ArgumentParser("Gem5 Simulation Arguments")
@@ -14,6 +22,12 @@ parser = argparse.ArgumentParser("Gem5 Simulation Arguments")
 # Global table of parsed args
 args: Dict[str, Any] = {}
 
+# Component classes chosen by the config script, e.g. "processor"
+components: Dict[str, str] = {}
+
+# Written to gem5's outdir
+SAVE_FILE = "simargs.json"
+
 def add_parser(group_name: str, description: str = ""):
     """ Add a module's argument group and return the group """
     return parser.add_argument_group(group_name, description)
@@ -21,11 +35,40 @@ def add_parser(group_name: str, description: str = ""):
 def parse() -> Dict[str, Any]:
     """ Parse all collected arguments """
     args.update(vars(parser.parse_args()))
+    save()
     return args
 
 def get(key: str):
     return args.get(key)
 
+def record_component(role: str, component) -> None:
+    """ Note the class (or name) of the component used for ROLE """
+    if isinstance(component, str):
+        components[role] = component
+    else:
+        cls = component if isinstance(component, type) else type(component)
+        components[role] = cls.__name__
+    save()
+
+def save(outdir: Optional[str] = None) -> None:
+    """ Write the args and components to OUTDIR/simargs.json
+    (default: gem5's outdir; nothing outside gem5) """
+    if outdir is None:
+        try:
+            import m5
+            outdir = m5.options.outdir
+        except (ImportError, AttributeError):
+            return
+    os.makedirs(outdir, exist_ok=True)
+    path = os.path.join(outdir, SAVE_FILE)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump({
+            "script": os.path.basename(sys.argv[0]),
+            "args": args,
+            "components": components
+        }, f, indent=1, default=str)
+    os.replace(f"{path}.tmp", path)
+
 def set_component_parameters(component, params: dict, parent_name: str = ""):
     for param in params:
         prefix = f'[{parent_name}] ' if parent_name else ''
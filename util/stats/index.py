@@ -0,0 +1,230 @@
+"""
+SQLite index of experiments: simargs joined with results
+
+Each gem5 run saves its resolved simarglib table and component classes
+to OUTDIR/simargs.json (see util/simarglib.py).  ExperimentIndex adds an
+outdir to a SQLite database as a row of runs, plus one row per simarg
+(params), per component (components), and per summary stat (results:
+the total and the mean over the dumps of stats.txt, so per-ROI stats of
+sampled runs are summarized too).  It can also record where the run's
+full stats are in a columnar store (see store.py).  A sampled run with
+several switch variants (see SamplingManager) is one run per variant,
+OUTDIR:VARIANT, with a switch_variant param and the variant's CPU
+parameters as params too.
+
+The tables are indexed by name and value, so comparing configurations
+is one query rather than a crawl of outdirs, e.g. with compare():
+
+    index = ExperimentIndex("experiments.db")
+    index.compare("*.core.ipc", ["llc_repl", "l2_pref"])
+
+is the geomean IPC (over the runs, i.e. benchmarks, of each group) of
+every llc_repl x l2_pref combination:
+
+    SELECT p0.value, p1.value, geomean(r.value), count(*) FROM runs
+    JOIN params p0 ON p0.run_id = runs.id AND p0.name = 'llc_repl'
+    JOIN params p1 ON p1.run_id = runs.id AND p1.name = 'l2_pref'
+    JOIN (SELECT run_id, avg(mean) AS value FROM results
+          WHERE name GLOB '*.core.ipc' GROUP BY run_id) r ON r.run_id = runs.id
+    GROUP BY p0.value, p1.value
+
+(geomean() is available in any query made through query().)  Values of
+simargs are stored as text: strings as they are, anything else as JSON.
+"""
+import json
+import math
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from util.stats.reader import StatsFile
+from util.stats.store import outdir_stats_files, stats_variant
+
+SIMARGS_FILE = "simargs.json"
+# Stats summarized into the results table
+SUMMARY_STATS = [
+    "simInsts", "simTicks", "simSeconds", "hostSeconds",
+    "*.core.ipc", "*.core.cpi", "*.core.numCycles", "*.core.committedInsts",
+    "*.overallMisses::total", "*.overallMissRate::total",
+]
+AGGREGATES = ["geomean", "avg", "min", "max", "sum", "count"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    outdir TEXT UNIQUE NOT NULL,
+    script TEXT,
+    indexed REAL,
+    dumps INTEGER,
+    store TEXT,
+    store_run INTEGER
+);
+CREATE TABLE IF NOT EXISTS params (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS components (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    class TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    total REAL,
+    mean REAL
+);
+CREATE INDEX IF NOT EXISTS params_by_name ON params(name, value, run_id);
+CREATE INDEX IF NOT EXISTS components_by_role ON components(role, class, run_id);
+CREATE INDEX IF NOT EXISTS results_by_name ON results(name, run_id);
+"""
+
+class _GeoMean:
+    def __init__(self) -> None:
+        self._log_sum = 0.0
+        self._count = 0
+        self._valid = True
+
+    def step(self, value: Optional[float]) -> None:
+        if value is None:
+            return
+        if value <= 0:
+            self._valid = False
+            return
+        self._log_sum += math.log(value)
+        self._count += 1
+
+    def finalize(self) -> Optional[float]:
+        if not self._valid or not self._count:
+            return None
+        return math.exp(self._log_sum / self._count)
+
+
+def _text(value: Any) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+def _variant_params(variants_path: Optional[str], variant: str) -> dict:
+    """The CPU parameters of VARIANT in the --switch_variants file (if
+    it's still there)."""
+    try:
+        with open(variants_path, "r") as f:
+            return json.load(f).get(variant, {})
+    except (TypeError, OSError, ValueError):
+        return {}
+
+
+def _summary(stats_path: str, patterns: Sequence[str]) -> Tuple[int, List[Tuple[str, float, float]]]:
+    """
+    Number of dumps in STATS_PATH, and (name, total, mean) over the dumps
+    of each stat matching PATTERNS (skipping nan).
+    """
+    with StatsFile(stats_path) as stats:
+        series = stats.series(patterns)
+        num_dumps = len(stats)
+    results = []
+    for name, values in series.items():
+        values = [value for value in values if value is not None and not math.isnan(value)]
+        if values:
+            results.append((name, sum(values), sum(values) / len(values)))
+    return num_dumps, results
+
+
+class ExperimentIndex:
+    def __init__(self, db_path: str) -> None:
+        self._conn = sqlite3.connect(db_path, timeout = 60)
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        self._conn.executescript(_SCHEMA)
+        self._conn.create_aggregate("geomean", 1, _GeoMean)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def add(self, outdir: str, summary: Sequence[str] = SUMMARY_STATS,
+            store: Optional[str] = None, store_runs: Optional[Dict[str, int]] = None) -> bool:
+        """
+        Index (or re-index) the run(s) in OUTDIR, with the total/mean of
+        the stats matching SUMMARY, and where its full stats are in STORE
+        if they are there (STORE_RUNS: run index of each stats file path
+        in the store).  Returns False if OUTDIR has no simargs.json.
+        """
+        outdir = os.path.abspath(outdir)
+        try:
+            with open(os.path.join(outdir, SIMARGS_FILE), "r") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return False
+        stats_files = outdir_stats_files(outdir)
+        if not stats_files:
+            self._add(outdir, saved, saved.get("args", {}), 0, [], None, None)
+        for path in stats_files:
+            store_run = (store_runs or {}).get(path)
+            variant = stats_variant(path)
+            args = dict(saved.get("args", {}))
+            if variant:
+                args["switch_variant"] = variant
+                args.update(_variant_params(args.get("switch_variants"), variant))
+            num_dumps, results = _summary(path, summary)
+            self._add(f"{outdir}:{variant}" if variant else outdir, saved, args,
+                      num_dumps, results, store if store_run is not None else None, store_run)
+        return True
+
+    def _add(self, outdir: str, saved: dict, args: dict, num_dumps: int,
+             results: List[Tuple[str, float, float]], store: Optional[str],
+             store_run: Optional[int]) -> None:
+        with self._conn:
+            self._conn.execute("DELETE FROM runs WHERE outdir = ?", (outdir,))
+            run_id = self._conn.execute(
+                "INSERT INTO runs (outdir, script, indexed, dumps, store, store_run) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (outdir, saved.get("script"), time.time(), num_dumps,
+                 os.path.abspath(store) if store else None, store_run)
+            ).lastrowid
+            self._conn.executemany(
+                "INSERT INTO params VALUES (?, ?, ?)",
+                [(run_id, name, _text(value)) for name, value in args.items()]
+            )
+            self._conn.executemany(
+                "INSERT INTO components VALUES (?, ?, ?)",
+                [(run_id, role, cls) for role, cls in saved.get("components", {}).items()]
+            )
+            self._conn.executemany(
+                "INSERT INTO results VALUES (?, ?, ?, ?)",
+                [(run_id, name, total, mean) for name, total, mean in results]
+            )
+
+    def query(self, sql: str, params: Iterable[Any] = ()) -> List[tuple]:
+        return self._conn.execute(sql, tuple(params)).fetchall()
+
+    def compare(self, metric: str, by: Sequence[str], aggregate: str = "geomean",
+                where: Optional[dict] = None) -> List[tuple]:
+        """
+        AGGREGATE of METRIC (a stat name or GLOB pattern; the mean over
+        the dumps, averaged over the stats it matches in a run) over the
+        runs of each combination of the simargs BY, among the runs whose
+        simargs match WHERE.  Rows are (*values of BY, aggregate, runs).
+        """
+        if aggregate not in AGGREGATES:
+            raise ValueError(f"Unknown aggregate {aggregate} (choose from {', '.join(AGGREGATES)})")
+        joins = []
+        params: List[Any] = []
+        for i, name in enumerate(by):
+            joins.append(f"JOIN params p{i} ON p{i}.run_id = runs.id AND p{i}.name = ?")
+            params.append(name)
+        for i, (name, value) in enumerate((where or {}).items()):
+            joins.append(f"JOIN params w{i} ON w{i}.run_id = runs.id AND w{i}.name = ? AND w{i}.value IS ?")
+            params += [name, _text(value)]
+        params.append(metric)
+        groups = ", ".join(f"p{i}.value" for i in range(len(by)))
+        sql = (
+            f"SELECT {groups + ', ' if by else ''}{aggregate}(r.value), count(*) FROM runs "
+            + " ".join(joins)
+            + " JOIN (SELECT run_id, avg(mean) AS value FROM results WHERE name GLOB ? "
+              "GROUP BY run_id) r ON r.run_id = runs.id"
+            + (f" GROUP BY {groups} ORDER BY {groups}" if by else "")
+        )
+        return self.query(sql, params)
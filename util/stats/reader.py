@@ -0,0 +1,209 @@
+"""
+Indexed, lazy reader for gem5 stats.txt files
+
+A sampled run dumps its stats once per ROI, so its stats.txt holds
+hundreds of dumps of tens of thousands of lines each.  Rather than
+parsing all of it, StatsFile memory-maps the file, finds where each
+"Begin/End Simulation Statistics" block starts and ends in one pass, and
+only parses the dumps and stats asked for:
+
+    with StatsFile("m5out/stats.txt") as stats:
+        len(stats)                                   # number of dumps
+        stats.get("system.processor.cores.core.ipc", 3)
+        stats.dump(-1, ["simInsts", "system.cpu*.numCycles"])
+        stats.series(["simInsts", "simTicks"])       # across all dumps
+
+Stat names may be exact or glob patterns (fnmatch).  Exact names are
+found with a substring search of the dump, without splitting it into
+lines.  Values are floats (nan for gem5's nan/-nan), distributions'
+buckets are stats of their own ("name::total", "name::0-1", ...).
+
+The offsets found are saved next to the file (stats.txt.index.json) and
+reused as long as the file hasn't changed; a file that has only grown
+(a simulation that's still running) is scanned from its last complete
+dump.  Gzipped files (stats.txt.gz) are decompressed into memory first.
+"""
+import fnmatch
+import gzip
+import json
+import mmap
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+BEGIN_MARKER = b"---------- Begin Simulation Statistics ----------"
+END_MARKER = b"---------- End Simulation Statistics   ----------"
+# Bump when the index format changes
+INDEX_VERSION = 1
+
+def index_path(path: str) -> str:
+    return f"{path}.index.json"
+
+
+def _value(token: bytes) -> Optional[float]:
+    try:
+        return float(token)
+    except ValueError:
+        # gem5 prints -nan, nan%, ...
+        if token.lstrip(b"-").startswith(b"nan"):
+            return float("nan")
+        return None
+
+
+class StatsFile:
+    def __init__(self, path: str, save_index: bool = True) -> None:
+        """
+        :param path: The stats.txt (or stats.txt.gz) to read.
+        :param save_index: Save the offsets found next to the file, for
+        the next reader (skipped if the directory isn't writable).
+        """
+        self.path = path
+        self._save_index = save_index
+        self._file = None
+        if path.endswith(".gz"):
+            with gzip.open(path, "rb") as f:
+                self._data = f.read()
+        else:
+            self._file = open(path, "rb")
+            size = os.fstat(self._file.fileno()).st_size
+            self._data = mmap.mmap(self._file.fileno(), 0, access = mmap.ACCESS_READ) if size else b""
+        # (start, end) of each dump's lines, and where scanning stopped
+        self._dumps: List[Tuple[int, int]] = []
+        self._scanned = 0
+        self._index()
+
+    def __enter__(self) -> "StatsFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        if self._file:
+            self._file.close()
+
+    def __len__(self) -> int:
+        return len(self._dumps)
+
+    def _stamp(self) -> Dict[str, int]:
+        st = os.stat(self.path)
+        return dict(size = st.st_size, mtime_ns = st.st_mtime_ns)
+
+    def _index(self) -> None:
+        stamp = self._stamp()
+        try:
+            with open(index_path(self.path), "r") as f:
+                saved = json.load(f)
+            if saved["version"] == INDEX_VERSION:
+                if saved["stamp"] == stamp:
+                    self._dumps = [tuple(dump) for dump in saved["dumps"]]
+                    self._scanned = saved["scanned"]
+                    return
+                if not self.path.endswith(".gz") and saved["stamp"]["size"] < stamp["size"]:
+                    # (only appended to, we hope: the last dump must still be there)
+                    dumps = [tuple(dump) for dump in saved["dumps"]]
+                    if not dumps or self._data[dumps[-1][1]:dumps[-1][1] + len(END_MARKER)] == END_MARKER:
+                        self._dumps = dumps
+                        self._scanned = saved["scanned"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+        self._scan()
+        self._write_index(stamp)
+
+    def _scan(self) -> None:
+        data = self._data
+        pos = self._scanned
+        while True:
+            begin = data.find(BEGIN_MARKER, pos)
+            if begin < 0:
+                break
+            start = data.find(b"\n", begin) + 1
+            end = data.find(END_MARKER, start)
+            if start == 0 or end < 0:
+                # the dump being written
+                break
+            self._dumps.append((start, end))
+            pos = end + len(END_MARKER)
+        self._scanned = pos
+
+    def _write_index(self, stamp: Dict[str, int]) -> None:
+        if not self._save_index:
+            return
+        path = index_path(self.path)
+        try:
+            with open(f"{path}.tmp", "w") as f:
+                json.dump(dict(version = INDEX_VERSION, stamp = stamp, scanned = self._scanned,
+                               dumps = self._dumps), f)
+            os.replace(f"{path}.tmp", path)
+        except OSError:
+            pass
+
+    def raw(self, dump: int) -> str:
+        """The text of DUMP (negative counts from the end).
+        """
+        start, end = self._dumps[dump]
+        return self._data[start:end].decode()
+
+    def _lines(self, start: int, end: int) -> Iterable[Tuple[bytes, bytes]]:
+        for line in self._data[start:end].split(b"\n"):
+            fields = line.split(None, 2)
+            if len(fields) >= 2:
+                yield fields[0], fields[1]
+
+    def _find(self, name: bytes, start: int, end: int) -> Optional[float]:
+        pos = start - 1
+        while True:
+            # (the name starts a line, and is followed by spaces)
+            pos = self._data.find(name, pos + 1, end)
+            if pos < 0:
+                return None
+            if (pos == start or self._data[pos - 1:pos] == b"\n") \
+                    and self._data[pos + len(name):pos + len(name) + 1] in (b" ", b"\t"):
+                break
+        line_end = self._data.find(b"\n", pos, end)
+        fields = self._data[pos:line_end if line_end >= 0 else end].split(None, 2)
+        return _value(fields[1]) if len(fields) >= 2 else None
+
+    def dump(self, dump: int, names: Optional[Iterable[str]] = None) -> Dict[str, Optional[float]]:
+        """
+        The stats of DUMP (negative counts from the end), or only those
+        matching NAMES.  Stats asked for by exact name that aren't in the
+        dump are None.
+        """
+        start, end = self._dumps[dump]
+        if names is None:
+            return {name.decode(): _value(value) for name, value in self._lines(start, end)}
+
+        stats = {}
+        patterns = []
+        for name in names:
+            if any(c in name for c in "*?["):
+                patterns.append(name)
+            else:
+                stats[name] = self._find(name.encode(), start, end)
+        if patterns:
+            for name, value in self._lines(start, end):
+                name = name.decode()
+                if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns):
+                    stats[name] = _value(value)
+        return stats
+
+    def get(self, name: str, dump: int = -1) -> Optional[float]:
+        """A single stat of DUMP (default: the last), or None.
+        """
+        start, end = self._dumps[dump]
+        return self._find(name.encode(), start, end)
+
+    def series(self, names: Iterable[str], dumps: Optional[Iterable[int]] = None) -> Dict[str, List[Optional[float]]]:
+        """
+        Stats matching NAMES in each of DUMPS (default: all of them), as
+        name -> one value per dump (None where a dump doesn't have it).
+        """
+        dumps = range(len(self)) if dumps is None else list(dumps)
+        series: Dict[str, List[Optional[float]]] = {}
+        for i, dump in enumerate(dumps):
+            for name, value in self.dump(dump, names).items():
+                series.setdefault(name, [None] * len(dumps))[i] = value
+        return series
@@ -0,0 +1,209 @@
+"""
+Whole-program estimates from sampled runs
+
+SamplingManager runs SMARTS-style systematic sampling: every ROI is a
+sample of the program, and its stats dump (instructions, cycles, misses)
+is one observation.  A whole-program metric that is a ratio of counts,
+like CPI (cycles/insts) or MPKI (1000 * misses/insts), is estimated by
+the ratio of the sums over the samples, with the variance of a ratio
+estimator, so a shorter last ROI is weighted correctly:
+
+    R = sum(y) / sum(x)
+    d_i = y_i - R * x_i
+    CV = stdev(d) / (R * mean(x))         (= CV of per-ROI CPI if ROIs are equal)
+    relative error = z * CV / sqrt(n)     (z for the confidence level)
+    samples needed for error e = (z * CV / e)^2
+
+Everything is vectorized over a leading axis of runs: the inputs are
+runs x samples arrays, padded with nan (e.g. from a whole sweep in a
+columnar store, see samples_from_store()).  The counts must be ones that
+m5.stats.reset() zeroes, like the cores' committedInsts, so each dump
+counts only its own ROI (simInsts is cumulative).  Samples with no
+instructions (e.g. gem5's final dump, right after a reset) are ignored.
+
+Samples that stand for unequal shares of the program (SimPoints, each
+weighted by the size of its phase) are combined by weighted_estimate()
+instead: the weighted mean of each sample's own ratio,
+
+    R = sum(w_i * y_i / x_i) / sum(w_i)
+
+(with the weights of missing samples left out), which has no confidence
+interval: the points are representatives, not a random sample.
+"""
+from statistics import NormalDist
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from util.stats.reader import StatsFile
+from util.stats.store import StatsStore
+
+# Default stats for the counts in each sample (reset with each dump)
+INSTS_STAT = "*.core.committedInsts"
+CYCLES_STAT = "*.core.numCycles"
+
+def sample_stats(events: Sequence[str] = (), insts: str = INSTS_STAT,
+                 cycles: str = CYCLES_STAT) -> Tuple[Dict[str, str], List[str]]:
+    """
+    The stats of each sample to read (see samples_from_stats()): INSTS,
+    CYCLES and those of EVENTS, each given as NAME=STAT (or glob).
+    Returns them, keyed by insts, cycles and the NAMEs, and the NAMEs.
+    """
+    stats = {"insts": insts, "cycles": cycles}
+    for event in events:
+        name, sep, pattern = event.partition("=")
+        if not sep or not name or name in stats:
+            raise ValueError(f"{event}: expected NAME=STAT, with a new NAME")
+        stats[name] = pattern
+    return stats, list(stats)[2:]
+
+
+def z_score(confidence: float) -> float:
+    """The two-sided standard normal quantile for CONFIDENCE, e.g. 1.96 for 0.95.
+    """
+    if not 0 < confidence < 1:
+        raise ValueError(f"Confidence level must be between 0 and 1, not {confidence}")
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def ratio_estimate(y: np.ndarray, x: np.ndarray, confidence: float = 0.95,
+                   scale: float = 1.0) -> Dict[str, np.ndarray]:
+    """
+    Estimate SCALE * sum(Y) / sum(X) from the samples along the last axis
+    of Y and X (nan: no sample).  Returns arrays over the leading axes:
+    estimate, half_width (of the confidence interval), rel_error
+    (half_width / estimate), cv, and n (number of samples).  Runs with
+    fewer than two samples have nan for everything but the estimate.
+    """
+    y = np.asarray(y, dtype = float)
+    x = np.asarray(x, dtype = float)
+    valid = ~(np.isnan(y) | np.isnan(x)) & (x > 0)
+    y = np.where(valid, y, 0.0)
+    x = np.where(valid, x, 0.0)
+    n = valid.sum(axis = -1)
+
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        ratio = y.sum(axis = -1) / x.sum(axis = -1)
+        resid = np.where(valid, y - ratio[..., None] * x, 0.0)
+        var = (resid ** 2).sum(axis = -1) / (n - 1)
+        mean_x = x.sum(axis = -1) / n
+        cv = np.sqrt(var) / (ratio * mean_x)
+        cv = np.where(n > 1, cv, np.nan)
+        rel_error = z_score(confidence) * cv / np.sqrt(n)
+    estimate = scale * ratio
+    return dict(
+        estimate = estimate,
+        half_width = rel_error * np.abs(estimate),
+        rel_error = rel_error,
+        cv = cv,
+        n = n,
+    )
+
+
+def required_samples(cv: np.ndarray, rel_error: float, confidence: float = 0.95) -> np.ndarray:
+    """Samples needed for a relative error of REL_ERROR at CONFIDENCE,
+    given the CV of the metric (nan where the CV is unknown).
+    """
+    with np.errstate(invalid = "ignore"):
+        return np.ceil((z_score(confidence) * np.asarray(cv, dtype = float) / rel_error) ** 2)
+
+
+def samples_from_stats(paths: Sequence[str], stats: Dict[str, str]) -> Dict[str, np.ndarray]:
+    """
+    For each stat of STATS (key -> stat name or glob, matching stats
+    summed), a runs x samples array of its value in each dump of the
+    stats files PATHS.
+    """
+    per_run: List[Dict[str, np.ndarray]] = []
+    for path in paths:
+        with StatsFile(path) as stats_file:
+            run = {}
+            for key, pattern in stats.items():
+                series = stats_file.series([pattern])
+                # (None -> nan)
+                values = np.array(list(series.values()), dtype = float)
+                run[key] = _sum_matches(values) if series else np.full(len(stats_file), np.nan)
+            per_run.append(run)
+    width = max((len(run[key]) for run in per_run for key in run), default = 0)
+    arrays = {}
+    for key in stats:
+        arrays[key] = np.full((len(per_run), width), np.nan)
+        for i, run in enumerate(per_run):
+            arrays[key][i, :len(run[key])] = run[key]
+    return arrays
+
+
+def samples_from_store(store: StatsStore, stats: Dict[str, str],
+                       rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    As samples_from_stats(), for the runs of a columnar store (only those
+    with ROWS, a mask, if given).  Returns the indices of the runs (into
+    store.runs) and the arrays.
+    """
+    mask = np.ones(len(store), dtype = bool) if rows is None else rows
+    runs, run_rows = np.unique(store.run[mask], return_inverse = True)
+    width = int(store.dump[mask].max(initial = -1)) + 1
+    arrays = {}
+    for key, pattern in stats.items():
+        names, values = store.array(pattern)
+        values = _sum_matches(values[mask].T) if names else np.full(mask.sum(), np.nan)
+        array = np.full((len(runs), width), np.nan)
+        array[run_rows, store.dump[mask]] = values
+        arrays[key] = array
+    return runs, arrays
+
+
+def _sum_matches(values: np.ndarray) -> np.ndarray:
+    # sum over the stats (rows) matching a pattern, nan only if all are
+    all_nan = np.all(np.isnan(values), axis = 0)
+    return np.where(all_nan, np.nan, np.nansum(values, axis = 0))
+
+
+def weighted_estimate(y: np.ndarray, x: np.ndarray, weights: np.ndarray,
+                      scale: float = 1.0) -> Dict[str, np.ndarray]:
+    """
+    As ratio_estimate(), but the weighted mean of the per-sample ratios
+    SCALE * Y / X, with WEIGHTS along the last axis.  Returns the same
+    keys, plus weight (the total weight of the samples present); the
+    error terms are nan.
+    """
+    y = np.asarray(y, dtype = float)
+    x = np.asarray(x, dtype = float)
+    weights = np.broadcast_to(np.asarray(weights, dtype = float), y.shape)
+    valid = ~(np.isnan(y) | np.isnan(x)) & (x > 0)
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        ratio = np.where(valid, y / np.where(valid, x, 1.0), 0.0)
+        weight = np.where(valid, weights, 0.0).sum(axis = -1)
+        estimate = scale * (ratio * np.where(valid, weights, 0.0)).sum(axis = -1) / weight
+    nan = np.full(estimate.shape, np.nan)
+    return dict(
+        estimate = estimate,
+        half_width = nan,
+        rel_error = nan,
+        cv = nan,
+        n = valid.sum(axis = -1),
+        weight = weight,
+    )
+
+
+def estimate_metrics(samples: Dict[str, np.ndarray], events: Sequence[str] = (),
+                     confidence: float = 0.95,
+                     weights: Optional[np.ndarray] = None) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    CPI, IPC and the MPKI of each of EVENTS (keys of SAMPLES) from runs x
+    samples arrays with "insts" and "cycles" (see ratio_estimate(), or
+    weighted_estimate() if WEIGHTS of the samples are given).
+    """
+    def estimate(y, x, scale = 1.0):
+        if weights is None:
+            return ratio_estimate(y, x, confidence, scale)
+        return weighted_estimate(y, x, weights, scale)
+
+    insts = samples["insts"]
+    metrics = {
+        "cpi": estimate(samples["cycles"], insts),
+        "ipc": estimate(insts, samples["cycles"]),
+    }
+    for event in events:
+        metrics[f"{event}_mpki"] = estimate(samples[event], insts, scale = 1000)
+    return metrics
@@ -0,0 +1,200 @@
+"""
+SimPoint analysis: pick representative intervals from basic-block vectors
+
+BBVProfileManager (util/event_managers/bbv_profile_manager.py) has gem5's
+SimPoint probe write one basic-block vector per interval of committed
+instructions to OUTDIR/simpoint.bb.gz, one line per interval:
+
+    T:12:3450 :17:88 :230:1200 ...        (:bb_id:insts_in_bb ...)
+
+pick_simpoints() then follows SimPoint 3.0:
+  - keep the intervals inside the benchmark's ROI, normalize each BBV to
+    sum to 1 and randomly project them down to DIMS dimensions,
+  - run k-means (k-means++ seeding, best of several seeds) for each k up
+    to MAX_K and score each clustering with the BIC,
+  - choose the smallest k whose BIC is within THRESHOLD of the best
+    (relative to the range of scores seen),
+  - represent each cluster by the interval closest to its centroid,
+    weighted by the fraction of the intervals in the cluster.
+
+pick_simpoints.py writes the result to a JSON file, which
+SimPointCheckpointManager reads to checkpoint only those intervals.
+"""
+import gzip
+import json
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+BBV_FILE = "simpoint.bb.gz"
+# Written next to the BBVs by BBVProfileManager
+PROFILE_FILE = "bbv_profile.json"
+# As SimPoint 3.0
+DEFAULT_DIMS = 15
+DEFAULT_MAX_K = 30
+DEFAULT_THRESHOLD = 0.9
+
+def read_bbv(path: str) -> List[Dict[int, int]]:
+    """The basic-block vectors in PATH (gzipped or not), one per interval.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    bbvs = []
+    with opener(path, "rt") as f:
+        for line in f:
+            line = line.strip()
+            if not line.startswith("T"):
+                continue
+            bbv = {}
+            for entry in line[1:].split():
+                _, bb, count = entry.split(":")
+                bbv[int(bb)] = int(count)
+            bbvs.append(bbv)
+    return bbvs
+
+
+def project(bbvs: List[Dict[int, int]], dims: int = DEFAULT_DIMS, seed: int = 0) -> np.ndarray:
+    """
+    The normalized BBVS randomly projected to DIMS dimensions (intervals x
+    DIMS), each basic block getting a random direction in [-1, 1)^DIMS.
+    """
+    rng = np.random.default_rng(seed)
+    blocks = sorted({bb for bbv in bbvs for bb in bbv})
+    directions = dict(zip(blocks, rng.uniform(-1, 1, (len(blocks), dims))))
+    points = np.zeros((len(bbvs), dims))
+    for i, bbv in enumerate(bbvs):
+        total = sum(bbv.values())
+        for bb, count in bbv.items():
+            points[i] += (count / total) * directions[bb]
+    return points
+
+
+def _sq_distances(points: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    return ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis = -1)
+
+
+def kmeans(points: np.ndarray, k: int, seed: int = 0, n_init: int = 5,
+           max_iter: int = 100) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The best (least squared error) of N_INIT k-means runs on POINTS, as
+    (centers, label of each point).
+    """
+    rng = np.random.default_rng(seed)
+    best = None
+    for _ in range(n_init):
+        # k-means++ seeding
+        centers = [points[rng.integers(len(points))]]
+        for _ in range(1, k):
+            dist = _sq_distances(points, np.array(centers)).min(axis = 1)
+            if dist.sum() == 0:
+                centers.append(points[rng.integers(len(points))])
+            else:
+                centers.append(points[rng.choice(len(points), p = dist / dist.sum())])
+        centers = np.array(centers)
+
+        for _ in range(max_iter):
+            labels = _sq_distances(points, centers).argmin(axis = 1)
+            moved = np.array([
+                points[labels == c].mean(axis = 0) if np.any(labels == c) else centers[c]
+                for c in range(k)
+            ])
+            if np.allclose(moved, centers):
+                break
+            centers = moved
+        labels = _sq_distances(points, centers).argmin(axis = 1)
+        error = ((points - centers[labels]) ** 2).sum()
+        if best is None or error < best[0]:
+            best = (error, centers, labels)
+    return best[1], best[2]
+
+
+def bic(points: np.ndarray, centers: np.ndarray, labels: np.ndarray) -> float:
+    """The Bayesian information criterion of a clustering (Pelleg and
+    Moore's spherical Gaussian model, as SimPoint uses).
+    """
+    num, dims = points.shape
+    k = len(centers)
+    if num <= k:
+        return -math.inf
+    # per-dimension variance, shared by all clusters
+    variance = ((points - centers[labels]) ** 2).sum() / (dims * (num - k))
+    # (identical points: every clustering fits perfectly)
+    variance = max(variance, 1e-300)
+    loglik = 0.0
+    for c in range(k):
+        size = np.count_nonzero(labels == c)
+        if size == 0:
+            continue
+        loglik += (size * math.log(size) - size * math.log(num)
+                   - size * dims / 2 * math.log(2 * math.pi * variance)
+                   - dims * (size - 1) / 2)
+    params = (k - 1) + dims * k + 1
+    return loglik - params / 2 * math.log(num)
+
+
+def pick_simpoints(bbvs: List[Dict[int, int]], max_k: int = DEFAULT_MAX_K,
+                   dims: int = DEFAULT_DIMS, threshold: float = DEFAULT_THRESHOLD,
+                   seed: int = 0, first: int = 0) -> dict:
+    """
+    Pick the simulation points of BBVS (the intervals to consider, the
+    first of which is interval FIRST of the run).  Returns a dict with
+    k, the BIC of each k tried, and simpoints: [{"interval", "weight",
+    "cluster"}] sorted by interval.
+    """
+    if not bbvs:
+        raise ValueError("No intervals to pick simulation points from")
+    points = project(bbvs, dims, seed)
+    scores = []
+    clusterings = []
+    for k in range(1, min(max_k, len(bbvs)) + 1):
+        centers, labels = kmeans(points, k, seed)
+        clusterings.append((centers, labels))
+        scores.append(bic(points, centers, labels))
+
+    finite = [score for score in scores if math.isfinite(score)]
+    low, high = min(finite), max(finite)
+    chosen = next(i for i, score in enumerate(scores)
+                  if math.isfinite(score) and score >= low + threshold * (high - low))
+    centers, labels = clusterings[chosen]
+
+    simpoints = []
+    for c in range(len(centers)):
+        members = np.flatnonzero(labels == c)
+        if len(members) == 0:
+            continue
+        closest = members[_sq_distances(points[members], centers[c:c + 1])[:, 0].argmin()]
+        simpoints.append(dict(interval = int(closest) + first, cluster = c,
+                              weight = len(members) / len(bbvs)))
+    simpoints.sort(key = lambda simpoint: simpoint["interval"])
+    return dict(k = len(simpoints), bic = scores, simpoints = simpoints)
+
+
+def roi_intervals(num_intervals: int, interval: int, roi_start: int,
+                  roi_end: Optional[int]) -> Tuple[int, int]:
+    """
+    The range [first, last) of the intervals (of INTERVAL instructions,
+    counted from the start of the run) that lie entirely inside the ROI
+    between instruction counts ROI_START and ROI_END (None: the end).
+    """
+    first = -(-roi_start // interval)
+    last = num_intervals if roi_end is None else min(num_intervals, roi_end // interval)
+    return first, max(first, last)
+
+
+def simpoints_from_profile(outdir: str, **options) -> dict:
+    """
+    pick_simpoints() for the ROI intervals of a BBVProfileManager run in
+    OUTDIR, with the instruction counts each simulation point starts at
+    (from the start of the run).
+    """
+    with open(f"{outdir}/{PROFILE_FILE}", "r") as f:
+        profile = json.load(f)
+    bbvs = read_bbv(f"{outdir}/{BBV_FILE}")
+    interval = profile["interval"]
+    first, last = roi_intervals(len(bbvs), interval, profile["roi_start_insts"] or 0,
+                                profile["roi_end_insts"])
+    result = pick_simpoints(bbvs[first:last], first = first, **options)
+    for simpoint in result["simpoints"]:
+        simpoint["start_insts"] = simpoint["interval"] * interval
+    result.update(interval = interval, intervals = last - first, profile = profile)
+    return result
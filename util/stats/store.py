@@ -0,0 +1,214 @@
+"""
+Columnar store of gem5 stats, for analysing sweeps and sampled runs
+
+Re-parsing thousands of stats.txt files for every plot is slow, so
+convert() turns them into one directory with a row per dump (i.e. per
+ROI of a sampled run) and a .npy column per stat:
+
+    STORE/meta.json        runs, stat names -> column files
+    STORE/run.npy          run index of each row
+    STORE/dump.npy         dump (ROI) index of each row in its run
+    STORE/columns/N.npy    float64 values, nan where a run lacks the stat
+
+Columns are memory-mapped when loaded, so a query only reads the stats
+it names:
+
+    store = StatsStore("sweep.stats")
+    names, ipc = store.array("system.processor.cores*.core.ipc")
+    ipc[store.rows("*/mcf*")]         # rows x matched stats
+
+The files are parsed in parallel by a process pool (see StatsFile), each
+worker writing its dumps as a stats x dumps matrix to a scratch file, so
+that assembling a column reads one contiguous slice per run.
+"""
+import concurrent.futures
+import fnmatch
+import json
+import os
+import re
+import shutil
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from util.stats.reader import StatsFile
+
+META_FILE = "meta.json"
+# Bump when the store layout changes
+STORE_VERSION = 1
+# Stats files of a run's outdir, by preference (stats.rois.txt: the merged
+# ROIs of a sampled run that forked them, see SamplingManager)
+STATS_FILES = ("stats.rois.txt", "stats.txt", "stats.txt.gz")
+# ... or one per switch variant, each a run of its own
+VARIANT_STATS_FILE = re.compile(r"stats\.rois\.(.+)\.txt")
+
+def outdir_stats_files(outdir: str, names: Optional[Iterable[str]] = None) -> List[str]:
+    """The stats files of the run(s) in OUTDIR (whose files are NAMES, if
+    already listed): one per switch variant, or else the preferred one.
+    """
+    names = sorted(os.listdir(outdir) if names is None else names)
+    variants = [name for name in names if VARIANT_STATS_FILE.fullmatch(name)]
+    if variants:
+        return [os.path.join(outdir, name) for name in variants]
+    for name in STATS_FILES:
+        if name in names:
+            return [os.path.join(outdir, name)]
+    return []
+
+
+def stats_variant(path: str) -> Optional[str]:
+    """The switch variant whose stats PATH holds, if any."""
+    match = VARIANT_STATS_FILE.fullmatch(os.path.basename(path))
+    return match.group(1) if match else None
+
+
+def run_name(path: str) -> str:
+    """A run's default name: the directory of its stats file PATH (and
+    the switch variant, for a variant's stats).
+    """
+    name = os.path.dirname(path) or "."
+    variant = stats_variant(path)
+    return f"{name}/{variant}" if variant else name
+
+
+def find_stats_files(paths: Iterable[str]) -> List[str]:
+    """PATHS, with directories replaced by the stats files under them.
+    """
+    found = []
+    for path in paths:
+        if not os.path.isdir(path):
+            found.append(path)
+            continue
+        for root, dirs, names in os.walk(path):
+            dirs.sort()
+            stats_files = outdir_stats_files(root, names)
+            found += stats_files
+            if stats_files and not os.path.basename(stats_files[0]).startswith("stats.txt"):
+                # (the forked ROIs' own outdirs are already merged)
+                dirs[:] = [d for d in dirs if not fnmatch.fnmatchcase(d, "roi.*")]
+    return found
+
+
+def _parse(path: str, scratch: str) -> Tuple[List[str], int]:
+    """
+    Parse PATH into SCRATCH (a stats x dumps .npy matrix); returns the
+    stat names (its rows) and the number of dumps.
+    """
+    with StatsFile(path, save_index = False) as stats:
+        dumps = [stats.dump(i) for i in range(len(stats))]
+    index: Dict[str, int] = {}
+    for dump in dumps:
+        for name in dump:
+            index.setdefault(name, len(index))
+    matrix = np.full((len(index), len(dumps)), np.nan)
+    for col, dump in enumerate(dumps):
+        for name, value in dump.items():
+            if value is not None:
+                matrix[index[name], col] = value
+    np.save(scratch, matrix)
+    return list(index), len(dumps)
+
+
+def convert(paths: Iterable[str], store_dir: str, workers: Optional[int] = None,
+            run_names: Optional[List[str]] = None) -> "StatsStore":
+    """
+    Convert the stats files PATHS into a store in STORE_DIR (replacing
+    whatever was there), parsing up to WORKERS files at once (default:
+    one per CPU).  Each file is a run, named by RUN_NAMES or else by
+    run_name().
+    """
+    paths = list(paths)
+    if run_names is None:
+        run_names = [run_name(path) for path in paths]
+    shutil.rmtree(store_dir, ignore_errors = True)
+    scratch_dir = os.path.join(store_dir, "scratch")
+    os.makedirs(scratch_dir)
+    os.makedirs(os.path.join(store_dir, "columns"))
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as pool:
+        parsed = list(pool.map(
+            _parse, paths, [os.path.join(scratch_dir, f"{i}.npy") for i in range(len(paths))]
+        ))
+
+    # rows of each run, and where each stat is in its matrix
+    offsets = np.cumsum([0] + [num_dumps for _, num_dumps in parsed])
+    columns: Dict[str, List[Tuple[int, int]]] = {}
+    for run, (names, _) in enumerate(parsed):
+        for i, name in enumerate(names):
+            columns.setdefault(name, []).append((run, i))
+    np.save(os.path.join(store_dir, "run.npy"),
+            np.repeat(np.arange(len(paths), dtype = np.int32), [n for _, n in parsed]))
+    np.save(os.path.join(store_dir, "dump.npy"),
+            np.concatenate([np.arange(n, dtype = np.int32) for _, n in parsed] or [np.zeros(0, np.int32)]))
+
+    matrices = [np.load(os.path.join(scratch_dir, f"{i}.npy"), mmap_mode = "r")
+                for i in range(len(paths))]
+    files = {}
+    for num, name in enumerate(sorted(columns)):
+        column = np.full(offsets[-1], np.nan)
+        for run, i in columns[name]:
+            column[offsets[run]:offsets[run + 1]] = matrices[run][i]
+        files[name] = f"columns/{num}.npy"
+        np.save(os.path.join(store_dir, files[name]), column)
+    del matrices
+    shutil.rmtree(scratch_dir)
+
+    with open(os.path.join(store_dir, META_FILE), "w") as f:
+        json.dump(dict(
+            version = STORE_VERSION,
+            runs = [dict(name = name, path = os.path.abspath(path), dumps = num_dumps)
+                    for name, path, (_, num_dumps) in zip(run_names, paths, parsed)],
+            columns = files
+        ), f, indent = 1)
+    return StatsStore(store_dir)
+
+
+class StatsStore:
+    def __init__(self, store_dir: str) -> None:
+        self._dir = store_dir
+        with open(os.path.join(store_dir, META_FILE), "r") as f:
+            meta = json.load(f)
+        if meta["version"] != STORE_VERSION:
+            raise ValueError(f"{store_dir} is a version {meta['version']} stats store, "
+                             f"expected version {STORE_VERSION}")
+        self.runs: List[dict] = meta["runs"]
+        self._columns: Dict[str, str] = meta["columns"]
+        # run and dump of each row
+        self.run = np.load(os.path.join(store_dir, "run.npy"))
+        self.dump = np.load(os.path.join(store_dir, "dump.npy"))
+
+    def __len__(self) -> int:
+        return len(self.run)
+
+    def names(self, pattern: str = "*") -> List[str]:
+        """The stats matching the glob PATTERN.
+        """
+        if pattern in self._columns:
+            return [pattern]
+        return sorted(name for name in self._columns if fnmatch.fnmatchcase(name, pattern))
+
+    def column(self, name: str) -> np.ndarray:
+        """All rows of one stat (memory-mapped).
+        """
+        return np.load(os.path.join(self._dir, self._columns[name]), mmap_mode = "r")
+
+    def load(self, pattern: str) -> Dict[str, np.ndarray]:
+        return {name: self.column(name) for name in self.names(pattern)}
+
+    def array(self, pattern: str) -> Tuple[List[str], np.ndarray]:
+        """The stats matching PATTERN, as their names and a rows x stats array.
+        """
+        names = self.names(pattern)
+        if not names:
+            return names, np.zeros((len(self), 0))
+        return names, np.column_stack([self.column(name) for name in names])
+
+    def rows(self, run_pattern: str = "*", dumps: Optional[slice] = None) -> np.ndarray:
+        """Mask of the rows of the runs whose names match RUN_PATTERN
+        (and only of the dump indices in DUMPS, if given).
+        """
+        runs = [i for i, run in enumerate(self.runs) if fnmatch.fnmatchcase(run["name"], run_pattern)]
+        mask = np.isin(self.run, runs)
+        if dumps is not None:
+            mask &= np.isin(self.dump, np.arange(self.dump.max(initial = -1) + 1)[dumps])
+        return mask